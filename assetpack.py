@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+
+import pygame
+import helpers
+
+# The file starts with the magic bytes, the format version, the length of the
+# index and where the pixel data starts, followed by the index as JSON and then
+# the pixel data
+MAGIC = b'MGPK'
+HEADER = struct.Struct('<4sIII')
+VERSION = 3
+# Pixel data is aligned so that every frame starts on a 16 byte boundary
+ALIGNMENT = 16
+IMAGE_EXTENSIONS = ('.png', '.gif', '.jpg', '.jpeg', '.bmp')
+
+
+class AssetPack:
+    """
+    Class reading images from an asset pack, a single file holding every
+    image under Media already decoded to raw RGBA pixels.
+
+    The file is memory mapped, and surfaces are created straight from the
+    mapped pixels, so loading an image doesn't decode anything. Entries are
+    only used while the size and modification time of the image they were
+    built from are unchanged, and folders are only listed from the pack
+    while no images have been added to or removed from them, so a stale pack
+    falls back to the images.
+
+    Attributes:
+        _path: the path to the pack file
+        _file: the open pack file
+        _map: the memory map of the pack file
+        _view: a memoryview of _map, used to slice pixels without copying
+        _start: int representing where the pixel data starts in the file
+        _images: a dictionary where the image path is the key and a list of
+            the offset of its pixels from _start, its width, height, content
+            hash, the modification time and size of the image file, and its
+            kind as returned by helpers.get_alpha_kind is the value
+        _folders: a dictionary where the path of an animator folder is the
+            key and a list is the value, holding a dictionary of the
+            modification times of the folder (under '.') and of each folder
+            inside it when the pack was built, and a dictionary mapping each
+            type to a list of its image paths
+    """
+    def __init__(self, path):
+        """
+        Open an asset pack.
+
+        Args:
+            path: the path to the pack file
+
+        Raises:
+            ValueError: if the file is not an asset pack of this version, or
+                is cut short
+        """
+        self._path = path
+        self._file = open(path, 'rb')
+        if os.fstat(self._file.fileno()).st_size < HEADER.size:
+            self._file.close()
+            raise ValueError(path + ' is too short to be an asset pack')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version, index_length, self._start = HEADER.unpack_from(
+            self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(path + ' is not a version %d asset pack'
+                             % VERSION)
+        try:
+            if HEADER.size + index_length > self._start:
+                raise ValueError('index overlaps the pixel data')
+            index = json.loads(bytes(self._view[HEADER.size:
+                                                HEADER.size + index_length]))
+            self._images = index['images']
+            self._folders = index['folders']
+            end = max([entry[0] + entry[1] * entry[2] * 4
+                       for entry in self._images.values()], default=0)
+            if self._start + end > len(self._map):
+                raise ValueError('pixel data cut short')
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            self.close()
+            raise ValueError(path + ' is damaged: ' + str(e)) from e
+
+    def get_path(self):
+        """
+        Accessor for the path to the pack file.
+
+        Returns:
+            the path to the pack file as a string
+        """
+        return self._path
+
+    def has_image(self, path):
+        """
+        Determine if the pack holds an up to date copy of an image.
+
+        Args:
+            path: the path to the image file
+
+        Returns:
+            True if the image can be loaded from the pack, False otherwise
+        """
+        entry = self._images.get(os.path.normpath(path))
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return entry[4] == stat.st_mtime_ns and entry[5] == stat.st_size
+
+    def get_digest(self, path):
+        """
+        Get the content hash of an image in the pack, the SHA-1 of the image
+        file.
+
+        Args:
+            path: the path to the image file
+
+        Returns:
+            the hash as bytes
+        """
+        return bytes.fromhex(self._images[os.path.normpath(path)][3])
+
+    def get_kind(self, path):
+        """
+        Get the kind of an image in the pack, which decides the format its
+        frames are converted to. See helpers.get_alpha_kind.
+
+        Args:
+            path: the path to the image file
+
+        Returns:
+            the kind as a string
+        """
+        return self._images[os.path.normpath(path)][6]
+
+    def get_folder(self, pathname):
+        """
+        Get the types and images of an animator folder, if no folders or
+        images have been added to or removed from it since the pack was
+        built. This is found from the modification times of the folder and
+        the folders inside it, without listing them.
+
+        Args:
+            pathname: the path to the folder
+
+        Returns:
+            a dictionary where the type is the key and a list of the paths of
+            its images is the value, or None if the folder isn't in the pack
+            or has changed
+        """
+        entry = self._folders.get(os.path.normpath(pathname))
+        if entry is None:
+            return None
+        mtimes, types = entry
+        for name, mtime in mtimes.items():
+            try:
+                if os.stat(os.path.join(pathname, name)).st_mtime_ns != mtime:
+                    return None
+            except OSError:
+                return None
+        return types
+
+    def load(self, path):
+        """
+        Create a surface for an image in the pack, without decoding or
+        copying its pixels. The transparent pixels of images of the COLORKEY
+        kind are helpers.COLORKEY_COLOR.
+
+        Args:
+            path: the path to the image file
+
+        Returns:
+            a 32 bit RGBA surface using the pixels in the pack
+        """
+        offset, width, height = self._images[os.path.normpath(path)][:3]
+        offset += self._start
+        pixels = self._view[offset:offset + width * height * 4]
+        return pygame.image.frombuffer(pixels, (width, height), 'RGBA')
+
+    def close(self):
+        """
+        Close the pack file. Surfaces loaded from it must not be used after
+        this.
+        """
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+
+def build(media='Media', output='Media/assets.pack'):
+    """
+    Build an asset pack from every image under a folder.
+
+    Images are converted to the display format with per pixel alpha before
+    being stored, so they have the same pixels as images loaded at runtime.
+    Identical images are only stored once. The kind of each image is stored
+    too, so it doesn't need working out when the image is loaded, and the
+    transparent pixels of images that can be colour keyed are stored as
+    helpers.COLORKEY_COLOR, so they can be converted without blending.
+
+    Args:
+        media: the folder to pack. Defaults to Media
+        output: the path of the pack file. Defaults to assets.pack in Media
+
+    Returns:
+        the number of images packed
+    """
+    images = {}
+    folders = {}
+    pixels_by_digest = {}
+    blobs = []
+    data_length = 0
+    for root, dirs, files in os.walk(media):
+        dirs.sort()
+        for filename in sorted(files):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.normpath(os.path.join(root, filename))
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha1(data).hexdigest()
+            img = pygame.image.load(path).convert_alpha()
+            kind = helpers.get_alpha_kind(img)
+            if kind == helpers.COLORKEY:
+                img = helpers.convert_image(img, kind).convert_alpha()
+            if digest not in pixels_by_digest:
+                padding = -data_length % ALIGNMENT
+                blobs.append(b'\0' * padding)
+                data_length += padding
+                pixels_by_digest[digest] = data_length
+                blob = pygame.image.tobytes(img, 'RGBA')
+                blobs.append(blob)
+                data_length += len(blob)
+            stat = os.stat(path)
+            images[path] = [pixels_by_digest[digest], img.get_width(),
+                            img.get_height(), digest, stat.st_mtime_ns,
+                            stat.st_size, kind]
+            # Images directly inside a folder inside an animator folder are
+            # the frames of a type
+            folder, type = os.path.split(os.path.dirname(path))
+            folders.setdefault(folder, {}).setdefault(type, []).append(path)
+    # Keep the modification times of each folder and the folders inside it,
+    # which change when images or types are added or removed
+    for folder, types in folders.items():
+        mtimes = {'.': os.stat(folder).st_mtime_ns}
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_dir():
+                    mtimes[entry.name] = entry.stat().st_mtime_ns
+        folders[folder] = [mtimes, types]
+    index = json.dumps({'images': images, 'folders': folders}).encode()
+    start = HEADER.size + len(index)
+    start += -start % ALIGNMENT
+    with open(output + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), start))
+        f.write(index)
+        f.write(b'\0' * (start - HEADER.size - len(index)))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(output + '.tmp', output)
+    return len(images)
+
+
+def main():
+    """
+    Build the asset pack for the game from the command line.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    # Converting to the display format needs a display
+    pygame.display.set_mode((1, 1))
+    output = sys.argv[1] if len(sys.argv) > 1 else 'Media/assets.pack'
+    count = build(output=output)
+    print('Packed %d images into %s' % (count, output))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
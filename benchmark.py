@@ -0,0 +1,359 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# Run without a window, and keep pygame's greeting out of the JSON. These
+# must be set before pygame is imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame  # noqa: E402
+import game  # noqa: E402
+import helpers  # noqa: E402
+
+from pygame.locals import (  # noqa: E402
+    K_UP,
+    K_DOWN,
+    K_LEFT,
+    K_RIGHT,
+    K_SPACE,
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+KEYS = {
+    'up': K_UP,
+    'down': K_DOWN,
+    'left': K_LEFT,
+    'right': K_RIGHT,
+    'space': K_SPACE,
+}
+
+# The route the benchmark takes through the game, as a list of steps for each
+# room. Each step is a tuple of the keys to hold, the most frames to hold them
+# for, and optionally a function taking the game that stops the step early
+# when it returns True. Every step also stops when the player leaves the room.
+ROUTE = [
+    ('lightforestentrance', [
+        (['right'], 300, None),
+        # Wait for tutorial man to finish talking
+        ([], 300, lambda g: not g.current_room.npcs[0].is_speaking()),
+        (['right'], 100, None),
+    ]),
+    ('lightforest1', [
+        (['right'], 134, None),
+        (['down'], 8, None),
+        (['right'], 100, None),
+    ]),
+    ('lightforest2', [
+        (['up'], 16, None),
+        (['right'], 96, None),
+        # Step into the mushroom ring
+        (['space'], 3000, None),
+    ]),
+    ('darkforestcampfire', [
+        (['right'], 100,
+         lambda g: g.player.collide(g.current_room.interactables[0])),
+        # Pick up the guide, then wait for the turtle to walk over
+        (['space'], 3000, lambda g: g.current_room.is_clear()),
+        ([], 200, lambda g: g.current_room.npcs[0].get_pos()[0] >= 490),
+        (['right'], 100, lambda g: g.player.collide(g.current_room.npcs[0])),
+        ([], 3000, lambda g: not g.conversations),
+        (['right'], 200, None),
+    ]),
+    ('darkforest1', [
+        (['right'], 200, lambda g: g.player.get_pos()[0] >= 810),
+        (['down'], 100,
+         lambda g: g.player.collide(g.current_room.interactables[0])),
+        # Fall through the trapdoor
+        (['space'], 3000, None),
+    ]),
+    ('maze', [
+        (['down'], 9, None),
+        (['right'], 147, None),
+        (['up'], 35, None),
+        (['left'], 14, None),
+        (['down'], 1, None),
+        (['left'], 11, None),
+        # Pick up the key
+        (['space'], 3000, lambda g: g.current_room.is_clear()),
+        (['down'], 7, None),
+        (['right'], 3, None),
+        (['down'], 13, None),
+        (['left'], 40, None),
+        (['up'], 57, None),
+        (['left'], 57, None),
+        (['up'], 14, None),
+        (['right'], 76, None),
+        (['down'], 10, None),
+        (['right'], 41, None),
+        (['down'], 24, None),
+        (['right'], 22, None),
+        (['down'], 42, None),
+        (['right'], 24, None),
+        (['up'], 107, None),
+        (['right'], 2, None),
+        ([], 2, None),
+    ]),
+    ('innoutside', [
+        (['right'], 200, lambda g: g.player.get_pos()[0] >= 650),
+        (['up'], 3, None),
+        # Wait at the door for the turtle to arrive, then talk to him
+        ([], 1000, lambda g: g.current_room.npcs[0].get_pos()[0] >= 300),
+        (['left'], 70, None),
+        (['down'], 20, lambda g: g.player.collide(g.current_room.npcs[0])),
+        ([], 2000, lambda g: not g.conversations and
+         not g.player.is_speaking() and
+         not g.current_room.npcs[0].is_speaking()),
+        # Pick up the megaphone and go into the inn
+        (['down'], 100,
+         lambda g: g.player.collide(g.current_room.interactables[0])),
+        (['space'], 3000, lambda g: 'megaphone' in g.player.inventory),
+        (['up'], 100, lambda g: g.player.get_pos()[1] <= 465),
+        (['right'], 100, None),
+    ]),
+    ('innlobby', [
+        (['right'], 100, None),
+        (['left'], 100, None),
+        ([], 100, None),
+    ]),
+]
+
+
+class ScriptedKeys:
+    """
+    Class standing in for the result of pygame.key.get_pressed, so that
+    Player.move can be driven by a script instead of a keyboard.
+
+    Attributes:
+        _pressed: a set of the key constants that are held down
+    """
+    def __init__(self, names):
+        """
+        Initialize an instance of ScriptedKeys.
+
+        Args:
+            names: a list of the names of the keys held down, from KEYS
+        """
+        self._pressed = {KEYS[name] for name in names}
+
+    def __getitem__(self, key):
+        """
+        Determine if a key is held down.
+
+        Args:
+            key: the pygame key constant to check
+
+        Returns:
+            True if the key is held down, False otherwise
+        """
+        return key in self._pressed
+
+
+def percentile(samples, percent):
+    """
+    Find a percentile of a list of samples, using the nearest rank.
+
+    Args:
+        samples: a sorted list of numbers
+        percent: the percentile to find, between 0 and 100
+
+    Returns:
+        the sample at the given percentile, or None if there are no samples
+    """
+    if not samples:
+        return None
+    rank = max(1, -(-len(samples) * percent // 100))
+    return samples[int(rank) - 1]
+
+
+def peak_memory_kb():
+    """
+    Get the peak resident memory of the process so far.
+
+    Returns:
+        the peak memory in kilobytes, or None if it can't be measured on this
+        platform
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes rather than kilobytes
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def run_benchmark(route=ROUTE, dirty_rects=False, asset_times=False,
+                  simulate=False):
+    """
+    Play through the game along a route without a window or intro, timing
+    every frame.
+
+    When simulating, nothing is drawn and every frame is a single tick, so
+    the times are of the game logic alone.
+
+    A frame is counted towards the room the player is in at the end of it, so
+    the first frame in a room includes loading it.
+
+    Args:
+        route: the route to take, in the format of ROUTE
+        dirty_rects: whether to run the game in dirty rectangle mode.
+            Defaults to False
+        asset_times: whether to include how long each image took to load.
+            Defaults to False, meaning only the totals are included
+        simulate: whether to run the game without rendering. Defaults to
+            False
+
+    Returns:
+        a dictionary of results that can be written as JSON
+    """
+    pygame.init()
+    start = time.perf_counter()
+    game1 = game.Game(dirty_rects=dirty_rects, render=not simulate)
+    game1.player.spawn(game1.current_room, 'initial')
+    results = {
+        'dirty_rects': dirty_rects,
+        'simulate': simulate,
+        'startup_ms': (time.perf_counter() - start) * 1000,
+        'completed': True,
+        'rooms': {},
+    }
+    frame_times = {}
+    for room_name, steps in route:
+        if game1.current_room.get_name() != room_name:
+            # The route didn't get the player out of the previous room
+            results['completed'] = False
+            break
+        for names, frames, until in steps:
+            keys = ScriptedKeys(names)
+            for _ in range(frames):
+                frame_start = time.perf_counter()
+                if simulate:
+                    game1.tick(keys)
+                else:
+                    game1.step(keys)
+                elapsed = (time.perf_counter() - frame_start) * 1000
+                current = game1.current_room.get_name()
+                frame_times.setdefault(current, []).append(elapsed)
+                if current != room_name or \
+                        (until is not None and until(game1)):
+                    break
+            if game1.current_room.get_name() != room_name:
+                break
+        results['rooms'][room_name] = {'peak_memory_kb': peak_memory_kb()}
+    for room_name, samples in frame_times.items():
+        samples = sorted(samples)
+        summary = results['rooms'].setdefault(room_name, {})
+        summary.update({
+            'frames': len(samples),
+            'p50_ms': percentile(samples, 50),
+            'p95_ms': percentile(samples, 95),
+            'p99_ms': percentile(samples, 99),
+            'max_ms': samples[-1],
+        })
+    total_ms = sum(sum(samples) for samples in frame_times.values())
+    results['frames_per_second'] = \
+        sum(len(samples) for samples in frame_times.values()) * 1000 / \
+        total_ms if total_ms else None
+    results['peak_memory_kb'] = peak_memory_kb()
+    results['memory'] = game1.get_memory_report()
+    results['loading'] = helpers.frame_store.get_load_report()
+    if not asset_times:
+        del results['loading']['assets']
+    pygame.quit()
+    return results
+
+
+def run_blit_benchmark(repeats=200):
+    """
+    Time blitting the frames of every animator folder, both in the format
+    the frame store chooses for them and with per pixel alpha, as every
+    frame was stored before formats were chosen.
+
+    Args:
+        repeats: the number of times to blit each frame. Defaults to 200
+
+    Returns:
+        a dictionary of results that can be written as JSON, where the folder
+        path is the key and a dictionary of the format chosen and the mean
+        time of a blit in each format, in microseconds, is the value
+    """
+    pygame.init()
+    screen = pygame.display.set_mode((1080, 700))
+    results = {}
+    for dir in ['backgrounds', 'rooms', 'characters', 'interactables']:
+        for name in sorted(os.listdir('Media/' + dir)):
+            pathname = 'Media/' + dir + '/' + name
+            if not os.path.isdir(pathname):
+                continue
+            frames = [frame for images in
+                      helpers.frame_store.get(pathname).values()
+                      for frame in images]
+            if not frames:
+                continue
+            times = {}
+            for format, surfs in [
+                    ('chosen', frames),
+                    ('alpha', [frame.convert_alpha() for frame in frames])]:
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    for surf in surfs:
+                        screen.blit(surf, (0, 0))
+                times[format] = (time.perf_counter() - start) * 1e6 / \
+                    (repeats * len(surfs))
+            results[pathname] = {
+                'format': helpers.get_alpha_kind(frames[0]),
+                'chosen_us': times['chosen'],
+                'alpha_us': times['alpha'],
+            }
+    pygame.quit()
+    return results
+
+
+def main():
+    """
+    Run the benchmark from the command line and print or save the results.
+    """
+    parser = argparse.ArgumentParser(
+        description='Play through the game headlessly and report frame '
+                    'times and memory for each room as JSON.')
+    parser.add_argument('-o', '--output',
+                        help='file to write the JSON to instead of stdout')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='only update the parts of the window that '
+                             'change each frame')
+    parser.add_argument('--asset-times', action='store_true',
+                        help='report how long each image took to decode and '
+                             'convert')
+    parser.add_argument('--simulate', action='store_true',
+                        help='run only the game logic, one tick a frame, '
+                             'without drawing anything')
+    parser.add_argument('--blits', action='store_true',
+                        help='time blitting the frames of every animator '
+                             'folder in the format chosen for them and with '
+                             'per pixel alpha, instead of playing through')
+    args = parser.parse_args()
+    if args.blits:
+        results = run_blit_benchmark()
+    else:
+        results = run_benchmark(dirty_rects=args.dirty_rects,
+                                asset_times=args.asset_times,
+                                simulate=args.simulate)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
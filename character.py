@@ -1,6 +1,8 @@
 import pygame
 import helpers
 import environment
+import profiler
+import triggers
 
 from pygame.locals import (
     K_UP,
@@ -20,11 +22,17 @@ class Character(helpers.DataSprite):
         Same as DataSprite, with the addition of
         _room: the room the character is currently in
         _chatbox: an instance of Chatbox used by the character
+        _last_topleft: the x and y coordinates of the top left of the
+            character at the start of the current tick, or None if it hasn't
+            moved since being placed
     """
+    __slots__ = ('_room', '_chatbox', '_last_topleft')
+
     def __init__(self, data):
         super().__init__(data, 'characters/')
         self._room = None
         self._chatbox = environment.Chatbox(self)
+        self._last_topleft = None
 
     def get_pos(self):
         """
@@ -35,6 +43,64 @@ class Character(helpers.DataSprite):
         """
         return [self._rect.centerx, self._rect.centery]
 
+    def get_state(self):
+        """
+        Get the progress state of the character, made of its position and the
+        phrases it has said once.
+
+        Returns:
+            a tuple of the x and y coordinates of the top left of the
+            character and a tuple of the phrases said once
+        """
+        return (self._rect.left, self._rect.top,
+                tuple(self._chatbox.get_past_phrases()))
+
+    def set_state(self, state):
+        """
+        Restore a progress state returned by get_state.
+
+        Args:
+            state: the progress state to restore
+        """
+        self._rect.topleft = (state[0], state[1])
+        self._last_topleft = None
+        self._chatbox.set_past_phrases(state[2])
+
+    def set_room(self, room):
+        """
+        Set the room the character is in, whose boundaries it walks around.
+
+        Args:
+            room: the instance of Room the character is in
+        """
+        self._room = room
+
+    def remember_position(self):
+        """
+        Remember where the character is at the start of a tick, so that it
+        can be drawn part way between ticks.
+        """
+        self._last_topleft = self._rect.topleft
+
+    def get_draw_rect(self, alpha=1.0):
+        """
+        Find where the character is drawn, part way between where it was at
+        the start of the tick and where it is now.
+
+        Args:
+            alpha: how far between the last tick and the current one to draw,
+                from 0 to 1. Defaults to 1, meaning the current tick
+
+        Returns:
+            the rect to draw the character at
+        """
+        if alpha >= 1 or self._last_topleft is None:
+            return self._rect
+        last_x, last_y = self._last_topleft
+        return self._rect.move(
+            round((last_x - self._rect.left) * (1 - alpha)),
+            round((last_y - self._rect.top) * (1 - alpha)))
+
     def update(self, screen):
         """
         Update the character visuals on the screen.
@@ -42,8 +108,32 @@ class Character(helpers.DataSprite):
         Args:
             screen: the screen to update to
         """
-        screen.blit(self._surf, self._rect)
-        self._chatbox.update(screen)
+        self.tick()
+        self.draw(screen)
+
+    def tick(self, elapsed_ms=helpers.TICK_MS):
+        """
+        Move the character's speech on without drawing it.
+
+        Args:
+            elapsed_ms: the time to move the speech on by, in ms. Defaults to
+                one tick
+        """
+        self._chatbox.tick(elapsed_ms)
+
+    def draw(self, screen, alpha=1.0):
+        """
+        Draw the character and its chatbox.
+
+        Args:
+            screen: the screen, or a DrawQueue, to draw to
+            alpha: how far between the last tick and the current one to draw,
+                from 0 to 1. Defaults to 1, meaning the current tick
+        """
+        rect = self.get_draw_rect(alpha)
+        screen.blit(self._surf, rect)
+        with profiler.section('chatboxes'):
+            self._chatbox.draw(screen, rect.center)
 
     def say(self, phrase):
         """
@@ -72,6 +162,33 @@ class Character(helpers.DataSprite):
         """
         return self._chatbox.is_speaking()
 
+    def get_chatbox(self):
+        """
+        Accessor for the character's chatbox.
+
+        Returns:
+            the character's instance of Chatbox
+        """
+        return self._chatbox
+
+    def release(self):
+        """
+        Give back the shared resources used by the character's chatbox, once
+        the character won't be used again.
+        """
+        self._chatbox.release()
+
+    def get_bytes(self):
+        """
+        Find how many bytes the objects belonging to the character take up,
+        including its chatbox. See DataSprite.get_bytes.
+
+        Returns:
+            the number of bytes as an int
+        """
+        return super().get_bytes() + \
+            helpers.get_object_bytes(self._chatbox)
+
 
 class Player(Character):
     """
@@ -84,69 +201,78 @@ class Player(Character):
             the guide
         _spotlight: boolean indicating whether the spotlight is on
             or off
-        _spotlight_surf: the image representing the spotlight
-        _spotlight_rect: contains the coordinates defining the
-            spotlight's position
-        _start_time: marks the in-game time of initialization, used for
-        _start_time: marks the in-game time of initialization, used for
-            interaction
+        _spotlight_overlay: an instance of Spotlight holding the image
+            currently used for the spotlight
+        _since_press: the game time in ms since space or tab last started an
+            interaction, counted in ticks so that a replayed game interacts
+            on the same ticks
         inventory: a list representing the items the character is currently
             carrying
     """
+    __slots__ = ('_interact', '_guiding', '_spotlight_overlay', '_spotlight',
+                 '_since_press', 'inventory')
+
     def __init__(self, img):
         super().__init__(img)
         self._interact = False
         self._guiding = False
-        self._spotlight_surf = pygame.image.load(
-            'Media/misc/spotlight/pixil-frame-0.png')
-        self._spotlight_rect = self._spotlight_surf.get_rect()
+        self._spotlight_overlay = environment.Spotlight()
         self._spotlight = False
-        self._start_time = pygame.time.get_ticks()
+        self._since_press = 0
         self.inventory = []
 
-    def move(self, pressed_keys):
+    def move(self, pressed_keys, elapsed_ms=helpers.TICK_MS):
         """
         Move the character based on which key is pressed and prevent it from
         walking into obstacles.
 
         Args:
             pressed_keys: Pygame event containing all pressed keys
+            elapsed_ms: the game time since the last move, in ms. Defaults to
+                one tick
         """
+        self._since_press += elapsed_ms
         if pressed_keys[K_UP]:
             self._surf = self._animator.get_next('back')
             self._rect.move_ip(0, -5)
-            if pygame.Rect.collidelist(self._rect,
-                                       self._room.get_objects()) >= 0:
+            if self._collides():
                 self._rect.move_ip(0, 5)
         if pressed_keys[K_DOWN]:
             self._surf = self._animator.get_next('front')
             self._rect.move_ip(0, 5)
-            if pygame.Rect.collidelist(self._rect,
-                                       self._room.get_objects()) >= 0:
+            if self._collides():
                 self._rect.move_ip(0, -5)
         if pressed_keys[K_LEFT]:
             self._surf = self._animator.get_next('left')
             self._rect.move_ip(-5, 0)
-            if pygame.Rect.collidelist(self._rect,
-                                       self._room.get_objects()) >= 0:
+            if self._collides():
                 self._rect.move_ip(5, 0)
         if pressed_keys[K_RIGHT]:
             self._surf = self._animator.get_next('right')
             self._rect.move_ip(5, 0)
-            if pygame.Rect.collidelist(self._rect,
-                                       self._room.get_objects()) >= 0:
+            if self._collides():
                 self._rect.move_ip(-5, 0)
         if pressed_keys[K_SPACE]:
-            if pygame.time.get_ticks() - self._start_time > 500:
+            if self._since_press > 500:
                 self._interact = True
-                self._start_time = pygame.time.get_ticks()
+                self._since_press = 0
         if pressed_keys[K_TAB]:
-            if pygame.time.get_ticks() - self._start_time > 500:
+            if self._since_press > 500:
                 self._guiding = True
-                self._start_time = pygame.time.get_ticks()
-        if pygame.time.get_ticks() - self._start_time > 100:
+                self._since_press = 0
+        if self._since_press > 100:
             self._interact = False
 
+    def _collides(self):
+        """
+        Determine if the player is overlapping any of the room's boundaries.
+
+        Returns:
+            True if the player is overlapping a boundary, False otherwise
+        """
+        with profiler.section('collision'):
+            return self._room.collides(self._rect)
+
     def interacting(self):
         """
         Determine if the player is currently attempting to interact with an
@@ -187,6 +313,7 @@ class Player(Character):
         self._room = room
         self._rect.centerx = self._room.get_entrance(str)[0]
         self._rect.centery = self._room.get_entrance(str)[1]
+        self._last_topleft = None
 
     def is_exiting(self):
         """
@@ -220,20 +347,30 @@ class Player(Character):
         """
         self._spotlight = False
 
+    def is_spotlight_on(self):
+        """
+        Determine if the spotlight is on.
+
+        Returns:
+            True if the spotlight is on, False otherwise
+        """
+        return self._spotlight
+
     def spotlight_image(self,
                         img_path='Media/misc/spotlight/pixil-frame-0.png'):
         """
         Set the image used for the spotlight.
 
         This allows the spotlight to be anything that should remain at the
-        same location as the character, even if they move.
+        same location as the character, even if they move. Each image is
+        only loaded once, and setting the image already in use does nothing,
+        so this is cheap to call every tick.
 
         Args:
             img_path: path to the image to use. Defaults to the black screen
                 with a transparent circle
         """
-        self._spotlight_surf = pygame.image.load(img_path)
-        self._spotlight_rect = self._spotlight_surf.get_rect()
+        self._spotlight_overlay.set_image(img_path)
 
     def draw_rect(self, screen):
         """
@@ -249,20 +386,23 @@ class Player(Character):
         pygame.draw.rect(surface=screen, rect=self._rect,
                          color=pygame.Color(0, 255, 0))
 
-    def update(self, screen):
+    def draw(self, screen, alpha=1.0):
         """
-        Update the player, and spotlight if necessary
+        Draw the player, and spotlight if necessary
 
         Args:
-            screen: the screen to draw to
+            screen: the screen, or a DrawQueue, to draw to
+            alpha: how far between the last tick and the current one to draw,
+                from 0 to 1. Defaults to 1, meaning the current tick
         """
-        screen.blit(self._surf, self._rect)
+        rect = self.get_draw_rect(alpha)
+        screen.blit(self._surf, rect)
         # If the spotlight is active, show it at the same place as the
         # character
         if self._spotlight:
-            self._spotlight_rect.center = (self.get_pos()[0], self.get_pos()[1])
-            screen.blit(self._spotlight_surf, self._spotlight_rect)
-        self._chatbox.update(screen)
+            self._spotlight_overlay.draw(screen, rect.center)
+        with profiler.section('chatboxes'):
+            self._chatbox.draw(screen, rect.center)
 
 
 class NPC(Character):
@@ -270,7 +410,17 @@ class NPC(Character):
     Create a non-playable character (NPC) sprite from a .csv file
 
     Inherits from Character
+
+    Attributes:
+        Same as Character, with the addition of
+        _walk: a tuple of the direction the NPC is walking in and the
+            coordinate it stops at, or None if it isn't walking
+        _path: a list of the x and y coordinates of the corners left on the
+            path the NPC is walking along, ending with where it stops, or
+            None if it isn't walking along a path
     """
+    __slots__ = ('_walk', '_path')
+
     def __init__(self, img):
         """
         Initialize an instance of class NPC.
@@ -279,6 +429,160 @@ class NPC(Character):
             img: the name of the NPC folder to use (for animation purposes)
         """
         super().__init__(img)
+        self._walk = None
+        self._path = None
+
+    def walk(self, direction, until):
+        """
+        Start walking in a direction, moving once every tick until the centre
+        of the NPC reaches or passes a coordinate. An 'arrive' event is
+        emitted when it gets there.
+
+        Args:
+            direction: string containing the direction to walk in, one of
+                'up', 'down', 'left', or 'right'
+            until: int representing the x coordinate to stop at when walking
+                left or right, or the y coordinate when walking up or down
+        """
+        if not self._has_arrived(direction, until):
+            self._walk = (direction, until)
+            self._path = None
+
+    def walk_to(self, x, y):
+        """
+        Start walking to a point along the shortest path around the room's
+        boundaries, moving once every tick until the centre of the NPC is on
+        the point. An 'arrive' event is emitted when it gets there.
+
+        The path is found on the room's navigation grid, which keeps the
+        paths it has found, so NPCs walking the same way again don't search.
+        The grid only checks that the NPC fits with its centre on the centre
+        of a cell, so the NPC first steps to the centre of the cell it is
+        in, and only leaves the centre of the goal cell for the point if it
+        can do so without touching a boundary. Otherwise it stops at the
+        centre of the goal cell.
+
+        Args:
+            x: int representing the x coordinate to walk to
+            y: int representing the y coordinate to walk to
+
+        Returns:
+            True if the NPC has set off, False if there is no path there
+        """
+        nav = self._room.get_nav_grid()
+        start = nav.get_cell(self.get_pos())
+        goal = nav.get_cell((x, y))
+        cells = None
+        if start is not None and goal is not None:
+            cells = nav.find_path(start, goal, self._rect.size)
+        if cells is None:
+            return False
+        # Only the corners of the path are kept, as the NPC walks in a
+        # straight line between them
+        path = [nav.get_center(start)]
+        for before, cell, after in zip(cells, cells[1:], cells[2:]):
+            if (after[0] - cell[0], after[1] - cell[1]) != \
+                    (cell[0] - before[0], cell[1] - before[1]):
+                path.append(nav.get_center(cell))
+        path.append(nav.get_center(goal))
+        if self._is_clear(path[-1], (x, y)):
+            path.append((x, y))
+        # Points the NPC is already on would cost a tick each
+        pos = tuple(self.get_pos())
+        self._path = []
+        for point in path:
+            if point != pos:
+                self._path.append(point)
+                pos = point
+        if not self._path:
+            self._path = [pos]
+        self._walk = None
+        return True
+
+    def _is_clear(self, start, end):
+        """
+        Determine if the NPC can walk between two points, along the x axis
+        and then the y axis as _step_along_path does, without touching the
+        room's boundaries.
+
+        Args:
+            start: the x and y coordinates of the centre to start from
+            end: the x and y coordinates of the centre to walk to
+
+        Returns:
+            True if the way is clear, False otherwise
+        """
+        turn = (end[0], start[1])
+        for first, second in ((start, turn), (turn, end)):
+            rect = self._rect.copy()
+            rect.center = first
+            other = self._rect.copy()
+            other.center = second
+            if self._room.collides(rect.union(other)):
+                return False
+        return True
+
+    def is_walking(self):
+        """
+        Determine if the NPC is walking.
+
+        Returns:
+            True if the NPC is walking, False otherwise
+        """
+        return self._walk is not None or self._path is not None
+
+    def _has_arrived(self, direction, until):
+        """
+        Determine if the NPC has reached or passed a coordinate.
+
+        Args:
+            direction: string containing the direction of the walk
+            until: int representing the coordinate the walk stops at
+
+        Returns:
+            True if the NPC has reached or passed the coordinate, False
+            otherwise
+        """
+        x, y = self.get_pos()
+        return {'up': y <= until, 'down': y >= until,
+                'left': x <= until, 'right': x >= until}[direction]
+
+    def tick(self, elapsed_ms=helpers.TICK_MS):
+        """
+        Move the NPC on a tick if it is walking, and move its speech on,
+        without drawing it.
+
+        Args:
+            elapsed_ms: the time to move the speech on by, in ms. Defaults to
+                one tick
+        """
+        if self._walk is not None:
+            self.move(self._walk[0])
+            if self._has_arrived(*self._walk):
+                self._walk = None
+                triggers.emit('arrive', self._name)
+        elif self._path is not None:
+            self._step_along_path()
+        super().tick(elapsed_ms)
+
+    def _step_along_path(self):
+        """
+        Move the NPC a step towards the next corner of its path, along one
+        axis at a time, and emit an 'arrive' event when it reaches the end.
+        """
+        x, y = self.get_pos()
+        corner = self._path[0]
+        if corner[0] != x:
+            self.move('right' if corner[0] > x else 'left',
+                      min(5, abs(corner[0] - x)))
+        elif corner[1] != y:
+            self.move('down' if corner[1] > y else 'up',
+                      min(5, abs(corner[1] - y)))
+        if self.get_pos() == list(corner):
+            del self._path[0]
+            if not self._path:
+                self._path = None
+                triggers.emit('arrive', self._name)
 
     def spawn(self, x, y):
         """
@@ -291,26 +595,27 @@ class NPC(Character):
                 to spawn the NPC at
         """
         self._rect = self._rect.move(x, y)
+        self._last_topleft = None
 
-    def move(self, direction):
+    def move(self, direction, distance=5):
         """
-        Move the NPC in a given direction. Will not allow walking into
-        obstacles.
+        Move the NPC in a given direction. Doesn't check for obstacles, so
+        use walk_to to walk around them.
 
-        Assumes input will one of 'up', 'down', 'left', or 'right'.
+        Assumes input will one of 'up', 'down', 'left', or 'right'. NPCs
+        without images for walking up or down keep facing the way they were
+        while they do. The animation only moves on while the NPC is on
+        screen.
 
         Args:
             direction: string containing the direction to move the character.
-        """
-        if direction == 'up':
-            self._surf = self._animator.get_next('back')
-            self._rect.move_ip(0, -5)
-        if direction == 'down':
-            self._surf = self._animator.get_next('front')
-            self._rect.move_ip(0, 5)
-        if direction == 'left':
-            self._surf = self._animator.get_next('left')
-            self._rect.move_ip(-5, 0)
-        if direction == 'right':
-            self._surf = self._animator.get_next('right')
-            self._rect.move_ip(5, 0)
+            distance: the number of pixels to move. Defaults to 5, one step
+        """
+        type, dx, dy = {'up': ('back', 0, -1), 'down': ('front', 0, 1),
+                        'left': ('left', -1, 0),
+                        'right': ('right', 1, 0)}[direction]
+        if not self._animator.has_type(type):
+            type = self._animator.get_current_type()
+        if self._room is None or self._room.is_visible(self._rect):
+            self._surf = self._animator.get_next(type)
+        self._rect.move_ip(dx * distance, dy * distance)
@@ -1,10 +1,17 @@
 import pygame
 import helpers
-from pygame.locals import RLEACCEL
+import profiler
+import triggers
 import math
 import textwrap
 import interactables
 import character
+import threading
+from collections import OrderedDict
+
+# The font used for all the text in the game, and the image behind speech
+FONT_PATH = 'Media/fonts/iAWriterDuospace-Bold.otf'
+CHATBOX_PATH = 'Media/misc/chatbox-2.png'
 
 
 class Background(helpers.DataSprite):
@@ -16,6 +23,8 @@ class Background(helpers.DataSprite):
     The reason this is a separate class is to maintain consistency. This
     allows us to set 'dir' as 'backgrounds/' for all instances of this class.
     """
+    __slots__ = ()
+
     def __init__(self, data):
         """
         Initialize an instance of class Background.
@@ -45,8 +54,30 @@ class Room(helpers.DataSprite):
             state of the interactable in that room
         npcs: a list of instances of NPC objects, representing all the NPCs in
             a room
+        _grid: an instance of SpatialGrid indexing objects, used to check
+            collisions with the boundaries quickly
+        _nav: an instance of NavGrid built from objects, used to find the
+            paths npcs walk along
+        _interactable_ids: a list of ints the same length as interactables,
+            holding the position in the .csv of each interactable, so that
+            progress can be saved after interactables are removed
+        _sprites: an instance of SpatialGrid indexing the interactables and
+            npcs by where they are, so only the ones near the player are
+            checked each tick
+        _order: a dictionary where an interactable is the key and its
+            position in the .csv is the value, so interactables near the
+            player are ticked in the same order as interactables
+        _animated: a list of the interactables with images that change over
+            time, which are ticked wherever the player is
+        _near: a list of the interactables ticked last tick
+        _unfinished: int representing how many interactables are not in
+            their end state
     """
 
+    __slots__ = ('objects', 'entrances', 'exits', 'interactables', 'npcs',
+                 '_grid', '_nav', '_interactable_ids', '_sprites', '_order',
+                 '_animated', '_near', '_unfinished')
+
     def __init__(self, data):
         """
         Initializes an instance of Room.
@@ -55,43 +86,55 @@ class Room(helpers.DataSprite):
             data: string representing the room folder (NOT the path to the
                 folder) to find the .csv in.
         """
-        super().__init__(data, 'rooms/')
+        definition = helpers.read_definition(data, 'rooms/')
+        super().__init__(data, 'rooms/', definition)
         # Initializes all the objects (boundaries) of the room
         self.objects = []
-        for object in self._datafile.loc['objects'].dropna().values.tolist():
-            object = [int(obj) for obj in object.split('/')]
+        for object in definition.objects:
             self.objects.append(pygame.Rect(object[0] + self._rect.left,
                                             object[1] + self._rect.top,
                                             object[2], object[3]))
+        self._grid = helpers.SpatialGrid(self.objects)
+        self._nav = helpers.NavGrid(self.objects, self._rect)
         # Initializes the room's entrances from the csv
         self.entrances = []
-        for object in self._datafile.loc['entrances'].dropna().values.tolist():
-            object = [obj for obj in object.split('/')]
-            self.entrances.append([int(object[0]),
-                                   int(object[1]),
-                                   str(object[2])])
+        for entrance in definition.entrances:
+            self.entrances.append([entrance.x, entrance.y, entrance.room])
         # Initializes the room's exits from the csv
         self.exits = []
-        for object in self._datafile.loc['exits'].dropna().values.tolist():
-            object = [obj for obj in object.split('/')]
-            self.exits.append([pygame.Rect(int(object[0]),
-                                           int(object[1]),
-                                           int(object[2]), int(object[3])),
-                               str(object[4])])
+        for exit in definition.exits:
+            self.exits.append([pygame.Rect(exit.x, exit.y,
+                                           exit.width, exit.height),
+                               exit.room])
         # Initializes the room's interactables from the csv
+        self._sprites = helpers.SpatialGrid([])
         self.interactables = []
-        for item in self._datafile.loc['interactables'].dropna().values.\
-                tolist():
-            item = [i for i in item.split('/')]
-            self.interactables.append(interactables.Interactable(str(item[2]),
-                                                                 str(item[3])))
-            self.interactables[-1].place(int(item[0]), int(item[1]))
+        self._order = {}
+        self._animated = []
+        self._near = []
+        self._unfinished = 0
+        for item in definition.interactables:
+            interactable = interactables.Interactable(item.name,
+                                                      item.end_state)
+            self._order[interactable] = len(self.interactables)
+            self.interactables.append(interactable)
+            if interactable.is_animated():
+                self._animated.append(interactable)
+            if not interactable.is_end_state():
+                self._unfinished += 1
+            interactable.set_room(self)
+            interactable.place(item.x, item.y)
+            # Interactables far from the player aren't ticked, so they need
+            # to show their unhighlighted state from the start
+            interactable.un_highlight()
+        self._interactable_ids = list(range(len(self.interactables)))
         # Initializes the room's npcs from the csv
         self.npcs = []
-        for npc in self._datafile.loc['npcs'].dropna().values.tolist():
-            npc = [i for i in npc.split('/')]
-            self.npcs.append(character.NPC(str(npc[2])))
-            self.npcs[-1].spawn(int(npc[0]), int(npc[1]))
+        for npc in definition.npcs:
+            self.npcs.append(character.NPC(npc.name))
+            self.npcs[-1].spawn(npc.x, npc.y)
+            self.npcs[-1].set_room(self)
+            self._sprites.add(self.npcs[-1], self.npcs[-1].get_rect())
 
     def get_entrance(self, str):
         """
@@ -123,6 +166,142 @@ class Room(helpers.DataSprite):
         """
         return self.objects
 
+    def get_nav_grid(self):
+        """
+        Accessor for the navigation grid of the room.
+
+        Returns:
+            the instance of NavGrid built from the room's boundaries
+        """
+        return self._nav
+
+    def is_visible(self, rect):
+        """
+        Determine if a rect is at least partly inside the room, and so on
+        the screen.
+
+        Args:
+            rect: the rect to check
+
+        Returns:
+            True if the rect overlaps the room, False otherwise
+        """
+        return self._rect.colliderect(rect)
+
+    def collides(self, rect):
+        """
+        Determine if a rect overlaps any of the room's boundaries, only
+        checking the boundaries near it.
+
+        Args:
+            rect: the rect to check
+
+        Returns:
+            True if the rect overlaps a boundary, False otherwise
+        """
+        return self._grid.collides(rect)
+
+    def release(self):
+        """
+        Give back the shared resources used by the room's npcs, once the room
+        is unloaded.
+        """
+        for npc in self.npcs:
+            npc.release()
+
+    def get_npcs_near(self, rect):
+        """
+        Find the npcs that could be overlapping a rect, without checking
+        every npc in the room.
+
+        Args:
+            rect: the rect to look around
+
+        Returns:
+            a list of the npcs near the rect, including every npc
+            overlapping it
+        """
+        return [sprite for sprite in self._sprites.query(rect)
+                if sprite not in self._order]
+
+    def index_interactable(self, interactable):
+        """
+        Index an interactable by where it is now, after it has been placed.
+
+        Args:
+            interactable: the instance of Interactable that moved
+        """
+        self._sprites.move(interactable, interactable.get_rect())
+
+    def count_end_state(self, was_end_state, is_end_state):
+        """
+        Keep count of the interactables not in their end state when one of
+        them changes state.
+
+        Args:
+            was_end_state: True if the interactable was in its end state
+                before the change, False otherwise
+            is_end_state: True if the interactable is in its end state after
+                the change, False otherwise
+        """
+        self._unfinished += was_end_state - is_end_state
+
+    def remove_interactable(self, index):
+        """
+        Remove an interactable from the room, for instance when the player
+        picks it up.
+
+        Args:
+            index: int representing the position of the interactable in
+                interactables
+        """
+        interactable = self.interactables.pop(index)
+        del self._interactable_ids[index]
+        del self._order[interactable]
+        if interactable in self._animated:
+            self._animated.remove(interactable)
+        if interactable in self._near:
+            self._near.remove(interactable)
+        if not interactable.is_end_state():
+            self._unfinished -= 1
+        self._sprites.remove(interactable)
+        interactable.set_room(None)
+
+    def get_state(self):
+        """
+        Get the progress made in the room, so that it can be restored if the
+        room is unloaded and loaded again.
+
+        Returns:
+            a tuple of two tuples. The first holds the .csv position, state
+            and top left coordinates of each interactable still in the room,
+            and the second holds the state of each npc
+        """
+        items = tuple((idx, item.get_state(), tuple(item.get_rect().topleft))
+                      for idx, item in zip(self._interactable_ids,
+                                           self.interactables))
+        npcs = tuple(npc.get_state() for npc in self.npcs)
+        return items, npcs
+
+    def set_state(self, state):
+        """
+        Restore progress returned by get_state to a freshly loaded room.
+
+        Args:
+            state: the progress to restore, as returned by get_state
+        """
+        items, npcs = state
+        kept = [item[0] for item in items]
+        for index in range(len(self.interactables) - 1, -1, -1):
+            if self._interactable_ids[index] not in kept:
+                self.remove_interactable(index)
+        for item, (idx, item_state, pos) in zip(self.interactables, items):
+            item.set_state(item_state)
+            item.place(pos[0], pos[1])
+        for npc, npc_state in zip(self.npcs, npcs):
+            npc.set_state(npc_state)
+            self._sprites.move(npc, npc.get_rect())
+
     def draw_objects(self, screen):
         """
         Draw the currently established room boundaries in bright blue.
@@ -145,15 +324,13 @@ class Room(helpers.DataSprite):
 
         This function currently only checks that all interactables are in
         their end state, but in future could also contain other data such as
-        whether NPCs have been collided with.
+        whether NPCs have been collided with. The interactables not in their
+        end state are counted as they change, so this doesn't look at them.
 
         Returns:
             True if all criteria have been met, False otherwise
         """
-        for interactable in self.interactables:
-            if not interactable.is_end_state():
-                return False
-        return True
+        return self._unfinished == 0
 
     def update(self, screen, player):
         """
@@ -164,18 +341,357 @@ class Room(helpers.DataSprite):
             player: The player instance to check for interaction
         """
         super().update(screen)
-        # Updates all of the room's interactables
-        for interactable in self.interactables:
-            interactable.update(screen, player)
-        # Updates all of the room's npcs
-        for npc in self.npcs:
-            npc.update(screen)
+        self.update_sprites(screen, player)
+
+    def update_sprites(self, screen, player):
+        """
+        Update the interactables and npcs, without the room drawing.
+
+        Args:
+            screen: The screen to draw to
+            player: The player instance to check for interaction
+        """
+        self.tick_sprites(player)
+        self.draw_sprites(screen)
+
+    def tick_sprites(self, player):
+        """
+        Run one tick of the interactables and npcs without drawing them.
+
+        Only the interactables near the player, and those on screen that
+        animate, are ticked. The others can't be highlighted, so they are
+        unhighlighted once when the player moves away and then left alone.
+
+        Args:
+            player: The player instance to check for interaction
+        """
+        with profiler.section('interactables'):
+            near = [sprite for sprite in
+                    self._sprites.query(player.get_rect())
+                    if sprite in self._order]
+            near.extend(interactable for interactable in self._animated
+                        if interactable not in near and
+                        self.is_visible(interactable.get_rect()))
+            # Keep the order of the .csv, so the same interactable takes the
+            # interaction when two overlap the player
+            near.sort(key=self._order.get)
+            for interactable in self._near:
+                if interactable not in near:
+                    interactable.un_highlight()
+            for interactable in near:
+                interactable.tick(player)
+            self._near = near
+        with profiler.section('npcs'):
+            for npc in self.npcs:
+                npc.tick()
+                self._sprites.move(npc, npc.get_rect())
+
+    def draw_sprites(self, screen, alpha=1.0):
+        """
+        Draw the interactables and npcs, without the room drawing.
+
+        Args:
+            screen: the screen, or a DrawQueue, to draw to
+            alpha: how far between the last tick and the current one to draw
+                moving sprites, from 0 to 1. Defaults to 1, meaning the
+                current tick
+        """
+        with profiler.section('interactables'):
+            for interactable in self.interactables:
+                interactable.draw(screen)
+        with profiler.section('npcs'):
+            for npc in self.npcs:
+                npc.draw(screen, alpha)
+
+
+class LayerCompositor:
+    """
+    Class merging the background and the room into one opaque surface.
+
+    The background and room animate slowly, so most ticks they show the same
+    frames as the tick before. The merged surface is only drawn again when
+    one of them moves on to a new frame or is swapped for another, so most
+    ticks the base of the screen costs a single opaque blit.
+
+    Attributes:
+        _surf: the surface holding the background with the room on top
+        _layers: a tuple of the background and room, and the frames they
+            were showing, when _surf was last drawn
+    """
+    def __init__(self, size):
+        """
+        Initialize an instance of LayerCompositor.
+
+        Args:
+            size: the width and height of the screen
+        """
+        self._surf = pygame.Surface(size).convert()
+        self._layers = None
+
+    def get_surf(self):
+        """
+        Accessor for the surface the background and room are merged onto.
+
+        Returns:
+            the merged surface
+        """
+        return self._surf
+
+    def draw(self, screen, background, room):
+        """
+        Draw the background and room to the screen without animating them,
+        merging them again first if either has changed.
+
+        Args:
+            screen: the screen to draw to
+            background: the instance of Background to show
+            room: the instance of Room to show on top of the background
+        """
+        layers = (background, background.get_surf(), room, room.get_surf())
+        if layers != self._layers:
+            self._surf.fill((0, 0, 0))
+            background.draw(self._surf)
+            room.draw(self._surf)
+            self._layers = layers
+        screen.blit(self._surf, (0, 0))
+
+
+class RoomRegistry:
+    """
+    Class that loads rooms as the player needs them rather than all at once.
+
+    The exits in each room's .csv form a graph of which rooms lead to which.
+    Only the room the player is in is loaded straight away, and the images of
+    the rooms it leads to are decoded on a background thread so that they
+    are quick to load when the player walks through an exit. Rooms that can
+    no longer be reached from the player's room are unloaded, keeping the
+    progress made in them in case they are loaded again.
+
+    Attributes:
+        _names: list of the names of every room, in story order
+        _exits: a dictionary where the room name is the key and a list of the
+            names of the rooms its exits lead to is the value
+        _folders: a dictionary where the room name is the key and a list of
+            the animator folders used by the room is the value
+        _rooms: a dictionary of loaded rooms, where the room name is the key
+        _states: a dictionary of the progress made in unloaded rooms, where
+            the room name is the key
+        _prefetching: a dictionary of background threads decoding images,
+            where the room name is the key
+    """
+    def __init__(self, names):
+        """
+        Initialize an instance of RoomRegistry. No rooms are loaded yet.
+
+        Args:
+            names: list of strings representing the room folders (NOT the
+                paths to the folders) of every room, in story order
+        """
+        self._names = list(names)
+        self._exits = {}
+        self._folders = {}
+        for name in self._names:
+            definition = helpers.read_definition(name, 'rooms/')
+            self._exits[name] = [exit.room for exit in definition.exits]
+            self._folders[name] = ['Media/rooms/' + name]
+            for item in definition.interactables:
+                self._folders[name].append('Media/interactables/' + item.name)
+            for npc in definition.npcs:
+                self._folders[name].append('Media/characters/' + npc.name)
+        helpers.definition_cache.save()
+        self._rooms = {}
+        self._states = {}
+        self._prefetching = {}
+
+    def get_names(self):
+        """
+        Accessor for the names of every room.
+
+        Returns:
+            a list of strings containing the room names, in story order
+        """
+        return self._names
+
+    def get_loaded(self):
+        """
+        Accessor for the rooms currently loaded.
+
+        Returns:
+            a dictionary where the room name is the key and the instance of
+            Room is the value
+        """
+        return self._rooms
+
+    def get_folders(self, name):
+        """
+        Accessor for the animator folders used by a room.
+
+        Args:
+            name: string containing the name of the room
+
+        Returns:
+            a list of the paths of the folders of the room, its interactables
+            and its npcs
+        """
+        return self._folders[name]
+
+    def is_loaded(self, name):
+        """
+        Determine if a room is currently loaded.
+
+        Args:
+            name: string containing the name of the room
+
+        Returns:
+            True if the room is loaded, False otherwise
+        """
+        return name in self._rooms
+
+    def get(self, name):
+        """
+        Get a room, loading it if it is not already loaded.
+
+        Args:
+            name: string containing the name of the room
+
+        Returns:
+            the instance of Room
+        """
+        if name not in self._rooms:
+            # Let any prefetch of the room finish rather than decoding the
+            # same images twice
+            if name in self._prefetching:
+                self._prefetching.pop(name).join()
+            # Decode everything the room needs at once, so that building
+            # its sprites only has to convert their images
+            helpers.frame_store.prefetch(self._folders[name])
+            room = Room(name)
+            helpers.definition_cache.save()
+            if name in self._states:
+                room.set_state(self._states.pop(name))
+            self._rooms[name] = room
+        return self._rooms[name]
+
+    def enter(self, name):
+        """
+        Get the room the player is entering, then prefetch the rooms it leads
+        to and unload the rooms that can no longer be reached. Images
+        prefetched for rooms it doesn't lead to are dropped.
+
+        Args:
+            name: string containing the name of the room
+
+        Returns:
+            the instance of Room
+        """
+        room = self.get(name)
+        reachable = self.reachable(name)
+        for other in list(self._rooms):
+            if other not in reachable:
+                self.unload(other)
+        # Drop what was prefetched for rooms the player has walked away from
+        for other in list(self._prefetching):
+            if other not in self._exits[name]:
+                self._prefetching.pop(other).join()
+                self._discard(other)
+        for other in self._exits[name]:
+            if other in self._folders and other not in self._rooms and \
+                    other not in self._prefetching:
+                self._prefetching[other] = threading.Thread(
+                    target=helpers.frame_store.prefetch,
+                    args=(self._folders[other],), daemon=True)
+                self._prefetching[other].start()
+        return room
+
+    def get_states(self):
+        """
+        Get the progress made in every room that has been loaded.
+
+        Returns:
+            a dictionary where the room name is the key and the progress, as
+            returned by Room.get_state, is the value
+        """
+        states = dict(self._states)
+        for name, room in self._rooms.items():
+            states[name] = room.get_state()
+        return states
+
+    def set_states(self, states):
+        """
+        Restore the progress returned by get_states.
+
+        Loaded rooms whose progress already matches are kept as they are.
+        Other loaded rooms are unloaded, and have the progress restored when
+        they are next loaded, as only a freshly loaded room can get back
+        interactables that have been removed.
+
+        Args:
+            states: the progress to restore, as returned by get_states
+        """
+        for name in list(self._rooms):
+            if self._rooms[name].get_state() != states.get(name):
+                room = self._rooms.pop(name)
+                room.release()
+        self._states = {name: state for name, state in states.items()
+                        if name not in self._rooms}
+
+    def reachable(self, name):
+        """
+        Find every room that can be reached from a room by following exits.
+
+        Args:
+            name: string containing the name of the room to start from
+
+        Returns:
+            a set of the names of the reachable rooms, including the room
+            started from
+        """
+        found = {name}
+        to_visit = [name]
+        while to_visit:
+            for other in self._exits.get(to_visit.pop(), []):
+                if other not in found:
+                    found.add(other)
+                    to_visit.append(other)
+        return found
+
+    def unload(self, name):
+        """
+        Unload a room, keeping the progress made in it. The frames of its
+        folders are dropped from helpers.frame_store, except for those of
+        folders another loaded room also uses.
+
+        Args:
+            name: string containing the name of the room
+        """
+        if name in self._rooms:
+            room = self._rooms.pop(name)
+            self._states[name] = room.get_state()
+            room.release()
+            self._discard(name)
+
+    def _discard(self, name):
+        """
+        Drop the frames of a room's folders from helpers.frame_store, except
+        for those of folders a loaded or prefetched room uses.
 
+        Args:
+            name: string containing the name of the room
+        """
+        used = set()
+        for other in list(self._rooms) + list(self._prefetching):
+            used.update(self._folders[other])
+        for folder in self._folders[name]:
+            if folder not in used:
+                helpers.frame_store.discard(folder)
 
-class Chatbox(pygame.sprite.Sprite):
+
+class Chatbox:
     """
-    Class representing a textbox for characters to speak. Inherits from Pygame
-    Sprite class.
+    Class representing a textbox for characters to speak.
+
+    The chatbox image and font are shared by every chatbox through
+    helpers.resources, and given back with release.
 
     Attributes:
         _surf: the image representing the chatbox
@@ -188,18 +704,37 @@ class Chatbox(pygame.sprite.Sprite):
             Note this does not store all phrases a character says. It is only
             used when the method say_once is called to prevent a character
             repeating things every time an in-game condition is met
+        _layouts: a dictionary caching the wrapped lines of the phrase being
+            said, where the phrase is the key and a dictionary mapping the
+            number of characters shown to the wrapped lines is the value
+        _text: string containing the part of the phrase to show, as of the
+            last tick
+        _shown: string containing the part of the phrase currently shown
+        _line_surfs: list of the rendered lines currently shown
+        _line_cache: an ordered dictionary of rendered lines shared by all
+            chatboxes, where (text, font path, font size, colour) is the key.
+            The lines of a font are dropped once the font is released by
+            every chatbox
     """
+    __slots__ = ('_surf', '_rect', '_phrase', '_index', '_font', '_sprite',
+                 '_past_phrases', '_layouts', '_text', '_shown',
+                 '_line_surfs')
+    _line_cache = OrderedDict()
+    _line_cache_size = 512
+
     def __init__(self, sprite):
-        super().__init__()
-        self._surf = pygame.image.load('Media/misc/chatbox-2.png')
-        self._surf.set_colorkey((255, 255, 255), RLEACCEL)
+        self._surf = helpers.resources.get_image(CHATBOX_PATH,
+                                                 (255, 255, 255))
         self._rect = self._surf.get_rect()
         self._phrase = ''
         self._index = 0
-        self._font = pygame.font.Font('Media/fonts/iAWriterDuospace-Bold.otf',
-                                      15)
+        self._font = helpers.resources.get_font(FONT_PATH, 15)
         self._sprite = sprite
         self._past_phrases = []
+        self._layouts = {}
+        self._text = ''
+        self._shown = None
+        self._line_surfs = []
 
     def say(self, phrase):
         """
@@ -227,6 +762,50 @@ class Chatbox(pygame.sprite.Sprite):
             self._phrase = phrase
             self._past_phrases.append(phrase)
 
+    def get_surf(self):
+        """
+        Accessor for the chatbox image.
+
+        Returns:
+            the chatbox image as a surface
+        """
+        return self._surf
+
+    def release(self):
+        """
+        Give back the shared chatbox image and font, once the chatbox won't
+        be used again. Does nothing if they have already been given back.
+        """
+        if self._font is not None:
+            helpers.resources.release_image(CHATBOX_PATH)
+            helpers.resources.release_font(FONT_PATH, 15)
+            self._font = None
+            self._layouts.clear()
+            # Lines rendered in a font nothing uses any more can't be reused
+            if (FONT_PATH, 15) not in helpers.resources.get_users():
+                cache = Chatbox._line_cache
+                for key in [key for key in cache
+                            if key[1:3] == (FONT_PATH, 15)]:
+                    del cache[key]
+
+    def get_past_phrases(self):
+        """
+        Accessor for the phrases that have been said with say_once.
+
+        Returns:
+            a list of strings containing the phrases
+        """
+        return self._past_phrases
+
+    def set_past_phrases(self, phrases):
+        """
+        Set the phrases that count as already said by say_once.
+
+        Args:
+            phrases: a list of strings containing the phrases
+        """
+        self._past_phrases = list(phrases)
+
     def is_speaking(self):
         """
         Determine if a character is speaking or not.
@@ -236,20 +815,34 @@ class Chatbox(pygame.sprite.Sprite):
         """
         return self._phrase != ''
 
-    def _process_speech(self, speed):
+    def get_drawn(self):
+        """
+        Get what the chatbox showed on its last update.
+
+        Returns:
+            a tuple of the chatbox's rect and the text shown in it, or None if
+            the chatbox wasn't shown
+        """
+        if self._shown is None:
+            return None
+        return self._rect, self._shown
+
+    def _process_speech(self, speed, elapsed_ms=helpers.TICK_MS):
         """
         Split the phrase into chunks that will fit in the chatbox.
 
         Args:
-            speed: the speed in ticks that the phrase should scroll in the
-                chatbox.
+            speed: the speed in characters per tick that the phrase should
+                scroll in the chatbox.
+            elapsed_ms: the time to move the phrase on by, in ms. Defaults to
+                one tick
 
         Returns:
             a list containing the phrase broken into strings that will fit in
                 the chatbox
 
         """
-        self._index += 1
+        self._index += elapsed_ms / helpers.TICK_MS
         # If there is still stuff left to say, say it at the specified speed
         if math.floor(self._index * speed) <= len(self._phrase):
             processed = self._phrase[0:math.floor(self._index * speed)]
@@ -261,6 +854,7 @@ class Chatbox(pygame.sprite.Sprite):
             self._index = 0
             self._phrase = ''
             processed = ''
+            triggers.emit('speech_finished', self._sprite.get_name())
         # If the short delay hasn't been met, say the full phrase
         else:
             processed = self._phrase
@@ -269,34 +863,368 @@ class Chatbox(pygame.sprite.Sprite):
 
     def update(self, screen):
         """
-        Draw the text and chatbox in the game.
-
-        For long phrases, this will create a scrolling effect as text from the
-        phrase disappears to make space for more
+        Move the text on by a tick, then draw the text and chatbox in the
+        game.
 
         Args:
             screen: the screen to draw to
         """
-        # Split the speech into lines that can fit in the chatbox
-        processed = textwrap.fill(self._process_speech(0.6), 19).split('\n')
+        self.tick()
+        self.draw(screen)
+
+    def tick(self, elapsed_ms=helpers.TICK_MS):
+        """
+        Move the text on without drawing it. For long phrases, this will
+        create a scrolling effect as text from the phrase disappears to make
+        space for more
+
+        Args:
+            elapsed_ms: the time to move the text on by, in ms. Defaults to
+                one tick
+        """
+        self._text = self._process_speech(0.6, elapsed_ms)
+
+    def draw(self, screen, center=None):
+        """
+        Draw the text and chatbox in the game, if the character is speaking.
+
+        Args:
+            screen: the screen, or a DrawQueue, to draw to
+            center: the x and y coordinates the character is drawn centred
+                on. Defaults to None, meaning the character's position
+        """
         # If the phrase length is greater than zero, display the chatbox with
         # the phrase in it
         if len(self._phrase) > 0:
+            # Only re-render the lines when the text shown has changed. If
+            # it's long, keep only the last four lines. This creates a
+            # scrolling effect
+            if self._text != self._shown:
+                self._shown = self._text
+                self._line_surfs = [self._render_line(part) for part in
+                                    self._wrap(self._phrase, self._text)[-4:]]
             # Define position of the chatbox based on the character saying it
-            x = self._sprite.get_pos()[0]
-            y = self._sprite.get_pos()[1]
-            self._rect.centerx = x
-            self._rect.centery = y - 130
+            if center is None:
+                center = self._sprite.get_pos()
+            self._rect.centerx = center[0]
+            self._rect.centery = center[1] - 130
             # Show the chatbox
             screen.blit(self._surf, self._rect)
-            # Display the text. If it's long, show only the last four lines.
-            # This creates a scrolling effect
+            # Display the text
             i = 0
-            for part in processed[-4:]:
-                screen.blit(self._font.render(part, True, (0, 0, 0)),
+            for line in self._line_surfs:
+                screen.blit(line,
                             (self._rect.left + 8, self._rect.top + 90 + i))
                 # Increment line height so text doesn't print on top of itself
                 i += 15
+        else:
+            self._shown = None
+
+    def _wrap(self, phrase, shown):
+        """
+        Split the part of a phrase being shown into lines that can fit in the
+        chatbox, reusing the lines from the last time it was shown. Only the
+        layout of the phrase being said is kept.
+
+        Args:
+            phrase: string containing the whole phrase being said
+            shown: string containing the part of the phrase being shown
+
+        Returns:
+            a list of strings, one for each line
+        """
+        if phrase not in self._layouts:
+            self._layouts = {phrase: {}}
+        layout = self._layouts[phrase]
+        if len(shown) not in layout:
+            layout[len(shown)] = textwrap.fill(shown, 19).split('\n')
+        return layout[len(shown)]
+
+    def _render_line(self, text, colour=(0, 0, 0)):
+        """
+        Render a line of text, reusing the surface if the same line has
+        already been rendered in the same font and colour.
+
+        While a phrase scrolls in, only the line that grew is new, so it is
+        the only one rendered again.
+
+        Args:
+            text: string containing the line to render
+            colour: the colour to render the text in. Defaults to black
+
+        Returns:
+            the surface with the rendered line
+        """
+        key = (text, FONT_PATH, 15, colour)
+        cache = Chatbox._line_cache
+        if key in cache:
+            cache.move_to_end(key)
+        else:
+            cache[key] = self._font.render(text, True, colour)
+            if len(cache) > Chatbox._line_cache_size:
+                cache.popitem(last=False)
+        return cache[key]
+
+
+class Spotlight:
+    """
+    Class representing an overlay that stays centred on a sprite, such as the
+    spotlight in the maze or the frames of the teleport animation.
+
+    Overlay images are loaded from disk and converted to the display format
+    only once, then shared by every spotlight through _images. The default
+    spotlight image is much larger than the screen so that it covers the
+    screen wherever the player stands, so only the part that overlaps the
+    screen is blitted.
+
+    Attributes:
+        _images: a dictionary of display-format overlay surfaces shared by all
+            instances, where the image path is the key
+        _path: string containing the path of the image currently in use
+        _surf: the image currently in use
+        _rect: contains the location of the overlay
+    """
+    _images = {}
+
+    def __init__(self, img_path='Media/misc/spotlight/pixil-frame-0.png'):
+        """
+        Initialize an instance of class Spotlight.
+
+        Args:
+            img_path: path to the image to use. Defaults to the black screen
+                with a transparent circle
+        """
+        self._path = None
+        self._surf = None
+        self._rect = None
+        self.set_image(img_path)
+
+    def set_image(self, img_path):
+        """
+        Set the image used for the overlay, loading it if it has not been
+        used before.
+
+        Args:
+            img_path: path to the image to use
+
+        Returns:
+            True if the image was changed, False if it was already in use
+        """
+        if img_path == self._path:
+            return False
+        if img_path not in Spotlight._images:
+            Spotlight._images[img_path] = \
+                helpers.convert_image(helpers.load_image(img_path))
+        self._path = img_path
+        self._surf = Spotlight._images[img_path]
+        self._rect = self._surf.get_rect()
+        return True
+
+    @classmethod
+    def get_images(cls):
+        """
+        Accessor for the overlay images loaded so far, shared by every
+        spotlight.
+
+        Returns:
+            a dictionary where the image path is the key and the surface is
+            the value
+        """
+        return cls._images
+
+    def draw(self, screen, center):
+        """
+        Draw the overlay centred on a given point, blitting only the part of
+        the image that overlaps the screen.
+
+        Args:
+            screen: the screen, or a DrawQueue, to draw to
+            center: the x and y coordinates to centre the overlay on
+        """
+        self._rect.center = center
+        visible = self._rect.clip(screen.get_rect())
+        if visible.width > 0 and visible.height > 0:
+            screen.blit(self._surf, visible,
+                        visible.move(-self._rect.left, -self._rect.top))
+
+
+class Cutscene:
+    """
+    Class representing a sequence of images played over the game, such as the
+    intro or the teleport animation.
+
+    A cutscene doesn't run a loop of its own. The game advances it by the
+    time each frame takes and draws it, so events are still handled while it
+    plays. Its images are loaded on a background thread as soon as it is
+    created, and converted to the display format when first shown. If an
+    image hasn't loaded yet when it is due, the cutscene waits for it.
+
+    Attributes:
+        _paths: list of the paths of the images, in the order they are shown
+        _frame_ms: the time each image is shown for, in ms
+        _hold_ms: the time the last image is held for after the images have
+            played, in ms
+        _fade_ms: the time each image takes to fade in, in ms
+        _position: the top left corner to draw the images at, or None to
+            centre them on the point given to draw
+        _skippable: boolean indicating whether pressing a key ends the
+            cutscene early
+        _wait_for_key: boolean indicating whether the cutscene waits for a
+            key to be pressed after it has played
+        _loaded: list the same length as _paths, holding each image once it
+            has been loaded until it is converted, or None otherwise
+        _frames: list the same length as _paths, holding each image once it
+            has been converted, or None before then
+        _elapsed: the time the cutscene has been playing, in ms
+        _done: boolean indicating whether the cutscene has finished
+        _thread: the background thread loading the images, or None if the
+            images aren't loaded
+    """
+    def __init__(self, paths, frame_ms=200, hold_ms=0, fade_ms=0,
+                 position=(0, 0), skippable=True, wait_for_key=False,
+                 load=True):
+        """
+        Initialize an instance of Cutscene and start loading its images.
+
+        Args:
+            paths: list of the paths of the images to show, in order. Can be
+                empty, for a pause in the game
+            frame_ms: the time to show each image for, in ms. Defaults to
+                200
+            hold_ms: the time to hold the last image for after the images
+                have played, in ms. Defaults to 0
+            fade_ms: the time each image takes to fade in, in ms. Defaults to
+                0, meaning no fade
+            position: the top left corner to draw the images at, or None to
+                centre them on the point given to draw. Defaults to the top
+                left of the screen
+            skippable: whether pressing a key ends the cutscene early.
+                Defaults to True
+            wait_for_key: whether to wait for a key to be pressed after the
+                cutscene has played. Defaults to False
+            load: whether to load the images. Defaults to True. A cutscene
+                that isn't loaded plays for as long as one that is, but
+                draws nothing
+        """
+        self._paths = list(paths)
+        self._frame_ms = frame_ms
+        self._hold_ms = hold_ms
+        self._fade_ms = fade_ms
+        self._position = position
+        self._skippable = skippable
+        self._wait_for_key = wait_for_key
+        self._loaded = [None] * len(self._paths)
+        self._frames = [None] * len(self._paths)
+        self._elapsed = 0
+        self._done = False
+        self._thread = None
+        if load:
+            self._thread = threading.Thread(target=self._load, daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        """
+        Load every image in order. Runs on a background thread.
+        """
+        for i, path in enumerate(self._paths):
+            self._loaded[i] = helpers.load_image(path)
+
+    def get_index(self):
+        """
+        Find the image currently shown.
+
+        Returns:
+            the position of the image in the cutscene as an int, or None if
+            the cutscene has no images
+        """
+        if not self._paths:
+            return None
+        return min(int(self._elapsed // self._frame_ms), len(self._paths) - 1)
+
+    def update(self, elapsed_ms, wait=False):
+        """
+        Advance the cutscene, unless the next image hasn't loaded yet.
+
+        Args:
+            elapsed_ms: the time since the last update, in ms
+            wait: whether to wait for the images to load instead of pausing
+                the cutscene, so that it always takes the same number of
+                updates. Defaults to False
+        """
+        if self._done:
+            return
+        index = self.get_index()
+        next_index = None if index is None else index + 1
+        # Whether the cutscene moves on to an image that is being loaded
+        loading = self._thread is not None and next_index is not None and \
+            next_index < len(self._paths)
+        if loading and wait:
+            self._thread.join()
+        if loading and self._loaded[next_index] is None and \
+                self._frames[next_index] is None:
+            # Don't move past the current image until the next has loaded
+            self._elapsed = min(self._elapsed + elapsed_ms,
+                                next_index * self._frame_ms - 1)
+        else:
+            self._elapsed += elapsed_ms
+        if self._elapsed >= len(self._paths) * self._frame_ms + \
+                self._hold_ms and not self._wait_for_key:
+            self._done = True
+
+    def skip(self):
+        """
+        End the cutscene early because a key was pressed, if it can be
+        skipped or has finished playing and is waiting for a key.
+        """
+        if self._skippable or (self._wait_for_key and self._elapsed >=
+                               len(self._paths) * self._frame_ms +
+                               self._hold_ms):
+            self._done = True
+
+    def is_done(self):
+        """
+        Determine if the cutscene has finished.
+
+        Returns:
+            True if the cutscene has finished, False otherwise
+        """
+        return self._done
+
+    def has_position(self):
+        """
+        Determine if the cutscene is drawn at a fixed position, rather than
+        centred on a point.
+
+        Returns:
+            True if the cutscene has a fixed position, False otherwise
+        """
+        return self._position is not None
+
+    def draw(self, screen, center=None):
+        """
+        Draw the current image, if it has loaded.
+
+        Args:
+            screen: the screen to draw to
+            center: the x and y coordinates to centre the image on, if the
+                cutscene has no fixed position. Defaults to None
+        """
+        index = self.get_index()
+        if index is None:
+            return
+        if self._frames[index] is None:
+            if self._loaded[index] is None:
+                return
+            self._frames[index] = helpers.convert_image(self._loaded[index])
+            self._loaded[index] = None
+        frame = self._frames[index]
+        if self._fade_ms:
+            shown_ms = self._elapsed - index * self._frame_ms
+            frame.set_alpha(min(255, int(255 * shown_ms / self._fade_ms)))
+        if self._position is not None:
+            screen.blit(frame, self._position)
+        else:
+            screen.blit(frame, frame.get_rect(center=center))
 
 
 class Guide(helpers.DataSprite):
@@ -311,19 +1239,23 @@ class Guide(helpers.DataSprite):
         _lines: list of lines read from a txt file that the guide will display
         _current_index: int representing the currently displayed line's index
          in _lines
+        _text_surf: the text of both pages rendered onto one surface, or None
+            if it needs to be rendered again because the text has changed
     """
+    __slots__ = ('_state', '_font', '_lines', '_current_index', '_text_surf')
+
     def __init__(self):
         """
         Initialize an instance of the guide class
         """
         super().__init__('guide', 'misc/')
         self._state = 'close'
-        self._font = pygame.font.Font('Media/fonts/iAWriterDuospace-Bold.otf',
-                                      30)
+        self._font = helpers.resources.get_font(FONT_PATH, 30)
         with open('Media/misc/guide/guide.txt') as f:
             lines = f.readlines()
         self._lines = [line.strip() for line in lines]
         self._current_index = 0
+        self._text_surf = None
 
     def update(self, screen, player):
         """
@@ -334,13 +1266,42 @@ class Guide(helpers.DataSprite):
             screen: the screen to draw to
             player: the instance of Player to check if the guide is in use
         """
+        self.tick(player)
+        self.draw(screen)
+
+    def tick(self, player):
+        """
+        Open or close the guide if the player is using it, and move its
+        animation on by a tick, without drawing it.
+
+        Args:
+            player: the instance of Player to check if the guide is in use
+        """
         if player.is_guiding():
             self.toggle()
         self._surf = self._animator.get_next(self._state)
+
+    def draw(self, screen, alpha=1.0):
+        """
+        Draw the guide, and its text if it is open.
+
+        Args:
+            screen: the screen, or a DrawQueue, to draw to
+            alpha: unused, as the guide doesn't move. Defaults to 1
+        """
         screen.blit(self._surf, self._rect)
         if self._state == 'open':
             self.display_text(screen)
 
+    def is_open(self):
+        """
+        Determine if the guide is open.
+
+        Returns:
+            True if the guide is open, False otherwise
+        """
+        return self._state == 'open'
+
     def get_index(self):
         """
         Accessor for _current_index.
@@ -350,6 +1311,26 @@ class Guide(helpers.DataSprite):
         """
         return self._current_index
 
+    def get_state(self):
+        """
+        Get the progress state of the guide.
+
+        Returns:
+            a tuple of the index of the last line shown and whether the guide
+            is open, closed or showing a notification
+        """
+        return self._current_index, self._state
+
+    def set_state(self, state):
+        """
+        Restore a progress state returned by get_state.
+
+        Args:
+            state: the progress state to restore
+        """
+        self._current_index, self._state = state
+        self._text_surf = None
+
     def notification(self):
         """
         Show a notification
@@ -378,17 +1359,34 @@ class Guide(helpers.DataSprite):
         if idx == '':
             self._current_index += 1
             self.notification()
+            self._text_surf = None
         elif idx > self._current_index:
             self._current_index = idx
             self.notification()
+            self._text_surf = None
 
     def display_text(self, screen):
         """
         Show the text on the guide illustration, such that it doesn't run
         off the pages and creates breaks between sections.
 
+        The text is only laid out and rendered again when update_text has
+        changed it, so showing an open guide costs a single blit.
+
         Args:
-            screen: the screen to draw to.
+            screen: the screen, or a DrawQueue, to draw to
+        """
+        if self._text_surf is None:
+            self._text_surf = self._render_text()
+        screen.blit(self._text_surf, (150, 100))
+
+    def _render_text(self):
+        """
+        Render the text of both pages onto one transparent surface, to be
+        placed with its top left corner at the top left of the first page.
+
+        Returns:
+            the surface with the rendered text
         """
         # Split the speech into lines that can fit in the chatbox
         processed = []
@@ -399,13 +1397,19 @@ class Guide(helpers.DataSprite):
             if len(processed) + len(next_step) > numlines:
                 break
             processed = next_step + processed
-        # If the phrase length is greater than zero, display the chatbox with
-        # the phrase in it
+        # Render the first half of the lines on the left page and the second
+        # half on the right page, relative to the top left of the left page
+        rendered = []
         for i in range(0, min(numlines // 2, len(processed))):
-            # Display the text. If it's long, show only the last four lines.
-            # This creates a scrolling effect
-            screen.blit(self._font.render(processed[i], True, (0, 0, 0)),
-                        (150, 100 + (i * 30)))
+            rendered.append((self._font.render(processed[i], True, (0, 0, 0)),
+                             (0, i * 30)))
         for j in range(numlines // 2, min(numlines, len(processed))):
-            screen.blit(self._font.render(processed[j], True, (0, 0, 0)),
-                        (570, 100 + ((j - numlines // 2) * 30)))
+            rendered.append((self._font.render(processed[j], True, (0, 0, 0)),
+                             (420, (j - numlines // 2) * 30)))
+        width = max([pos[0] + line.get_width() for line, pos in rendered],
+                    default=0)
+        height = max([pos[1] + line.get_height() for line, pos in rendered],
+                     default=0)
+        surf = pygame.Surface((width, height), pygame.SRCALPHA)
+        surf.blits(rendered, doreturn=False)
+        return surf
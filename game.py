@@ -1,10 +1,16 @@
 import pygame
+import helpers
 import character
 import environment
+import profiler
+import triggers
+import replay
+import snapshot
 import os
 
 from pygame.locals import (
     K_ESCAPE,
+    K_F3,
     KEYDOWN,
     QUIT,
 )
@@ -18,43 +24,179 @@ class Game:
     Attributes:
         screen: the window to draw visuals on
         clock: Pygame clock object, keeps track of ingame time
-        rooms: a list of all the room instances in the game
+        rooms: an instance of RoomRegistry, which loads the rooms of the game
+            as they are needed
         current_room: the room instance the player is currently in
         backgrounds: a list of all the background instances in the game
         current_background: the background instance currently being displayed
         player: player controlled character, instance of the Player class
         guide: starts as None, becomes instance of Guide at appropriate
             point in the story
+        cutscenes: a list of instances of Cutscene waiting to play. The first
+            is playing, and the game is paused until it is done
+        frame_profiler: an instance of FrameProfiler timing each subsystem
+            on every frame, or None if the game is not being profiled
+        dirty_rects: boolean indicating whether only the parts of the window
+            that have changed are updated each frame
+        max_fps: the most frames to draw per second, or 0 for no limit
+        interpolate: boolean indicating whether moving sprites are drawn part
+            way between ticks, for smoother motion when frames are drawn more
+            often than ticks
+        _lag: the time in ms that has passed but hasn't been run as ticks
+            yet. Slightly negative after a tick is run early
+        _alpha: how far between the last tick and the current one the last
+            frame was drawn, from 0 to 1
+        _last_base: tuple of the background and room shown last frame, or
+            None if the whole window needs updating
+        _last_drawn: set of what was drawn over the background and room last
+            frame, in the format returned by _drawn_items
+        _bounds: dictionary caching the bounding rect of the visible pixels of
+            each sprite image, where the image is the key
+        _compositor: an instance of LayerCompositor merging the current
+            background and room
+        _queue: an instance of DrawQueue collecting the sprites, chatboxes
+            and guide drawn over the background and room each frame
+        _teleport: the cutscene of the mushroom ring teleporting the player,
+            or None before the player reaches the ring
+        _trapdoor: the cutscene pausing on the open trapdoor, or None before
+            the player finds it
+        _script: the instance of Script running the current room's story
+        _script_room: the name of the room _script belongs to, or None
+        unthrottled: boolean indicating whether every frame runs exactly one
+            tick without waiting, to replay a recording as fast as possible
+        _ticks: int representing the number of ticks run so far
+        _skip: boolean indicating whether a key has been pressed that skips
+            the cutscene playing, on the next tick
+        _recorder: an instance of Recorder writing the input of every tick,
+            or None if the game isn't being recorded
+        _replay: an instance of Replay giving the input of every tick in
+            place of the keyboard, or None if the game isn't being replayed
+        rendering: boolean indicating whether frames are drawn. Without
+            them the game runs as a simulation, one tick every frame as fast
+            as possible
+        autosave: the path of the snapshot file progress is saved to every
+            time the player enters a room, or None if it isn't saved
 
     """
 
-    def __init__(self):
+    # The most ticks to run before drawing a frame. If frames take longer
+    # than this many ticks, the game slows down rather than falling further
+    # and further behind
+    max_ticks_per_frame = 5
+    # A tick is run up to this many ms early. Frames capped at the tick rate
+    # arrive a little early or late, and without this a frame that came just
+    # under a tick runs none, then the next runs two, which stutters
+    tick_tolerance_ms = 1
+
+    # The layers of the draw queue. The room's interactables and npcs are
+    # drawn first, then the player and their spotlight, then the guide
+    room_layer = 0
+    player_layer = 1
+    guide_layer = 2
+
+    def __init__(self, frame_profiler=None, dirty_rects=False, max_fps=30,
+                 vsync=False, interpolate=False, record_to=None,
+                 replay_from=None, unthrottled=False, render=True,
+                 autosave=None):
         """
         Initialize an instance of the Game class.
+
+        The game logic always runs at 30 ticks per second. How often frames
+        are drawn is separate: capped at max_fps, uncapped, or in time with
+        the display.
+
+        Args:
+            frame_profiler: an instance of FrameProfiler to time each
+                subsystem with. Defaults to None, meaning nothing is timed
+            dirty_rects: whether to update only the parts of the window that
+                have changed each frame. Defaults to False, meaning the whole
+                window is updated
+            max_fps: the most frames to draw per second, or 0 for no limit.
+                Defaults to 30, one frame per tick
+            vsync: whether to draw frames in time with the display, instead
+                of limiting them with max_fps. Defaults to False
+            interpolate: whether to draw moving sprites part way between
+                ticks. Defaults to False
+            record_to: the path of a file to record the input of every tick
+                to. Defaults to None, meaning nothing is recorded
+            replay_from: the path of a recording to play instead of reading
+                the keyboard. Defaults to None, meaning the keyboard is read
+            unthrottled: whether to run one tick every frame without waiting,
+                instead of keeping to real time. Defaults to False
+            render: whether to draw frames and show them in the window.
+                Defaults to True. Without rendering nothing is drawn or
+                waited for, and cutscene images aren't loaded, so the game
+                logic runs thousands of ticks per second
+            autosave: the path of a snapshot file to save progress to every
+                time the player enters a room. Defaults to None, meaning
+                progress isn't saved
         """
+        self.frame_profiler = frame_profiler
+        profiler.install(frame_profiler)
+        self.dirty_rects = dirty_rects
+        self.max_fps = max_fps
+        self.interpolate = interpolate
+        self.unthrottled = unthrottled or not render
+        self.rendering = render
+        self.autosave = autosave
+        self._ticks = 0
+        self._skip = False
+        self._recorder = None
+        if record_to is not None:
+            self._recorder = replay.Recorder(record_to)
+        self._replay = None
+        if replay_from is not None:
+            self._replay = replay.Replay(replay_from)
+        self._lag = 0
+        self._alpha = 1.0
+        self._last_base = None
+        self._last_drawn = set()
+        self._bounds = {}
         # 500 / 250 / 125 room height
         SCREEN_HEIGHT = 700  # 350 or 175 or 88
         SCREEN_WIDTH = 1080  # 540 or 270 or 135
         # Set up the drawing window
-        self.screen = pygame.display.set_mode([SCREEN_WIDTH, SCREEN_HEIGHT])
+        if vsync:
+            # Waiting for the display limits the frame rate instead
+            self.max_fps = 0
+            try:
+                self.screen = pygame.display.set_mode(
+                    [SCREEN_WIDTH, SCREEN_HEIGHT], pygame.SCALED, vsync=1)
+            except pygame.error:
+                # Not every display driver can wait for the display
+                self.max_fps = max_fps
+                vsync = False
+        if not vsync:
+            self.screen = pygame.display.set_mode([SCREEN_WIDTH,
+                                                   SCREEN_HEIGHT])
+        self._compositor = environment.LayerCompositor(self.screen.get_size())
+        self._queue = helpers.DrawQueue(self.screen.get_size())
+        # Load images from the asset pack, if it has been built
+        helpers.use_asset_pack()
         pygame.key.set_repeat(100, 100)
         # Set up the clock to limit ticks per second
         self.clock = pygame.time.Clock()
         # Set up all the rooms the game will cycle through and
-        # initialize the first as the current room
-        self.rooms = [
-            environment.Room('lightforestentrance'),
-            environment.Room('lightforest1'),
-            environment.Room('lightforest2'),
-            environment.Room('darkforestcampfire'),
-            environment.Room('darkforest1'),
-            environment.Room('maze'),
-            environment.Room('innoutside'),
-            environment.Room('innlobby')
-        ]
+        # load the first as the current room
+        self.rooms = environment.RoomRegistry([
+            'lightforestentrance',
+            'lightforest1',
+            'lightforest2',
+            'darkforestcampfire',
+            'darkforest1',
+            'maze',
+            'innoutside',
+            'innlobby'
+        ])
+        self.current_room = self.rooms.enter('lightforestentrance')
         # Set up all the backgrounds the game will cycle through and
         # initialize the first as the current background
-        self.current_room = self.rooms[0]
+        helpers.frame_store.prefetch([
+            'Media/backgrounds/daysky',
+            'Media/backgrounds/nightsky',
+            'Media/backgrounds/twilightsky',
+            'Media/characters/player'
+        ])
         self.backgrounds = [
             environment.Background('daysky'),
             environment.Background('nightsky'),
@@ -66,45 +208,70 @@ class Game:
         self.player = character.Player('player')
         self.guide = None
         self.conversations = []
+        self.cutscenes = []
+        self._teleport = None
+        self._trapdoor = None
+        self._script = None
+        self._script_room = None
 
     def intro(self):
         """
-        Play an introduction animation at the beginning of the game.
+        Queue an introduction animation to play at the beginning of the game:
+        the copepod studios logo fading in, then the opening screen of
+        Misguided, which stays until a key is pressed.
         """
-        intro = pygame.image.load("Media/wallpaper/copepod-studios.png")
-        credit = True
-        # Fade in of copepod studios logo
-        for i in range(225):
-            intro.set_alpha(i)
-            self.screen.blit(intro, [265, 200])
-            pygame.display.flip()
-            self.clock.tick(35)
-        # Delay for a short time
-        self.clock.tick(60)
-        # Main opening screen of Misguided
-        filelist = sorted(os.listdir('Media/wallpaper/introsequence'))
-        for file in filelist:
-            intro = pygame.image.load('Media/wallpaper/introsequence/' + file)
-            self.screen.blit(intro, [0, 0])
-            pygame.display.flip()
-            self.clock.tick(6)
-        pygame.event.clear()
-        # Wait for keypress to continue to the game
-        while credit is True:
-            for event in pygame.event.get():
-                if event.type == KEYDOWN:
-                    credit = False
-            self.clock.tick(30)
+        self.cutscenes.append(environment.Cutscene(
+            ['Media/wallpaper/copepod-studios.png'], frame_ms=6400,
+            fade_ms=6400, position=(265, 200), load=self.rendering))
+        self.cutscenes.append(environment.Cutscene(
+            [os.path.join('Media/wallpaper/introsequence', filename)
+             for filename in sorted(os.listdir(
+                 'Media/wallpaper/introsequence'))],
+            frame_ms=1000 / 6, wait_for_key=True, load=self.rendering))
 
     def update(self):
         """
-        Update all game components
+        Run one tick of all game components, without drawing them.
         """
-        self.current_background.update(self.screen)
-        self.current_room.update(self.screen, self.player)
-        self.player.update(self.screen)
+        with profiler.section('background'):
+            self.current_background.animate()
+            self.current_room.animate()
+        with profiler.section('room'):
+            self.current_room.tick_sprites(self.player)
+        with profiler.section('player'):
+            self.player.tick()
         if self.guide is not None:
-            self.guide.update(self.screen, self.player)
+            with profiler.section('guide'):
+                self.guide.tick(self.player)
+
+    def draw(self, alpha=1.0):
+        """
+        Draw all game components to the screen.
+
+        The background and room are drawn straight to the screen. Everything
+        over them is queued, so what is off screen is left out, then drawn
+        in one batch.
+
+        Args:
+            alpha: how far between the last tick and the current one to draw
+                moving sprites, from 0 to 1. Defaults to 1, meaning the
+                current tick
+        """
+        with profiler.section('background'):
+            self._compositor.draw(self.screen, self.current_background,
+                                  self.current_room)
+        with profiler.section('room'):
+            self._queue.set_layer(Game.room_layer)
+            self.current_room.draw_sprites(self._queue, alpha)
+        with profiler.section('player'):
+            self._queue.set_layer(Game.player_layer)
+            self.player.draw(self._queue, alpha)
+        if self.guide is not None:
+            with profiler.section('guide'):
+                self._queue.set_layer(Game.guide_layer)
+                self.guide.draw(self._queue)
+        with profiler.section('blits'):
+            self._queue.flush(self.screen)
 
     def run(self):
         """
@@ -112,12 +279,18 @@ class Game:
 
         This function contains the main game loop and game logic. It will run
         the game until the player quits.
+
+        If there is an autosave, the game continues from it instead of
+        starting with the intro.
         """
-        # First run the intro
-        self.intro()
         running = True
-        # Spawn the player
-        self.player.spawn(self.current_room, 'initial')
+        if not self.resume():
+            # First queue the intro
+            self.intro()
+            # Spawn the player
+            self.player.spawn(self.current_room, 'initial')
+        # The first frame is assumed to take one tick
+        elapsed_ms = helpers.TICK_MS
         # Main game loop
         while running:
             # Look at every event in the queue
@@ -127,32 +300,393 @@ class Game:
                     # Was it the Escape key? If so, stop the loop.
                     if event.key == K_ESCAPE:
                         running = False
+                    # Was it F3? If so, show or hide the profiler overlay
+                    elif event.key == K_F3 and \
+                            self.frame_profiler is not None:
+                        self.frame_profiler.toggle_overlay()
+                    # Any other key skips the cutscene playing, if any,
+                    # on the next tick
+                    else:
+                        self._skip = True
 
                 # Did the user click the window close button?
                 # If so, stop the loop.
                 elif event.type == QUIT:
                     running = False
-            # Run the room specific functions through room manager, and handle
-            # the case in which the player tries to exit the room
-            if self.room_manager() and (self.player.is_exiting() is not None):
+            self.step(pygame.key.get_pressed(), elapsed_ms)
+            if self._replay is not None and \
+                    self._replay.is_finished(self._ticks):
+                running = False
+            # Control the frames per second
+            if self.unthrottled:
+                elapsed_ms = helpers.TICK_MS
+            else:
+                elapsed_ms = self.clock.tick(self.max_fps)
+        # Done! Time to quit.
+        if self._recorder is not None:
+            self._recorder.close(self._ticks)
+        if self.frame_profiler is not None:
+            self.frame_profiler.close()
+        helpers.definition_cache.save()
+        pygame.quit()
+
+    def step(self, pressed_keys, elapsed_ms=helpers.TICK_MS):
+        """
+        Run the game on by the time since the last frame, then draw a frame
+        and update the display, unless the game isn't rendering.
+
+        The time is run as fixed length ticks, so the game runs at the same
+        speed however long frames take. Time left over that isn't a whole
+        tick is kept for the next frame, and a tick within
+        tick_tolerance_ms of being due is run early, its missing time taken
+        from the next frame.
+
+        Args:
+            pressed_keys: the state of every key, as returned by
+                pygame.key.get_pressed
+            elapsed_ms: the time since the last frame, in ms. Defaults to
+                one tick
+        """
+        if self.frame_profiler is not None:
+            self.frame_profiler.begin_frame()
+        self._lag += elapsed_ms
+        ticks = 0
+        while self._lag >= helpers.TICK_MS - Game.tick_tolerance_ms:
+            if ticks == Game.max_ticks_per_frame:
+                # Drop the time that can't be caught up on
+                self._lag = 0
+                break
+            self.tick(pressed_keys)
+            self._lag -= helpers.TICK_MS
+            ticks += 1
+        if self.rendering:
+            self.render(max(self._lag, 0) / helpers.TICK_MS
+                        if self.interpolate else 1.0)
+        if self.frame_profiler is not None:
+            self.frame_profiler.end_frame()
+
+    def fast_forward(self, pressed_keys, ticks, until=None):
+        """
+        Run ticks of the game logic with the same input, without drawing,
+        for scripted playthroughs.
+
+        Args:
+            pressed_keys: the state of every key, in the format returned by
+                pygame.key.get_pressed
+            ticks: the most ticks to run
+            until: a function taking the game that stops the ticks early when
+                it returns True. Defaults to None, meaning all the ticks run
+
+        Returns:
+            the number of ticks run
+        """
+        for i in range(ticks):
+            self.tick(pressed_keys)
+            if until is not None and until(self):
+                return i + 1
+        return ticks
+
+    def tick(self, pressed_keys):
+        """
+        Run a single tick of the game logic: run the room function, move the
+        player to the next room if they are exiting, move the player, then
+        update everything.
+
+        While a cutscene is playing, the room function doesn't run and the
+        player can't move.
+
+        When the game is being replayed, the input comes from the recording
+        instead, and when it is being recorded, the input is written down.
+
+        Args:
+            pressed_keys: the state of every key, as returned by
+                pygame.key.get_pressed
+        """
+        if self._replay is not None:
+            pressed_keys, self._skip = self._replay.get(self._ticks)
+        elif self._recorder is not None:
+            self._recorder.record(self._ticks, pressed_keys, self._skip)
+        if self._skip and self.cutscenes:
+            self.cutscenes[0].skip()
+        self._skip = False
+        self._ticks += 1
+        cutscene = self.cutscenes[0] if self.cutscenes else None
+        # Remember where the characters were, to draw them between ticks
+        self.player.remember_position()
+        for npc in self.current_room.npcs:
+            npc.remember_position()
+        if cutscene is None:
+            # Run the room specific functions through room manager, and
+            # handle the case in which the player tries to exit the room
+            if self.room_manager() and \
+                    (self.player.is_exiting() is not None):
                 rooms = self.player.is_exiting()
-                self.current_room = [room for room in self.rooms
-                                     if room.get_name() == rooms[0]][0]
-                self.player.spawn(self.current_room, rooms[1])
-            # Move the player based on input, then update everything
-            self.player.move(pygame.key.get_pressed())
+                with profiler.section('room_change'):
+                    self.current_room = self.rooms.enter(rooms[0])
+                    self.player.spawn(self.current_room, rooms[1])
+                if self.autosave is not None:
+                    with profiler.section('autosave'):
+                        self.save(self.autosave)
+            # Move the player based on input
+            with profiler.section('player_move'):
+                self.player.move(pressed_keys)
+        else:
+            with profiler.section('cutscene'):
+                # Recorded and replayed games wait for images to load, so
+                # cutscenes take the same number of ticks every time
+                wait = self._recorder is not None or \
+                    self._replay is not None
+                cutscene.update(helpers.TICK_MS, wait)
+            if cutscene.is_done():
+                self.cutscenes.pop(0)
+                # Update the whole window next frame, to clear the cutscene
+                self._last_base = None
+        # Update everything, unless a cutscene covers it
+        if cutscene is None or not cutscene.has_position():
             self.update()
-            # These lines are for debugging boundaries
-            # self.current_room.draw_objects(self.screen)
-            # self.player.draw_rect(self.screen)
 
-            # Update the display based on the screen
+    def render(self, alpha=1.0):
+        """
+        Draw a frame and update the display. The cutscene playing, if any, is
+        drawn over the game, or instead of the game if it covers the screen.
+
+        Args:
+            alpha: how far between the last tick and the current one to draw
+                moving sprites, from 0 to 1. Defaults to 1, meaning the
+                current tick
+        """
+        self._alpha = alpha
+        cutscene = self.cutscenes[0] if self.cutscenes else None
+        if cutscene is None or not cutscene.has_position():
+            self.draw(alpha)
+        if cutscene is not None:
+            with profiler.section('cutscene'):
+                cutscene.draw(self.screen,
+                              self.player.get_draw_rect(alpha).center)
+        # These lines are for debugging boundaries
+        # self.current_room.draw_objects(self.screen)
+        # self.player.draw_rect(self.screen)
+        if self.frame_profiler is not None:
+            with profiler.section('overlay'):
+                self.frame_profiler.draw(self.screen)
+
+        # Update the display based on the screen
+        with profiler.section('flip'):
+            self.show_frame()
+
+    def show_frame(self):
+        """
+        Show what has been drawn on the screen in the window. The screen
+        doesn't need clearing afterwards, because the next frame starts by
+        drawing the opaque background and room over all of it.
+
+        In dirty rectangle mode, only the parts of the window where sprites or
+        chatboxes have moved or changed are updated. The whole window is
+        still updated when the background or room changes, their animation
+        moves on a frame, or the spotlight, guide or profiler overlay is
+        covering the screen.
+
+        Returns:
+            a list of the rects of the window that were updated, or None if
+            the whole window was
+        """
+        if not self.dirty_rects:
             pygame.display.flip()
-            self.screen.fill((0, 0, 0))
-            # Control the game ticks per second
-            self.clock.tick(30)
-        # Done! Time to quit.
-        pygame.quit()
+            return None
+        base = (self.current_background, self.current_room)
+        drawn = self._drawn_items()
+        if base != self._last_base or \
+                self.current_background.has_changed() or \
+                self.current_room.has_changed() or \
+                self.player.is_spotlight_on() or self.cutscenes or \
+                (self.guide is not None and self.guide.is_open()) or \
+                (self.frame_profiler is not None and
+                 self.frame_profiler.is_visible()):
+            pygame.display.flip()
+            rects = None
+        else:
+            rects = [pygame.Rect(item[1]) for item in
+                     drawn ^ self._last_drawn]
+            pygame.display.update(rects)
+        self._last_base = base
+        self._last_drawn = drawn
+        return rects
+
+    def _drawn_items(self):
+        """
+        List what was drawn over the background and room this frame.
+
+        Returns:
+            a set of tuples, one for each sprite and chatbox drawn, holding
+            what was drawn and the part of the screen it covered. Anything
+            drawn the same way in two frames has the same tuple in both
+        """
+        items = set()
+        sprites = [self.player] + self.current_room.npcs + \
+            self.current_room.interactables
+        if self.guide is not None:
+            sprites.append(self.guide)
+        for sprite in sprites:
+            surf = sprite.get_surf()
+            if surf not in self._bounds:
+                self._bounds[surf] = surf.get_bounding_rect()
+            rect = self._bounds[surf].move(
+                sprite.get_draw_rect(self._alpha).topleft)
+            items.add((id(surf), tuple(rect)))
+        for character in [self.player] + self.current_room.npcs:
+            drawn = character.get_chatbox().get_drawn()
+            if drawn is not None:
+                items.add((drawn[1], tuple(drawn[0])))
+        return items
+
+    def get_memory_report(self):
+        """
+        Report how much memory the loaded parts of the game take up.
+
+        Frames are shared between sprites using the same folder, so they are
+        counted once per folder rather than once per sprite, and a folder
+        used by two rooms counts towards both.
+
+        Returns:
+            a dictionary of three dictionaries. 'rooms' has the name of each
+            loaded room as the key and the bytes of its frames and of the
+            room, interactable and npc objects as the value. 'sprites' has
+            the class name of each kind of sprite as the key and the bytes of
+            every loaded sprite of that kind as the value, not counting
+            frames. 'surfaces' has the path of each folder of frames or
+            shared image, or the name of each other surface the game keeps,
+            as the key and the bytes of its pixels as the value
+        """
+        usage = helpers.frame_store.get_usage()
+        rooms = {}
+        sprites = {}
+        loaded = [self.player] + self.backgrounds
+        if self.guide is not None:
+            loaded.append(self.guide)
+        for name, room in self.rooms.get_loaded().items():
+            room_sprites = [room] + room.interactables + room.npcs
+            loaded += room_sprites
+            rooms[name] = sum(usage.get(folder, 0) for folder in
+                              self.rooms.get_folders(name)) + \
+                sum(sprite.get_bytes() for sprite in room_sprites)
+        for sprite in loaded:
+            kind = type(sprite).__name__
+            sprites[kind] = sprites.get(kind, 0) + sprite.get_bytes()
+        surfaces = dict(usage)
+        surfaces['screen'] = helpers.get_surface_bytes(self.screen)
+        surfaces['compositor'] = helpers.get_surface_bytes(
+            self._compositor.get_surf())
+        images = dict(environment.Spotlight.get_images())
+        images.update(helpers.resources.get_images())
+        for path, surf in images.items():
+            surfaces[path] = helpers.get_surface_bytes(surf)
+        return {'rooms': rooms, 'sprites': sprites, 'surfaces': surfaces}
+
+    def get_progress(self):
+        """
+        Get the progress made in the game, as plain values that can be
+        saved.
+
+        Cutscenes aren't part of the progress, so a snapshot taken while one
+        is playing restores to the game after it.
+
+        Returns:
+            a dictionary holding the name of the room the player is in, the
+            state of the player, their inventory and whether their spotlight
+            is on, the state of the guide or None before it is found, the
+            conversation lines left to say, the position of the background
+            in backgrounds, and the progress in each room that has been
+            loaded
+        """
+        return {
+            'room': self.current_room.get_name(),
+            'player': self.player.get_state(),
+            'inventory': list(self.player.inventory),
+            'spotlight': self.player.is_spotlight_on(),
+            'guide': None if self.guide is None else self.guide.get_state(),
+            'conversations': list(self.conversations),
+            'background': self.backgrounds.index(self.current_background),
+            'rooms': self.rooms.get_states(),
+        }
+
+    def set_progress(self, progress):
+        """
+        Restore progress returned by get_progress. Only the rooms whose
+        progress has changed are loaded again, and the script of the room the
+        player is in starts again on the next tick.
+
+        Args:
+            progress: the progress to restore, as returned by get_progress
+        """
+        self.rooms.set_states(progress['rooms'])
+        self.current_room = self.rooms.enter(progress['room'])
+        self.player.set_room(self.current_room)
+        self.player.set_state(progress['player'])
+        self.player.inventory = list(progress['inventory'])
+        if progress['spotlight']:
+            self.player.spotlight_on()
+        else:
+            self.player.spotlight_off()
+        if progress['guide'] is None:
+            self.guide = None
+        else:
+            if self.guide is None:
+                self.guide = environment.Guide()
+            self.guide.set_state(progress['guide'])
+        self.conversations = list(progress['conversations'])
+        self.current_background = self.backgrounds[progress['background']]
+        self.cutscenes = []
+        self._script = None
+        self._script_room = None
+        triggers.install(None)
+        # Update the whole window next frame
+        self._last_base = None
+
+    def resume(self):
+        """
+        Continue from the autosave, if there is one the game can restore.
+
+        Returns:
+            True if the progress in the autosave was restored, False
+            otherwise
+        """
+        if self.autosave is None or not os.path.exists(self.autosave):
+            return False
+        start = self.get_progress()
+        try:
+            self.load(self.autosave)
+        except (ValueError, KeyError, TypeError, IndexError):
+            # Saved by another version of the game or damaged, so undo
+            # whatever was restored and start again
+            self.set_progress(start)
+            return False
+        return True
+
+    def save(self, path):
+        """
+        Save the progress made in the game to a snapshot file.
+
+        Args:
+            path: the path to the snapshot file
+        """
+        snapshot.write(path, self.get_progress())
+
+    def load(self, path):
+        """
+        Restore the progress saved in a snapshot file.
+
+        Args:
+            path: the path to the snapshot file
+
+        Raises:
+            ValueError: if the file is not a snapshot the game can restore,
+                or holds different progress than the game saves
+        """
+        progress = snapshot.read(path)
+        if set(progress) != set(self.get_progress()):
+            raise ValueError(path + ' does not hold the progress of this '
+                             'game')
+        self.set_progress(progress)
 
     def conversation(self, p1, p2):
         """
@@ -161,7 +695,8 @@ class Game:
 
         Assumes that self.conversations is a list, and that its elements
         have been set to contain the lines the characters will say, beginning
-        with the first speaker's first line.
+        with the first speaker's first line. Emits a 'conversation_finished'
+        event when the last line is said.
 
         Args:
             p1: the first character to speak
@@ -177,110 +712,142 @@ class Game:
                 else:
                     p2.say_once(self.conversations[0])
                     del self.conversations[0]
+                if not self.conversations:
+                    triggers.emit('conversation_finished')
             return True
         else:
             return False
 
     def room_manager(self):
         """
-        Run the correct room function based on which room the character is in.
-        """
-        if self.current_room == self.rooms[0]:
-            return self.room0()
-        elif self.current_room == self.rooms[1]:
-            return self.room1()
-        elif self.current_room == self.rooms[2]:
-            return self.room2()
-        elif self.current_room == self.rooms[3]:
-            return self.room3()
-        elif self.current_room == self.rooms[4]:
-            return self.room4()
-        elif self.current_room == self.rooms[5]:
-            return self.room5()
-        elif self.current_room == self.rooms[6]:
-            return self.room6()
-        elif self.current_room == self.rooms[7]:
-            return self.room7()
+        Run the script of the room the player is in, loading it first if the
+        player has just entered the room.
+
+        Returns:
+            True if the player is at an exit and the room's script lets them
+                leave, False otherwise
+        """
+        name = self.current_room.get_name()
+        with profiler.section('script:' + name):
+            if self._script_room != name:
+                room_functions = [self.room0, self.room1, self.room2,
+                                  self.room3, self.room4, self.room5,
+                                  self.room6, self.room7]
+                index = self.rooms.get_names().index(name)
+                self._script = room_functions[index]()
+                self._script_room = name
+                triggers.install(self._script)
+                triggers.emit('enter', name)
+            self._script.dispatch(self.player, self.current_room)
+            return self.player.is_exiting() is not None and \
+                self._script.can_exit()
 
     def room0(self):
         """
-        Run first room of the game.
+        Script the first room of the game.
 
         In this room the player meets the tutorial NPC who tells them how to
         interact with objects.
 
         Returns:
-            True if the NPC has finished talking and the room is clear, False
-                otherwise
+            an instance of Script that lets the player leave once the NPC
+                has finished talking and the room is clear
         """
         tutorial_man = self.current_room.npcs[0]
-        # If the player passes the initial boundary, tutorial man walks
-        # over and speaks
-        if (self.player.get_pos()[0] > 200 or tutorial_man.get_pos()[0] < 1090)\
-                and tutorial_man.get_pos()[0] > 500:
-            tutorial_man.move('left')
-            tutorial_man.say_once('Don\'t go into that forest, it\'s big and '
-                                  'spooky!')
-        # If the player starts heading into the forest, tutorial man speaks
-        if self.player.get_pos()[0] > 600 and tutorial_man.get_pos()[0] <= 500\
-                and tutorial_man.is_speaking() is False:
-            tutorial_man.say_once('If you must go into the forest, '
-                                  'at least take this advice: if you'
-                                  ' see anything that highlights in yellow, '
-                                  'you can interact with it by pressing '
-                                  'spacebar')
-        # If the player walks up to tutorial man, he speaks
-        if tutorial_man.is_speaking() is False and \
-                self.player.collide(tutorial_man):
-            tutorial_man.say('if you see anything that highlights in yellow,'
-                             ' you can interact with it by pressing spacebar')
-        # If tutorial man is not speaking, the player can exit
-        if self.current_room.is_clear() and tutorial_man.is_speaking() is False:
-            return True
-        return False
+
+        def walk_over():
+            tutorial_man.walk('left', 500)
+            tutorial_man.say_once('Don\'t go into that forest, it\'s big '
+                                  'and spooky!')
+
+        def can_advise():
+            return self.player.get_pos()[0] > 600 and \
+                tutorial_man.get_pos()[0] <= 500 and \
+                not tutorial_man.is_speaking()
+
+        def can_repeat():
+            return not tutorial_man.is_speaking() and \
+                self.player.collide(tutorial_man)
+
+        return triggers.Script([
+            # If the player passes the initial boundary, tutorial man walks
+            # over and speaks
+            triggers.Trigger([('region', 'path')], walk_over,
+                             lambda: tutorial_man.get_pos()[0] > 500),
+            # If the player starts heading into the forest, tutorial man
+            # speaks
+            triggers.Trigger(
+                [('region', 'forest'), ('arrive', tutorial_man.get_name()),
+                 ('speech_finished', tutorial_man.get_name())],
+                lambda: tutorial_man.say_once(
+                    'If you must go into the forest, at least take this '
+                    'advice: if you see anything that highlights in yellow, '
+                    'you can interact with it by pressing spacebar'),
+                can_advise),
+            # If the player walks up to tutorial man, he speaks
+            triggers.Trigger(
+                [('collide', tutorial_man.get_name()),
+                 ('speech_finished', tutorial_man.get_name())],
+                lambda: tutorial_man.say(
+                    'if you see anything that highlights in yellow, you can '
+                    'interact with it by pressing spacebar'),
+                can_repeat),
+        ], regions={
+            'path': pygame.Rect(201, 0, 880, 700),
+            'forest': pygame.Rect(601, 0, 480, 700),
+        },
+            # If tutorial man is not speaking, the player can exit
+            exit_when=lambda: self.current_room.is_clear() and
+            not tutorial_man.is_speaking())
 
     def room1(self):
         """
-        Run second room of the game.
+        Script the second room of the game.
 
         In this room, the player walks through unthreatening forest.
         Mostly for establishment.
 
         Returns:
-            True if the room is clear, False otherwise.
+            an instance of Script that lets the player leave once the room is
+                clear
         """
-        if self.current_room.is_clear():
-            return True
-        return False
+        return triggers.Script([], exit_when=self.current_room.is_clear)
 
     def room2(self):
         """
-        Run third room of the game.
+        Script the third room of the game.
 
         In this room, the player discovers a mushroom ring. When they interact
         with it, it teleports them to a different world.
 
         Returns:
-            True if the player has interacted with the mushroom ring and the
-                teleportation animation has played, False otherwise.
+            an instance of Script that lets the player leave once they have
+                interacted with the mushroom ring and the teleportation
+                animation has played
         """
-        if self.current_room.is_clear():
-            self.player.spotlight_on()
-            # Iterate through the teleport animation, and freeze the player
-            # in place so they can't move
-            for filename in sorted(os.listdir('Media/misc/teleport')):
-                self.player.spotlight_image(os.path.join('Media/misc/teleport',
-                                                         filename))
-                self.update()
-                pygame.display.flip()
-                pygame.time.wait(200)
-            self.player.spotlight_off()
-            return True
-        return False
+        # Start loading the teleport animation before it is needed
+        if self._teleport is None:
+            self._teleport = environment.Cutscene(
+                [os.path.join('Media/misc/teleport', filename)
+                 for filename in sorted(os.listdir('Media/misc/teleport'))],
+                position=None, skippable=False, load=self.rendering)
+
+        def teleport():
+            # Play the teleport animation around the player, who is frozen
+            # in place until it is done
+            if not self._teleport.is_done() and \
+                    self._teleport not in self.cutscenes:
+                self.cutscenes.append(self._teleport)
+
+        ring = self.current_room.interactables[0]
+        return triggers.Script([
+            triggers.Trigger([('interact', ring.get_name())], teleport,
+                             self.current_room.is_clear),
+        ], exit_when=self._teleport.is_done)
 
     def room3(self):
         """
-        Run the fourth room of the game.
+        Script the fourth room of the game.
 
         In this room, the player finds the guide, initializing an instance of
         the Guide class, and talks to a turtle who explains how to open the
@@ -288,45 +855,58 @@ class Game:
         find another mushroom ring to get home, establishing the goal.
 
         Returns:
-            True if the player has picked up the guide and finished talking to
-                the turtle, False otherwise.
+            an instance of Script that lets the player leave once they have
+                picked up the guide and finished talking to the turtle
         """
         turtle = self.current_room.npcs[0]
-        self.current_background = self.backgrounds[2]
-        # If the player walks up to the turtle, a conversation happens
-        if self.player.collide(turtle):
-            self.conversation(turtle, self.player)
-        # If the room is clear the player has picked up the book. In this
-        # case make the turtle walk out and speak. Also update the guide
-        # with some info
-        if self.rooms[3].is_clear():
-            if len(self.rooms[3].interactables) > 0:
-                del self.rooms[3].interactables[0]
-                self.guide = environment.Guide()
-                self.guide.update_text()
-                self.conversations = [
-                    'Oh look, it\'s a book! I bet you can open it by pressing'
-                    ' TAB. Those guides are never wrong but I wouldn\'t trust'
-                    ' it if I were you.',
-                    'Where am I?',
-                    'Well you\'re here, obviously. You just appeared. You must'
-                    ' have come through the mushroom ring.',
-                    'How do I get back home?',
-                    'I think you\'ll have to find another mushroom ring. '
-                    'They only work once you know.'
-                ]
-            if turtle.get_pos()[0] < 490:
-                turtle.move('right')
-                turtle.say_once('What have you got there?')
+        book = self.current_room.interactables[0].get_name()
+
+        def set_background():
+            self.current_background = self.backgrounds[2]
+
+        def pick_up_guide():
+            # The player has picked up the book. Make the turtle walk out
+            # and speak. Also update the guide with some info
+            self.current_room.remove_interactable(0)
+            self.guide = environment.Guide()
+            self.guide.update_text()
+            self.conversations = [
+                'Oh look, it\'s a book! I bet you can open it by pressing'
+                ' TAB. Those guides are never wrong but I wouldn\'t trust'
+                ' it if I were you.',
+                'Where am I?',
+                'Well you\'re here, obviously. You just appeared. You must'
+                ' have come through the mushroom ring.',
+                'How do I get back home?',
+                'I think you\'ll have to find another mushroom ring. '
+                'They only work once you know.'
+            ]
+            turtle.walk('right', 490)
+            turtle.say_once('What have you got there?')
+
+        return triggers.Script([
+            triggers.Trigger([('enter', self.current_room.get_name())],
+                             set_background),
+            # If the player walks up to the turtle, a conversation happens
+            triggers.Trigger(
+                [('collide', turtle.get_name()),
+                 ('speech_finished', turtle.get_name()),
+                 ('speech_finished', self.player.get_name())],
+                lambda: self.conversation(turtle, self.player),
+                lambda: self.player.collide(turtle)),
+            triggers.Trigger(
+                [('interact', book)], pick_up_guide,
+                lambda: self.current_room.is_clear() and
+                len(self.current_room.interactables) > 0),
+        ],
             # If the conversation is empty, it has already happened, so allow
             # the player to leave
-            if not self.conversations:
-                return True
-        return False
+            exit_when=lambda: self.current_room.is_clear() and
+            not self.conversations)
 
     def room4(self):
         """
-        Run the fifth room of the game.
+        Script the fifth room of the game.
 
         In this room, the player meets another turtle who needs help looking
         for his keys in the leaf pile. The player can interact with multiple
@@ -334,30 +914,44 @@ class Game:
         player "falls" through.
 
         Returns:
-            True if the player has interacted with the trapdoor leaf pile,
-                False otherwise
+            an instance of Script that lets the player leave once they have
+                interacted with the trapdoor leaf pile
         """
-        self.guide.update_text(2)
-        self.current_background = self.backgrounds[2]
         turtle = self.current_room.npcs[0]
-        # If the player walks up to the turtle, he speaks
-        if self.player.collide(turtle) and not turtle.is_speaking():
-            turtle.say('Help help I lost my keys! They must be in one'
-                       ' of these leaf piles but I\'m too small to search'
-                       ' all of them. Will you help me find them?')
-        # If the player has interacted with the hidden trap door
-        # then the game stops for a second to show the trap door,
-        # then exits to the next level
-        if self.rooms[4].interactables[0].is_end_state():
-            self.update()
-            pygame.display.flip()
-            pygame.time.wait(1000)
-            return True
-        return False
+        trapdoor = self.current_room.interactables[0]
+
+        def enter():
+            self.guide.update_text(2)
+            self.current_background = self.backgrounds[2]
+
+        def open_trapdoor():
+            # The game stops for a second to show the trap door, then exits
+            # to the next level
+            if self._trapdoor is None:
+                self._trapdoor = environment.Cutscene(
+                    [], hold_ms=1000, position=None, skippable=False)
+                self.cutscenes.append(self._trapdoor)
+
+        return triggers.Script([
+            triggers.Trigger([('enter', self.current_room.get_name())], enter),
+            # If the player walks up to the turtle, he speaks
+            triggers.Trigger(
+                [('collide', turtle.get_name()),
+                 ('speech_finished', turtle.get_name())],
+                lambda: turtle.say('Help help I lost my keys! They must be in'
+                                   ' one of these leaf piles but I\'m too '
+                                   'small to search all of them. Will you '
+                                   'help me find them?'),
+                lambda: self.player.collide(turtle) and
+                not turtle.is_speaking()),
+            triggers.Trigger([('interact', trapdoor.get_name())],
+                             open_trapdoor, trapdoor.is_end_state),
+        ], exit_when=lambda: self._trapdoor is not None and
+            self._trapdoor.is_done())
 
     def room5(self):
         """
-        Run the sixth room of the game.
+        Script the sixth room of the game.
 
         This room is a maze the player must solve in the dark, with only a
         small transparent circle of illumination around them. They must first
@@ -365,31 +959,38 @@ class Game:
         The player's chatbox provides hints as to how to proceed.
 
         Returns:
-            True if the player has collected the key and is at the maze exit,
-                False otherwise
-        """
-        self.guide.update_text(3)
-        # Reset the player's spotlight and turn it on because the room
-        # is dark
-        self.player.spotlight_image()
-        self.player.spotlight_on()
-        self.player.say_once('Oof! I fell down a hole. I wonder if my guide'
-                             ' has any advice.')
-        # If the player has picked up the key, the room is clear
-        # and can be exited. Also the player speaks when they pick
-        # up the key
-        if self.current_room.is_clear():
-            if len(self.current_room.interactables) > 0:
-                del self.current_room.interactables[0]
-                self.player.inventory.append('key')
-                self.player.say_once('Found the key! Now I just have to'
-                                     ' get out of this maze.')
-            return True
-        return False
+            an instance of Script that lets the player leave once they have
+                collected the key
+        """
+        key = self.current_room.interactables[0].get_name()
+
+        def enter():
+            self.guide.update_text(3)
+            # Reset the player's spotlight and turn it on because the room
+            # is dark
+            self.player.spotlight_image()
+            self.player.spotlight_on()
+            self.player.say_once('Oof! I fell down a hole. I wonder if my '
+                                 'guide has any advice.')
+
+        def pick_up_key():
+            # The player speaks when they pick up the key
+            self.current_room.remove_interactable(0)
+            self.player.inventory.append('key')
+            self.player.say_once('Found the key! Now I just have to get out '
+                                 'of this maze.')
+
+        return triggers.Script([
+            triggers.Trigger([('enter', self.current_room.get_name())], enter),
+            triggers.Trigger(
+                [('interact', key)], pick_up_key,
+                lambda: self.current_room.is_clear() and
+                len(self.current_room.interactables) > 0),
+        ], exit_when=self.current_room.is_clear)
 
     def room6(self):
         """
-        Run the sixth room of the game.
+        Script the seventh room of the game.
 
         In this room, the player attempts to enter the inn. THey are not able
         to at first, but the turtle enters and upon returning his key, he
@@ -397,59 +998,87 @@ class Game:
         enough to be heard in the inn.
 
         Returns:
-            True if the megaphone is in the player's inventory and the player
-                is at the exit, False otherwise
+            an instance of Script that lets the player leave once the
+                megaphone is in their inventory and they are at the inn door
         """
         turtle = self.current_room.npcs[0]
-        self.guide.update_text(4)
-        self.current_background = self.backgrounds[1]
-        self.player.spotlight_off()
-        # Check to see if the player is at the inn door
-        if 600 < self.player.get_pos()[0] < 700 and \
-                self.player.get_pos()[1] < 470:
+        megaphone = self.current_room.interactables[0].get_name()
+        script = None
+
+        def enter():
+            self.guide.update_text(4)
+            self.current_background = self.backgrounds[1]
+            self.player.spotlight_off()
+
+        def knock():
             # If the player doesn't have the megaphone yet, the guide will
             # update with a hint
-            if 'megaphone' not in self.player.inventory:
-                self.player.say_once('Is anybody there?')
-                self.guide.update_text(5)
-                if not self.player.is_speaking():
-                    self.player.say_once('Maybe the guide can help.')
-            # If the player has the megaphone, the stage is complete and the
-            # room is clear
-            else:
-                return True
-        # If the guide has given its hint, have the turtle walk in and set up
-        # the conversation
-        if not self.player.is_speaking() and turtle.get_pos()[0] < 300 \
-                and self.guide.get_index() == 5:
-            turtle.move('right')
+            self.player.say_once('Is anybody there?')
+            self.guide.update_text(5)
+            if not self.player.is_speaking():
+                self.player.say_once('Maybe the guide can help.')
+
+        def turtle_arrives():
+            # The guide has given its hint, so have the turtle walk in and
+            # set up the conversation
+            turtle.walk('right', 300)
             self.conversations = [
                 'Hey! Did you find my key?',
                 ' I sure did, here you go.',
-                'Thanks! I don\'t have much to give you but you can have this'
-                ' old megaphone I found lying around if you want.'
+                'Thanks! I don\'t have much to give you but you can have '
+                'this old megaphone I found lying around if you want.'
             ]
-        # If the player collides with the turtle, have the conversation and
-        # spawn the megaphone in the right place
-        if self.player.collide(turtle):
-            self.conversation(turtle, self.player)
-            if not (self.player.is_speaking() and turtle.is_speaking()):
-                if len(self.current_room.interactables) > 0 and \
-                        len(self.conversations) == 0:
-                    self.current_room.interactables[0].place(300, 550)
-        # If the megaphone has been interacted with and is still in the room,
-        # remove it from the room and add to the player's inventory
-        # Also remove the key from the inventory
-        if self.current_room.is_clear() and \
-                len(self.current_room.interactables) > 0:
-            del self.current_room.interactables[0]
+
+        def pick_up_megaphone():
+            # Remove the megaphone from the room and add it to the player's
+            # inventory. Also remove the key from the inventory
+            self.current_room.remove_interactable(0)
             del self.player.inventory[self.player.inventory.index('key')]
             self.player.inventory.append('megaphone')
-        return False
+
+        script = triggers.Script([
+            triggers.Trigger([('enter', self.current_room.get_name())], enter),
+            # Check to see if the player is at the inn door
+            triggers.Trigger(
+                [('region', 'door'),
+                 ('speech_finished', self.player.get_name())], knock,
+                lambda: script.is_inside('door') and
+                'megaphone' not in self.player.inventory),
+            triggers.Trigger(
+                [('region', 'door'),
+                 ('speech_finished', self.player.get_name())],
+                turtle_arrives,
+                lambda: not self.player.is_speaking() and
+                turtle.get_pos()[0] < 300 and not turtle.is_walking() and
+                self.guide.get_index() == 5),
+            # If the player collides with the turtle, have the conversation
+            triggers.Trigger(
+                [('collide', turtle.get_name()),
+                 ('speech_finished', turtle.get_name()),
+                 ('speech_finished', self.player.get_name())],
+                lambda: self.conversation(turtle, self.player),
+                lambda: self.player.collide(turtle)),
+            # Once the conversation is over, spawn the megaphone in the right
+            # place
+            triggers.Trigger(
+                [('conversation_finished', None)],
+                lambda: self.current_room.interactables[0].place(300, 550),
+                lambda: len(self.current_room.interactables) > 0),
+            triggers.Trigger(
+                [('interact', megaphone)], pick_up_megaphone,
+                lambda: self.current_room.is_clear() and
+                len(self.current_room.interactables) > 0),
+        ], regions={
+            'door': pygame.Rect(601, 0, 99, 470),
+        },
+            # If the player has the megaphone, the stage is complete
+            exit_when=lambda: script.is_inside('door') and
+            'megaphone' in self.player.inventory)
+        return script
 
     def room7(self):
         """
-        Run the final room of the game.
+        Script the final room of the game.
 
         This is the final room so far, though we hope to add more in future.
         In this room the player enters the lobby of the inn and interacts with
@@ -460,15 +1089,16 @@ class Game:
         To be continued...
 
         Returns:
-            True if the player has interacted with the innkeeper and the
-                innkeeper has made his speech, False otherwise.
+            an instance of Script that lets the player leave once they have
+                interacted with the innkeeper
         """
         innkeeper = self.current_room.npcs[0]
-        # If the player walks up to the turtle, he speaks
-        if self.player.collide(innkeeper):
-            innkeeper.say_once('Welcome to the inn! You\'ll be safe here until'
-                               ' you start on the next part of your journey.'
-                               ' Thanks for playing chapter one! Come back soon'
-                               ' for more adventures.')
-            return True
-        return False
+        return triggers.Script([
+            # If the player walks up to the turtle, he speaks
+            triggers.Trigger(
+                [('collide', innkeeper.get_name())],
+                lambda: innkeeper.say_once(
+                    'Welcome to the inn! You\'ll be safe here until you start'
+                    ' on the next part of your journey. Thanks for playing '
+                    'chapter one! Come back soon for more adventures.')),
+        ], exit_when=lambda: self.player.collide(innkeeper))
@@ -1,8 +1,19 @@
 import pytest
+import os
+import shutil
+import threading
+import time
 import environment
 import character
 import interactables
+import helpers
+import assetpack
+import triggers
+import replay
+import snapshot
+import game
 import pygame
+from pygame.locals import K_RIGHT, K_SPACE
 
 pygame.init()
 
@@ -53,3 +64,553 @@ def test_char(actual, expected):
 ])
 def test_interact(actual, expected):
     assert actual == expected
+
+
+def test_spotlight_image_cached():
+    spotlight = environment.Spotlight()
+    default = 'Media/misc/spotlight/pixil-frame-0.png'
+    assert spotlight.set_image(default) is False
+    assert environment.Spotlight()._surf is spotlight._surf
+    assert spotlight.set_image('Media/misc/teleport/pixil-frame-00.png')
+
+
+def test_frame_store_shares_frames():
+    first = helpers.Animator('Media/interactables/leafpile')
+    second = helpers.Animator('Media/interactables/leafpile')
+    assert first._images is second._images
+    first.get_next('1h')
+    assert second._index['1h'] == 0
+
+
+def test_datasprite_leaves_shared_frames_unkeyed():
+    interactables.Interactable('testinteract')
+    frames = helpers.frame_store.get('Media/interactables/testinteract')
+    assert all(frame.get_colorkey() != (255, 255, 255, 255)
+               for type in frames.values() for frame in type)
+
+
+def test_frame_store_evicts_least_recently_used():
+    store = helpers.FrameStore()
+    store.get('Media/interactables/piano')
+    store.get('Media/interactables/key')
+    store.set_budget(0)
+    assert list(store._folders) == ['Media/interactables/key']
+    assert store.get_bytes() > 0
+
+
+def test_frame_store_decodes_concurrently():
+    store = helpers.FrameStore(workers=4)
+    store.prefetch(['Media/interactables/piano'])
+    frames = store.get('Media/interactables/piano')
+    expected = helpers.FrameStore(workers=1).get('Media/interactables/piano')
+    for type in expected:
+        assert [pygame.image.tobytes(frame, 'RGBA')
+                for frame in frames[type]] == \
+            [pygame.image.tobytes(frame, 'RGBA') for frame in expected[type]]
+    report = store.get_load_report()
+    assert report['workers'] == 4
+    assert all(path.startswith('Media/interactables/piano/')
+               for path in report['assets'])
+
+
+def test_frame_store_prefetches_while_getting():
+    store = helpers.FrameStore(workers=2)
+    decode = store._decode
+
+    def slow_decode(digest, image):
+        time.sleep(0.05)
+        return decode(digest, image)
+
+    store._decode = slow_decode
+    errors = []
+
+    def prefetch():
+        try:
+            store.prefetch(['Media/interactables/piano'])
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=prefetch)
+    thread.start()
+    time.sleep(0.02)
+    frames = store.get('Media/interactables/piano')
+    thread.join()
+    assert not errors
+    assert store.get('Media/interactables/piano') is frames
+
+
+def test_frame_store_chooses_one_format_per_folder():
+    store = helpers.FrameStore()
+    sky = store.get('Media/backgrounds/testbackground')
+    frames = [frame for images in sky.values() for frame in images]
+    assert all(helpers.get_alpha_kind(frame) == helpers.OPAQUE and
+               not frame.get_flags() & pygame.SRCALPHA for frame in frames)
+    path = 'Media/characters/testcharacter/left/turtle right 2.png'
+    frame = store.get('Media/characters/testcharacter')['left'][0]
+    assert frame.get_colorkey() == helpers.COLORKEY_COLOR + (255,)
+    keyed = pygame.Surface(frame.get_size()).convert()
+    keyed.fill((30, 90, 150))
+    keyed.blit(frame, (0, 0))
+    blended = keyed.copy()
+    blended.fill((30, 90, 150))
+    blended.blit(pygame.image.load(path).convert_alpha(), (0, 0))
+    assert pygame.image.tobytes(keyed, 'RGB') == \
+        pygame.image.tobytes(blended, 'RGB')
+
+
+def test_asset_pack_matches_images(tmp_path):
+    path = 'Media/interactables/key/1h/pixil-frame-1.png'
+    assert assetpack.build('Media/interactables/key',
+                           str(tmp_path / 'assets.pack')) > 0
+    pack = assetpack.AssetPack(str(tmp_path / 'assets.pack'))
+    assert pack.get_folder('Media/interactables/key')['1h'][0] == path
+    assert pack.has_image(path)
+    assert pack.get_kind(path) == helpers.COLORKEY
+    shown = []
+    for img in [pack.load(path), pygame.image.load(path)]:
+        surf = pygame.Surface(img.get_size()).convert()
+        surf.fill((30, 90, 150))
+        surf.blit(img.convert_alpha(), (0, 0))
+        shown.append(pygame.image.tobytes(surf, 'RGB'))
+    assert shown[0] == shown[1]
+    del img
+    pack.close()
+
+
+def test_asset_pack_notices_changed_folders(tmp_path):
+    folder = str(tmp_path / 'key')
+    shutil.copytree('Media/interactables/key', folder)
+    # Date the type folder back, so adding a frame is sure to change it
+    os.utime(os.path.join(folder, '1'), ns=(10 ** 9, 10 ** 9))
+    output = str(tmp_path / 'assets.pack')
+    assetpack.build(folder, output)
+    pack = assetpack.AssetPack(output)
+    assert pack.get_folder(folder) is not None
+    shutil.copy(os.path.join(folder, '1', 'pixil-frame-0.png'),
+                os.path.join(folder, '1', 'pixil-frame-1.png'))
+    assert pack.get_folder(folder) is None
+    pack.close()
+    with open(output, 'rb') as f:
+        data = f.read()
+    for length in [8, len(data) - 100]:
+        with open(output, 'wb') as f:
+            f.write(data[:length])
+        with pytest.raises(ValueError):
+            assetpack.AssetPack(output)
+
+
+def test_animator_advances_on_elapsed_time():
+    ticked = helpers.Animator('Media/characters/turtle', speed=0.5)
+    timed = helpers.Animator('Media/characters/turtle', speed=0.5)
+    for _ in range(3):
+        ticked.get_next('right')
+    assert timed.get_next('right', 3 * helpers.TICK_MS) is \
+        ticked.get_next('right', 0)
+
+
+def test_character_drawn_between_ticks():
+    npc = character.NPC('turtle')
+    npc.spawn(100, 100)
+    assert npc.get_draw_rect(0.5) == npc.get_rect()
+    npc.remember_position()
+    npc.move('right')
+    assert npc.get_draw_rect(0.4).left == npc.get_rect().left - 3
+    assert npc.get_draw_rect() == npc.get_rect()
+
+
+def test_cutscene_waits_for_key():
+    cutscene = environment.Cutscene(['Media/misc/teleport/pixil-frame-00.png'],
+                                    frame_ms=100, skippable=False,
+                                    wait_for_key=True)
+    cutscene.skip()
+    assert not cutscene.is_done()
+    cutscene.update(150)
+    assert not cutscene.is_done()
+    cutscene.skip()
+    assert cutscene.is_done()
+
+
+def test_cutscene_plays_without_loading():
+    cutscene = environment.Cutscene(
+        ['Media/misc/teleport/pixil-frame-00.png',
+         'Media/misc/teleport/pixil-frame-01.png'], frame_ms=100, load=False)
+    cutscene.update(150)
+    assert cutscene.get_index() == 1 and not cutscene.is_done()
+    cutscene.update(50)
+    assert cutscene.is_done()
+
+
+def test_script_fires_on_transitions():
+    room = environment.Room('testroom')
+    player = character.Player('testcharacter')
+    player.spawn(room, 'maze')
+    fired = []
+    script = triggers.Script([
+        triggers.Trigger([('region', 'start')], lambda: fired.append('in')),
+        triggers.Trigger([('interact', 'piano')], lambda: fired.append('on'),
+                         lambda: len(fired) < 3),
+    ], regions={'start': pygame.Rect(0, 0, 540, 700)})
+    triggers.install(script)
+    script.dispatch(player, room)
+    script.dispatch(player, room)
+    assert fired == ['in']
+    triggers.emit('interact', 'piano')
+    triggers.emit('interact', 'piano')
+    triggers.emit('interact', 'nothing')
+    script.dispatch(player, room)
+    assert fired == ['in', 'on', 'on']
+    triggers.install(None)
+    assert script.is_inside('start')
+
+
+def test_room_counts_interactables_left():
+    room = environment.Room('testroom')
+    player = character.Player('testcharacter')
+    player.spawn(room, 'maze')
+    piano = room.interactables[0]
+    assert not room.is_clear()
+    assert piano not in room._sprites.query(player.get_rect())
+    piano.place(*player.get_rect().topleft)
+    assert piano in room._sprites.query(player.get_rect())
+    piano.set_state('2')
+    assert room.is_clear()
+    piano.interact()
+    assert not room.is_clear()
+    room.remove_interactable(0)
+    assert room.is_clear()
+
+
+def test_npc_walks_around_maze_walls():
+    room = environment.Room('maze')
+    npc = character.NPC('turtle')
+    npc.set_room(room)
+    npc.spawn(30, 560)
+    assert npc.walk_to(1000, 50)
+    nav = room.get_nav_grid()
+    start, goal = nav.get_cell((46, 576)), nav.get_cell((1000, 50))
+    assert nav.find_path(start, goal, (32, 32)) is \
+        nav.find_path(start, goal, (32, 32))
+    for _ in range(2000):
+        if not npc.is_walking():
+            break
+        npc.tick()
+        assert not room.collides(npc.get_rect())
+    assert npc.get_pos() == [1000, 50]
+
+
+def test_npc_walks_around_corner_off_cell_centre():
+    room = environment.Room('maze')
+    # A wall hanging down to just above the row the NPC walks along
+    room.objects = [pygame.Rect(300, 0, 100, 300)]
+    room._grid = helpers.SpatialGrid(room.objects)
+    room._nav = helpers.NavGrid(room.objects, room.get_rect())
+    npc = character.NPC('turtle2')
+    npc.set_room(room)
+    npc.spawn(168, 298)
+    assert npc.get_pos() == [200, 330]
+    assert not room.collides(npc.get_rect())
+    for x, end in ((600, [600, 330]), (430, [435, 335])):
+        assert npc.walk_to(x, 330)
+        for _ in range(200):
+            if not npc.is_walking():
+                break
+            npc.tick()
+            assert not room.collides(npc.get_rect())
+        assert npc.get_pos() == end
+
+
+def test_compositor_matches_drawing_layers():
+    background = environment.Background('daysky')
+    room = environment.Room('testroom')
+    compositor = environment.LayerCompositor(screen.get_size())
+
+    def drawn_separately():
+        surf = pygame.Surface(screen.get_size()).convert()
+        background.draw(surf)
+        room.draw(surf)
+        return pygame.image.tobytes(surf, 'RGB')
+
+    compositor.draw(screen, background, room)
+    assert pygame.image.tobytes(screen, 'RGB') == drawn_separately()
+    # The room moves on to an image it hasn't shown before
+    room._surf = room.get_surf().copy()
+    room._surf.fill((255, 0, 0), (0, 0, 100, 100))
+    compositor.draw(screen, background, room)
+    assert pygame.image.tobytes(screen, 'RGB') == drawn_separately()
+
+
+def test_draw_queue_culls_and_sorts_by_layer():
+    queue = helpers.DrawQueue((100, 100))
+    red = pygame.Surface((10, 10))
+    red.fill((255, 0, 0))
+    blue = pygame.Surface((10, 10))
+    blue.fill((0, 0, 255))
+    queue.set_layer(1)
+    queue.blit(red, (0, 0))
+    queue.set_layer(0)
+    queue.blit(blue, (0, 0))
+    queue.blit(blue, (100, 0))
+    assert queue.get_culled() == 1
+    target = pygame.Surface((100, 100))
+    queue.flush(target)
+    assert target.get_at((5, 5)) == (255, 0, 0)
+
+
+def test_sprites_have_no_attribute_dict():
+    room = environment.Room('testroom')
+    player = character.Player('testcharacter')
+    for sprite in [room, room.interactables[0], player,
+                   player.get_chatbox()]:
+        assert not hasattr(sprite, '__dict__')
+    assert player.get_bytes() > helpers.get_object_bytes(player)
+
+
+def test_chatboxes_share_resources_until_released():
+    first = character.NPC('testcharacter')
+    second = character.NPC('testcharacter')
+    assert first.get_chatbox()._font is second.get_chatbox()._font
+    users = helpers.resources.get_users()[environment.CHATBOX_PATH]
+    first.release()
+    first.release()
+    assert helpers.resources.get_users()[environment.CHATBOX_PATH] == \
+        users - 1
+    second.release()
+    assert helpers.resources.get_users().get(environment.CHATBOX_PATH,
+                                             0) == users - 2
+
+
+def test_replay_gives_recorded_input(tmp_path):
+    path = str(tmp_path / 'session.rec')
+    recorder = replay.Recorder(path)
+    inputs = [([], False), ([K_RIGHT], False), ([K_RIGHT], False),
+              ([K_RIGHT, K_SPACE], True), ([], False)]
+    for tick, (keys, skip) in enumerate(inputs):
+        recorder.record(tick, {key: key in keys for key in replay.KEYS},
+                        skip)
+    recorder.close(len(inputs))
+    session = replay.Replay(path)
+    for tick, (keys, skip) in enumerate(inputs):
+        assert not session.is_finished(tick)
+        pressed, skipped = session.get(tick)
+        assert [key for key in replay.KEYS if pressed[key]] == keys
+        assert skipped == skip
+    assert session.is_finished(len(inputs))
+
+
+def test_replay_plays_cut_off_recording_to_last_tick(tmp_path):
+    path = str(tmp_path / 'session.rec')
+    recorder = replay.Recorder(path)
+    held = {key: key == K_RIGHT for key in replay.KEYS}
+    ticks = replay.KEEPALIVE_TICKS * 2 + 5
+    for tick in range(ticks):
+        recorder.record(tick, held)
+    # Read the recording as the game left it, before it was closed
+    session = replay.Replay(path)
+    last = replay.KEEPALIVE_TICKS * 2
+    for tick in range(last + 1):
+        assert not session.is_finished(tick)
+        assert session.get(tick)[0][K_RIGHT]
+    assert session.is_finished(last + 1)
+    recorder.close(ticks)
+
+
+def test_chatbox_reuses_rendered_lines():
+    chatbox = environment.Chatbox(character.Player('testcharacter'))
+    phrase = 'hello there my good friend, how are you doing today'
+    assert chatbox._wrap(phrase, phrase[:39]) == ['hello there my good',
+                                                  'friend, how are you']
+    cache = environment.Chatbox._line_cache
+    cache.clear()
+    chatbox.say(phrase)
+    chatbox._text = phrase[:39]
+    chatbox.draw(screen)
+    first = list(chatbox._line_surfs)
+    assert len(cache) == 2
+    # The phrase grows onto a third line, which is the only one rendered
+    chatbox._text = phrase[:45]
+    chatbox.draw(screen)
+    assert len(cache) == 3
+    assert all(new is old for new, old in zip(chatbox._line_surfs, first))
+    assert all(key[1:3] == (environment.FONT_PATH, 15) for key in cache)
+    chatbox.release()
+    assert not chatbox._layouts
+
+
+def test_guide_renders_text_again_after_changes():
+    guide = environment.Guide()
+    surf = pygame.Surface((1080, 700), pygame.SRCALPHA)
+    guide.display_text(surf)
+    first = guide._text_surf
+    guide.display_text(surf)
+    assert guide._text_surf is first
+    guide.update_text()
+    guide.display_text(surf)
+    assert guide._text_surf is not first
+    assert pygame.image.tobytes(guide._text_surf, 'RGBA') == \
+        pygame.image.tobytes(guide._render_text(), 'RGBA')
+    assert pygame.image.tobytes(guide._text_surf, 'RGBA') != \
+        pygame.image.tobytes(first, 'RGBA')
+    guide.set_state((0, 'open'))
+    guide.display_text(surf)
+    assert pygame.image.tobytes(guide._text_surf, 'RGBA') == \
+        pygame.image.tobytes(first, 'RGBA')
+
+
+def test_room_registry_loads_lazily():
+    rooms = environment.RoomRegistry(['lightforest2', 'darkforestcampfire'])
+    assert not rooms.is_loaded('lightforest2')
+    rooms.enter('lightforest2')
+    assert rooms.enter('darkforestcampfire').get_name() == 'darkforestcampfire'
+    assert rooms.is_loaded('lightforest2') is False
+    assert rooms.reachable('lightforest2') >= {'darkforestcampfire'}
+
+
+def test_room_registry_discards_unloaded_folders():
+    rooms = environment.RoomRegistry(['lightforest2', 'darkforestcampfire'])
+    rooms.enter('lightforest2')
+    assert 'Media/interactables/fairyring' in helpers.frame_store.get_usage()
+    rooms.enter('darkforestcampfire')
+    usage = helpers.frame_store.get_usage()
+    assert 'Media/rooms/lightforest2' not in usage
+    assert 'Media/interactables/fairyring' not in usage
+    assert 'Media/interactables/guide' in usage
+
+
+def test_room_registry_drops_stale_prefetches():
+    store = helpers.FrameStore()
+    store.prefetch(['Media/interactables/key'])
+    assert store._decoded
+    store.discard('Media/interactables/key')
+    assert not store._decoded
+    rooms = environment.RoomRegistry(['lightforest2', 'darkforestcampfire',
+                                      'innlobby'])
+    rooms.enter('lightforest2')
+    assert 'darkforestcampfire' in rooms._prefetching
+    rooms.enter('innlobby')
+    assert not rooms._prefetching
+    assert not [path for path in helpers.frame_store._decoded
+                if path.startswith('Media/interactables/guide')]
+
+
+def test_room_state_restores_removed_interactables():
+    room = environment.Room('testroom')
+    room.remove_interactable(0)
+    state = room.get_state()
+    restored = environment.Room('testroom')
+    restored.set_state(state)
+    assert restored.interactables == []
+
+
+def test_snapshot_keeps_rooms_that_match(tmp_path):
+    path = str(tmp_path / 'progress.sav')
+    rooms = environment.RoomRegistry(['testroom'])
+    room = rooms.get('testroom')
+    room.remove_interactable(0)
+    snapshot.write(path, {'rooms': rooms.get_states()})
+    progress = snapshot.read(path)
+    rooms.set_states(progress['rooms'])
+    assert rooms.get('testroom') is room
+    fresh = environment.RoomRegistry(['testroom'])
+    fresh.get('testroom')
+    fresh.set_states(progress['rooms'])
+    assert fresh.get('testroom').interactables == []
+    with open(path, 'wb') as f:
+        f.write(b'not a snapshot')
+    with pytest.raises(ValueError):
+        snapshot.read(path)
+
+
+@pytest.fixture
+def game1():
+    game1 = game.Game()
+    yield game1
+    # The other tests load images from their files, not the asset pack
+    helpers._asset_pack = None
+
+
+def test_resume_starts_again_from_bad_snapshot(game1, tmp_path):
+    game1.autosave = str(tmp_path / 'progress.sav')
+    game1.save(game1.autosave)
+    assert game1.resume()
+    progress = game1.get_progress()
+    del progress['guide']
+    snapshot.write(game1.autosave, progress)
+    assert not game1.resume()
+    # The player is restored before their state turns out to be damaged
+    progress = game1.get_progress()
+    progress['room'] = 'lightforest1'
+    progress['player'] = (0,)
+    snapshot.write(game1.autosave, progress)
+    assert not game1.resume()
+    assert game1.current_room.get_name() == 'lightforestentrance'
+
+
+def test_step_runs_one_tick_per_jittery_frame(game1):
+    game1.rendering = False
+    game1.player.spawn(game1.current_room, 'initial')
+    pressed = {key: False for key in replay.KEYS}
+    # Frames capped at the tick rate, each a little early or late
+    for jitter in [-0.6, 0.5, -0.4, 0.6, -0.5, 0.4] * 5:
+        ticks = game1._ticks
+        game1.step(pressed, helpers.TICK_MS + jitter)
+        assert game1._ticks == ticks + 1
+
+
+def test_dirty_rects_cover_moved_sprites(game1):
+    game1.dirty_rects = True
+    game1.player.spawn(game1.current_room, 'initial')
+    game1.draw()
+    assert game1.show_frame() is None
+    # Keep the background and room on the same frames
+    game1.current_background.animate(0)
+    game1.current_room.animate(0)
+    game1.draw()
+    assert game1.show_frame() == []
+    x, y, phrases = game1.player.get_state()
+    before = game1.player.get_rect().copy()
+    game1.player.set_state((x + 40, y, phrases))
+    game1.draw()
+    bounds = game1.player.get_surf().get_bounding_rect()
+    # Only the player moved, so the window is updated where it was and
+    # where it is now
+    assert sorted(game1.show_frame()) == sorted([
+        bounds.move(before.topleft),
+        bounds.move(game1.player.get_rect().topleft)])
+    # Changing room updates the whole window
+    game1.current_room = game1.rooms.enter('lightforest1')
+    game1.draw()
+    assert game1.show_frame() is None
+
+
+@pytest.mark.parametrize("actual,expected", [
+    (helpers.read_definition('testroom', 'rooms/').place, (0, 200)),
+    (helpers.read_definition('testroom', 'rooms/').exits,
+     (helpers.Exit(800, 400, 200, 200, 'maze'),)),
+    (helpers.read_definition('testroom', 'rooms/').interactables[0].name,
+     'piano'),
+    (helpers.read_definition('testinteract', 'interactables/').initial_state,
+     1),
+])
+def test_definition(actual, expected):
+    assert actual == expected
+
+
+def test_definition_cache_writes_once(tmp_path):
+    path = str(tmp_path / 'definitions.cache')
+    cache = helpers.DefinitionCache(path)
+    room = cache.get('Media/rooms/testroom/testroom.csv')
+    cache.get('Media/interactables/testinteract/testinteract.csv')
+    assert not os.path.exists(path)
+    cache.save()
+    assert helpers.DefinitionCache(path).get(
+        'Media/rooms/testroom/testroom.csv') == room
+
+
+def test_spatial_grid_matches_collidelist():
+    maze = helpers.read_definition('maze', 'rooms/')
+    objects = [pygame.Rect(object) for object in maze.objects]
+    grid = helpers.SpatialGrid(objects)
+    for x in range(-40, 1100, 15):
+        for y in range(-40, 740, 15):
+            rect = pygame.Rect(x, y, 60, 60)
+            assert grid.collides(rect) == (rect.collidelist(objects) >= 0)
@@ -1,9 +1,897 @@
 import pygame
-import pandas
 from pygame.locals import RLEACCEL
 import os
 from pygame import Surface
 import math
+import io
+import csv
+import pickle
+import sys
+import time
+import hashlib
+import heapq
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+# The length of one tick of game logic in ms. The game logic runs at 30 ticks
+# per second however fast frames are drawn
+TICK_MS = 1000 / 30
+
+# The asset pack images are loaded from, or None if there isn't one
+_asset_pack = None
+
+
+def use_asset_pack(path='Media/assets.pack'):
+    """
+    Load images from an asset pack from now on, if the pack exists. Build it
+    with assetpack.py, and rebuild it after adding images to Media.
+
+    Args:
+        path: the path to the pack file. Defaults to assets.pack in Media
+
+    Returns:
+        True if the pack is being used, False if there is no pack or it was
+        built by a different version of assetpack.py
+    """
+    # assetpack imports helpers to build packs, so it is only imported once
+    # helpers has finished loading
+    import assetpack
+    global _asset_pack
+    if _asset_pack is not None and _asset_pack.get_path() == path:
+        return True
+    # Surfaces loaded from the old pack may still be using it, so it isn't
+    # closed, only dropped
+    _asset_pack = None
+    if not os.path.isfile(path):
+        return False
+    try:
+        _asset_pack = assetpack.AssetPack(path)
+    except ValueError:
+        return False
+    return True
+
+
+def load_image(path):
+    """
+    Load an image, from the asset pack if it holds an up to date copy and
+    otherwise by decoding the image file. The image is not converted to the
+    display format.
+
+    Args:
+        path: the path to the image file
+
+    Returns:
+        the image as a surface
+    """
+    if _asset_pack is not None and _asset_pack.has_image(path):
+        return _asset_pack.load(path)
+    return pygame.image.load(path)
+
+
+def get_surface_bytes(surf):
+    """
+    Find how many bytes the pixels of a surface take up.
+
+    Args:
+        surf: the surface to measure
+
+    Returns:
+        the number of bytes as an int
+    """
+    return surf.get_bytesize() * surf.get_width() * surf.get_height()
+
+
+def get_object_bytes(obj):
+    """
+    Find how many bytes an object takes up, including the dictionary holding
+    its attributes if it has one, but not the objects it refers to.
+
+    Args:
+        obj: the object to measure
+
+    Returns:
+        the number of bytes as an int
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def _list_types(pathname):
+    """
+    List the images of each type in an animator folder, from the asset pack
+    index if the folder is in it.
+
+    Args:
+        pathname: the path to the folder, which holds a folder of images for
+            each type
+
+    Returns:
+        a dictionary where the type is the key and a sorted list of the paths
+        of its images is the value
+    """
+    if _asset_pack is not None:
+        types = _asset_pack.get_folder(pathname)
+        if types is not None:
+            return types
+    types = {}
+    with os.scandir(pathname) as it:
+        for entry in it:
+            if entry.is_dir():
+                types[entry.name] = [
+                    os.path.join(entry.path, filename)
+                    for filename in sorted(os.listdir(entry.path))]
+    return types
+
+
+# The ways a frame can be stored, from cheapest to blit to most expensive:
+# converted to the opaque display format, converted with the transparent
+# pixels set to COLORKEY and run length encoded, or with per pixel alpha
+OPAQUE = 'opaque'
+COLORKEY = 'colorkey'
+ALPHA = 'alpha'
+FORMATS = (OPAQUE, COLORKEY, ALPHA)
+# The colour transparent pixels are set to in colour keyed frames
+COLORKEY_COLOR = (255, 0, 255)
+
+
+def get_alpha_kind(img):
+    """
+    Find the cheapest way an image can be stored without changing how it
+    looks: OPAQUE if every pixel is opaque, COLORKEY if every pixel is either
+    opaque or fully transparent and no opaque pixel is COLORKEY_COLOR, and
+    ALPHA otherwise.
+
+    Args:
+        img: the image to inspect, which doesn't need to be converted
+
+    Returns:
+        one of OPAQUE, COLORKEY and ALPHA
+    """
+    if not img.get_flags() & pygame.SRCALPHA and img.get_colorkey() is None:
+        return OPAQUE
+    opaque = pygame.mask.from_surface(img, 254)
+    if opaque.count() == img.get_width() * img.get_height():
+        return OPAQUE
+    if pygame.mask.from_surface(img, 0).count() != opaque.count():
+        return ALPHA
+    key = pygame.mask.from_threshold(img, COLORKEY_COLOR + (255,),
+                                     (1, 1, 1, 255))
+    if key.overlap_area(opaque, (0, 0)):
+        return ALPHA
+    return COLORKEY
+
+
+def choose_format(kinds):
+    """
+    Choose one format that suits every image of an animation, so that all of
+    its frames are blitted the same way.
+
+    Args:
+        kinds: a list of the kinds of each image, as returned by
+            get_alpha_kind
+
+    Returns:
+        the most expensive of the kinds, or OPAQUE if there are none
+    """
+    return FORMATS[max((FORMATS.index(kind) for kind in kinds), default=0)]
+
+
+def convert_image(img, format=None, keyed=False):
+    """
+    Convert an image to the display format.
+
+    Args:
+        img: the image to convert
+        format: one of OPAQUE, COLORKEY and ALPHA. Defaults to None, meaning
+            the format is chosen from the image with get_alpha_kind
+        keyed: whether the transparent pixels of the image are already
+            COLORKEY_COLOR, as in the asset pack. Defaults to False
+
+    Returns:
+        the converted image as a new surface
+    """
+    if format is None:
+        format = get_alpha_kind(img)
+    if format == OPAQUE:
+        return Surface.convert(img)
+    if format == COLORKEY and keyed:
+        frame = Surface.convert(img)
+        frame.set_colorkey(COLORKEY_COLOR, RLEACCEL)
+        return frame
+    if format == COLORKEY:
+        frame = Surface(img.get_size()).convert()
+        frame.fill(COLORKEY_COLOR)
+        frame.blit(img, (0, 0))
+        frame.set_colorkey(COLORKEY_COLOR, RLEACCEL)
+        return frame
+    return Surface.convert_alpha(img)
+
+
+class FrameStore:
+    """
+    Class holding the frames of every animator folder that has been loaded,
+    so that all the sprites using the same media folder share one copy of
+    their frames.
+
+    Identical images are only decoded and stored once, found by a hash of
+    their file contents. When the frames held exceed the byte budget, the
+    least recently used folders are evicted. Animators keep references to
+    the frames they use, so evicting a folder only means that the next
+    animator to use it has to load it again.
+
+    Folders can also be prefetched, which only decodes their images, using a
+    pool of worker threads. Converting to the display format is left to the
+    main thread, when the folder is first requested with get. Prefetching can
+    run on background threads while the main thread gets folders, so the
+    store's dictionaries are only touched while holding _lock. Images in the
+    asset pack are never decoded, as the pack holds their pixels. The time
+    spent decoding and converting each image is recorded, see
+    get_load_report.
+
+    Every frame of a folder is converted to the same format, the cheapest
+    to blit that suits all of its images (see get_alpha_kind), so opaque
+    backgrounds are blitted without blending and sprites with hard edges
+    are colour keyed.
+
+    Attributes:
+        _folders: an ordered dictionary where the folder path is the key and
+            a dictionary of lists of frames for each type is the value, with
+            the most recently used folder last
+        _hashes: a dictionary where the folder path is the key and a list of
+            tuples of the content hash and format of its frames is the value
+        _frames: a dictionary where the content hash is the key and a
+            dictionary is the value, where the format is the key and a list
+            containing the frame and the number of folders using it is the
+            value
+        _kinds: a dictionary where the content hash is the key and the kind
+            of the image, as returned by get_alpha_kind, is the value
+        _decoded: a dictionary where the image path is the key and a list
+            containing the content hash and the decoded but unconverted image
+            (or None if an identical frame is already stored or decoded for
+            another path) is the value. Filled by prefetch and emptied by get
+            and discard
+        _budget: int representing the most bytes of frames to keep
+        _bytes: int representing the bytes of frames currently kept
+        _workers: int representing the number of threads decoding images
+        _load_times: a dictionary where the image path is the key and a list
+            of the ms spent decoding and converting it is the value
+        _load_ms: float representing the wall time spent loading images, in
+            ms, counting concurrent decoding once
+        _lock: the lock held while reading or changing the store, so that
+            prefetching on another thread can't change it part way through
+    """
+    def __init__(self, budget=512 * 1024 * 1024, workers=None):
+        """
+        Initialize an instance of class FrameStore
+
+        Args:
+            budget: the most bytes of frames to keep before evicting folders.
+                Defaults to 512 MiB
+            workers: the number of threads to decode images with. Defaults
+                to None, meaning one for each CPU
+        """
+        self._folders = OrderedDict()
+        self._hashes = {}
+        self._frames = {}
+        self._kinds = {}
+        self._decoded = {}
+        self._budget = budget
+        self._bytes = 0
+        self._workers = workers or os.cpu_count() or 1
+        self._load_times = {}
+        self._load_ms = 0
+        self._lock = threading.Lock()
+
+    def get(self, pathname):
+        """
+        Get the frames of an animator folder, loading them if they are not
+        already in the store.
+
+        Args:
+            pathname: the path to the folder, which holds a folder of images
+                for each type
+
+        Returns:
+            a dictionary where the type is the key and a list of frames is
+            the value. This is shared, so it must not be modified
+        """
+        with self._lock:
+            return self._get(pathname)
+
+    def _get(self, pathname):
+        """
+        Get the frames of an animator folder, as get, while holding _lock.
+
+        Args:
+            pathname: the path to the folder
+
+        Returns:
+            a dictionary where the type is the key and a list of frames is
+            the value
+        """
+        if pathname in self._folders:
+            self._folders.move_to_end(pathname)
+            return self._folders[pathname]
+        images = {}
+        found = []
+        for type, paths in _list_types(pathname).items():
+            images[type] = []
+            for path in paths:
+                found.append((type, path) + self._read_frame(path))
+        format = choose_format([self._kinds[digest]
+                                for _, _, digest, _ in found])
+        hashes = []
+        for type, path, digest, img in found:
+            images[type].append(self._load_frame(path, digest, format, img))
+            hashes.append((digest, format))
+        self._folders[pathname] = images
+        self._hashes[pathname] = hashes
+        self._evict()
+        return images
+
+    def prefetch(self, pathnames):
+        """
+        Decode the images of animator folders ahead of time so that getting
+        them later only has to convert them. Every image the folders need is
+        found first, and then they are all decoded concurrently. Can run on
+        a background thread while the main thread gets folders: the lock is
+        only held to read and record entries, not while reading files or
+        decoding, and a decoded image is dropped if get has already taken
+        its entry.
+
+        Args:
+            pathnames: a list of paths to the folders to prefetch
+        """
+        paths = []
+        for pathname in pathnames:
+            if not os.path.isdir(pathname):
+                continue
+            with self._lock:
+                if pathname in self._folders:
+                    continue
+            for type_paths in _list_types(pathname).values():
+                for path in type_paths:
+                    if _asset_pack is None or \
+                            not _asset_pack.has_image(path):
+                        paths.append(path)
+        with self._lock:
+            paths = [path for path in paths if path not in self._decoded]
+        if not paths:
+            return
+        start = time.perf_counter()
+        # Hash every image first so that identical images are only decoded
+        # once, then decode the rest concurrently
+        read = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            read.append((path, hashlib.sha1(data).digest(), data))
+        unique = {}
+        with self._lock:
+            for path, digest, data in read:
+                if path in self._decoded:
+                    # Another prefetch got to this image first
+                    continue
+                self._decoded[path] = [digest, None]
+                if digest not in self._frames and digest not in unique:
+                    unique[digest] = (path, data)
+        with ThreadPoolExecutor(self._workers) as pool:
+            for digest, img, kind, ms in pool.map(self._decode, unique,
+                                                  unique.values()):
+                path = unique[digest][0]
+                with self._lock:
+                    # get may have taken the entry and loaded the image
+                    # itself while it was being decoded
+                    entry = self._decoded.get(path)
+                    if entry is not None and entry[0] == digest:
+                        entry[1] = img
+                    self._kinds[digest] = kind
+                    self._load_times.setdefault(path, [0, 0])[0] += ms
+        with self._lock:
+            self._load_ms += (time.perf_counter() - start) * 1000
+
+    def get_load_report(self):
+        """
+        Report how long loading images has taken so far.
+
+        decode_ms and convert_ms add up the time of every image, so on more
+        than one core decode_ms can be larger than total_ms.
+
+        Returns:
+            a dictionary of the wall time spent loading (total_ms), the time
+            spent decoding (decode_ms) and converting (convert_ms), the
+            number of decoding threads (workers), and a dictionary of the
+            decode_ms and convert_ms of each image (assets)
+        """
+        with self._lock:
+            return {
+                'total_ms': self._load_ms,
+                'decode_ms': sum(t[0] for t in self._load_times.values()),
+                'convert_ms': sum(t[1] for t in self._load_times.values()),
+                'workers': self._workers,
+                'assets': {path: {'decode_ms': t[0], 'convert_ms': t[1]}
+                           for path, t in self._load_times.items()},
+            }
+
+    def discard(self, pathname):
+        """
+        Drop a folder from the store, for when it is not going to be used
+        again, along with any of its images prefetched but not yet got.
+
+        Args:
+            pathname: the path to the folder
+        """
+        prefix = os.path.join(os.path.normpath(pathname), '')
+        with self._lock:
+            if pathname in self._folders:
+                del self._folders[pathname]
+                self._release(self._hashes.pop(pathname))
+            for path in [path for path in self._decoded
+                         if path.startswith(prefix)]:
+                del self._decoded[path]
+
+    def set_budget(self, budget):
+        """
+        Change the byte budget, evicting folders if it is now exceeded.
+
+        Args:
+            budget: the most bytes of frames to keep
+        """
+        with self._lock:
+            self._budget = budget
+            self._evict()
+
+    def get_bytes(self):
+        """
+        Accessor for the number of bytes of frames currently kept.
+
+        Returns:
+            the bytes of frames currently kept as an int
+        """
+        return self._bytes
+
+    def get_usage(self):
+        """
+        Report how many bytes of frames each folder in the store uses. A
+        frame shared by several folders counts towards each of them.
+
+        Returns:
+            a dictionary where the folder path is the key and the bytes of
+            its frames is the value
+        """
+        with self._lock:
+            return {pathname: sum(get_surface_bytes(
+                        self._frames[digest][format][0])
+                        for digest, format in set(hashes))
+                    for pathname, hashes in self._hashes.items()}
+
+    def clear(self):
+        """
+        Drop every folder from the store.
+        """
+        with self._lock:
+            self._folders.clear()
+            self._hashes.clear()
+            self._frames.clear()
+            self._kinds.clear()
+            self._decoded.clear()
+            self._bytes = 0
+            self._load_times.clear()
+            self._load_ms = 0
+
+    def _decode(self, digest, image):
+        """
+        Decode an image and find its kind. Run by the worker threads of
+        prefetch.
+
+        Args:
+            digest: the content hash of the image
+            image: a tuple of the path to the image and its file contents
+
+        Returns:
+            a tuple of the content hash, the decoded image, its kind as
+            returned by get_alpha_kind and the ms taken
+        """
+        start = time.perf_counter()
+        path, data = image
+        img = pygame.image.load(io.BytesIO(data), path)
+        return digest, img, get_alpha_kind(img), \
+            (time.perf_counter() - start) * 1000
+
+    def _read_frame(self, path):
+        """
+        Find the content hash of an image and make sure its kind is known,
+        decoding it only if the kind isn't known yet.
+
+        Args:
+            path: the path to the image
+
+        Returns:
+            a tuple of the content hash and the decoded but unconverted
+            image, or None if it wasn't decoded
+        """
+        start = time.perf_counter()
+        digest, img = self._decoded.pop(path, (None, None))
+        if digest is None:
+            if _asset_pack is not None and _asset_pack.has_image(path):
+                digest = _asset_pack.get_digest(path)
+                self._kinds.setdefault(digest, _asset_pack.get_kind(path))
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha1(data).digest()
+                if digest not in self._kinds:
+                    img = pygame.image.load(io.BytesIO(data), path)
+        if digest not in self._kinds:
+            # A prefetched image is None if an identical image was decoded
+            # for another path
+            if img is None:
+                img = load_image(path)
+            self._kinds[digest] = get_alpha_kind(img)
+        ms = (time.perf_counter() - start) * 1000
+        self._load_times.setdefault(path, [0, 0])[0] += ms
+        self._load_ms += ms
+        return digest, img
+
+    def _load_frame(self, path, digest, format, img=None):
+        """
+        Load a single frame in the given format, reusing an identical frame
+        if one is already stored.
+
+        Args:
+            path: the path to the image
+            digest: the content hash of the image
+            format: the format to convert the image to, one of OPAQUE,
+                COLORKEY and ALPHA
+            img: the decoded but unconverted image, or None to load it if it
+                is needed. Defaults to None
+
+        Returns:
+            the frame
+        """
+        formats = self._frames.setdefault(digest, {})
+        if format in formats:
+            formats[format][1] += 1
+            return formats[format][0]
+        start = time.perf_counter()
+        # The image may not have been decoded if its kind was already known,
+        # but an identical frame in this format may have been evicted
+        keyed = False
+        if img is None:
+            if _asset_pack is not None and _asset_pack.has_image(path):
+                img = _asset_pack.load(path)
+                keyed = True
+            else:
+                img = pygame.image.load(path)
+        decoded = time.perf_counter()
+        frame = convert_image(img, format, keyed)
+        formats[format] = [frame, 1]
+        self._bytes += get_surface_bytes(frame)
+        times = self._load_times.setdefault(path, [0, 0])
+        times[0] += (decoded - start) * 1000
+        times[1] += (time.perf_counter() - decoded) * 1000
+        self._load_ms += (time.perf_counter() - start) * 1000
+        return frame
+
+    def _evict(self):
+        """
+        Evict the least recently used folders until the store is within its
+        budget. The most recently used folder is never evicted.
+        """
+        while self._bytes > self._budget and len(self._folders) > 1:
+            pathname, _ = self._folders.popitem(last=False)
+            self._release(self._hashes.pop(pathname))
+
+    def _release(self, hashes):
+        """
+        Stop using the frames of a folder that has been dropped, removing the
+        frames no other folder is using.
+
+        Args:
+            hashes: a list of tuples of the content hash and format of the
+                folder's frames
+        """
+        for digest, format in hashes:
+            formats = self._frames[digest]
+            formats[format][1] -= 1
+            if formats[format][1] == 0:
+                self._bytes -= get_surface_bytes(formats.pop(format)[0])
+                if not formats:
+                    del self._frames[digest]
+
+
+# The frame store shared by every animator
+frame_store = FrameStore()
+
+
+class ResourceRegistry:
+    """
+    Class sharing fonts and UI images, such as the chatbox, between everything
+    that uses them, so that each is only loaded once however many sprites
+    need it.
+
+    Every get must be matched by a release once the resource is no longer
+    needed. Each resource counts how many users it has, and is dropped when
+    the last one releases it, so the resources of an unloaded room don't
+    stay loaded.
+
+    Attributes:
+        _fonts: a dictionary where a tuple of the font path and size is the
+            key and a list containing the Font and the number of users is the
+            value
+        _images: a dictionary where the image path is the key and a list
+            containing the surface and the number of users is the value
+    """
+    def __init__(self):
+        """
+        Initialize an instance of ResourceRegistry, with nothing loaded.
+        """
+        self._fonts = {}
+        self._images = {}
+
+    def get_font(self, path, size):
+        """
+        Get a font, loading it if nothing is using it yet.
+
+        Args:
+            path: the path to the font file
+            size: the size of the font in points
+
+        Returns:
+            the shared pygame Font
+        """
+        key = (path, size)
+        if key not in self._fonts:
+            self._fonts[key] = [pygame.font.Font(path, size), 0]
+        self._fonts[key][1] += 1
+        return self._fonts[key][0]
+
+    def release_font(self, path, size):
+        """
+        Stop using a font returned by get_font, dropping it if nothing else
+        is using it.
+
+        Args:
+            path: the path to the font file
+            size: the size of the font in points
+        """
+        key = (path, size)
+        self._fonts[key][1] -= 1
+        if self._fonts[key][1] == 0:
+            del self._fonts[key]
+
+    def get_image(self, path, colorkey=None):
+        """
+        Get a UI image, loading it if nothing is using it yet. The image is
+        shared, so it must not be drawn on.
+
+        Args:
+            path: the path to the image file
+            colorkey: the colour to treat as transparent, set with RLE
+                acceleration when the image is loaded. Defaults to None,
+                meaning no colour is transparent
+
+        Returns:
+            the shared surface
+        """
+        if path not in self._images:
+            img = load_image(path)
+            if colorkey is not None:
+                img.set_colorkey(colorkey, RLEACCEL)
+            self._images[path] = [img, 0]
+        self._images[path][1] += 1
+        return self._images[path][0]
+
+    def release_image(self, path):
+        """
+        Stop using an image returned by get_image, dropping it if nothing
+        else is using it.
+
+        Args:
+            path: the path to the image file
+        """
+        self._images[path][1] -= 1
+        if self._images[path][1] == 0:
+            del self._images[path]
+
+    def get_images(self):
+        """
+        Get the UI images currently loaded.
+
+        Returns:
+            a dictionary where the image path is the key and the surface is
+            the value
+        """
+        return {path: entry[0] for path, entry in self._images.items()}
+
+    def get_users(self):
+        """
+        Count the users of every loaded resource.
+
+        Returns:
+            a dictionary where a tuple of the font path and size, or the image
+            path, is the key and the number of users is the value
+        """
+        users = {key: entry[1] for key, entry in self._fonts.items()}
+        users.update({path: entry[1] for path, entry in self._images.items()})
+        return users
+
+
+# The fonts and UI images shared by every sprite
+resources = ResourceRegistry()
+
+
+# Records parsed from the .csv files defining datasprites. See the README
+# for what each row of a .csv means
+Definition = namedtuple('Definition', [
+    'place', 'speed', 'initial_state', 'objects', 'entrances', 'exits',
+    'interactables', 'npcs'])
+Entrance = namedtuple('Entrance', ['x', 'y', 'room'])
+Exit = namedtuple('Exit', ['x', 'y', 'width', 'height', 'room'])
+Placement = namedtuple('Placement', ['x', 'y', 'name', 'end_state'])
+
+
+def parse_definition(path):
+    """
+    Parse the .csv file defining a datasprite.
+
+    The first row only holds column numbers, and the first cell of every other
+    row names what the rest of the row holds. Rows that are not used, and
+    empty cells, are ignored.
+
+    Args:
+        path: the path to the .csv file
+
+    Returns:
+        an instance of Definition. place is None if the file has no place row,
+        and initial_state is None if it has no initial_state row. The other
+        rows are tuples with an element for each cell
+    """
+    rows = {}
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if row:
+                rows[row[0].strip()] = [cell.strip() for cell in row[1:]
+                                        if cell.strip() != '']
+
+    def split(key):
+        return [cell.split('/') for cell in rows.get(key, [])]
+
+    place = None
+    if 'place' in rows:
+        place = (int(rows['place'][0]), int(rows['place'][1]))
+    initial_state = None
+    if 'initial_state' in rows:
+        initial_state = int(rows['initial_state'][0])
+    return Definition(
+        place=place,
+        speed=float(rows['animator'][0]),
+        initial_state=initial_state,
+        objects=tuple(tuple(int(value) for value in cell)
+                      for cell in split('objects')),
+        entrances=tuple(Entrance(int(cell[0]), int(cell[1]), cell[2])
+                        for cell in split('entrances')),
+        exits=tuple(Exit(int(cell[0]), int(cell[1]), int(cell[2]),
+                         int(cell[3]), cell[4])
+                    for cell in split('exits')),
+        interactables=tuple(Placement(int(cell[0]), int(cell[1]), cell[2],
+                                      cell[3])
+                            for cell in split('interactables')),
+        npcs=tuple(Placement(int(cell[0]), int(cell[1]), cell[2], None)
+                   for cell in split('npcs')))
+
+
+class DefinitionCache:
+    """
+    Class keeping parsed .csv definitions, both in memory and in a binary
+    file so that later runs of the game don't need to parse them again.
+
+    An entry is only used while the modification time and size of its .csv
+    file are unchanged, so editing a .csv is picked up on the next run.
+
+    Attributes:
+        _path: string containing the path of the binary cache file
+        _entries: a dictionary where the .csv path is the key and a tuple of
+            the modification time, size and Definition is the value. None
+            until the cache file has been read
+        _dirty: boolean representing whether _entries has changed since the
+            cache file was last written
+    """
+    _version = 1
+
+    def __init__(self, path='Media/definitions.cache'):
+        """
+        Initialize an instance of DefinitionCache.
+
+        Args:
+            path: the path of the binary cache file. Defaults to
+                definitions.cache in the Media folder
+        """
+        self._path = path
+        self._entries = None
+        self._dirty = False
+
+    def get(self, path):
+        """
+        Get the definition parsed from a .csv file, parsing it again only if
+        the file has changed since it was cached. The cache file is only
+        written by save.
+
+        Args:
+            path: the path to the .csv file
+
+        Returns:
+            an instance of Definition
+        """
+        if self._entries is None:
+            self._entries = self._read()
+        stat = os.stat(path)
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != stat.st_mtime_ns or \
+                entry[1] != stat.st_size:
+            entry = (stat.st_mtime_ns, stat.st_size, parse_definition(path))
+            self._entries[path] = entry
+            self._dirty = True
+        return entry[2]
+
+    def save(self):
+        """
+        Write the cache file if any definition was parsed again since it was
+        last written, leaving the old one in place if it can't be written.
+        """
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            with open(self._path + '.tmp', 'wb') as f:
+                pickle.dump((DefinitionCache._version, self._entries), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(self._path + '.tmp', self._path)
+        except OSError:
+            pass
+
+    def _read(self):
+        """
+        Read the cache file, ignoring it if it is missing, unreadable or from
+        a different version of the cache.
+
+        Returns:
+            a dictionary of entries, as in _entries
+        """
+        try:
+            with open(self._path, 'rb') as f:
+                version, entries = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError,
+                AttributeError, TypeError):
+            return {}
+        if version != DefinitionCache._version:
+            return {}
+        return entries
+
+
+# The definition cache shared by every datasprite
+definition_cache = DefinitionCache()
+
+
+def read_definition(data, dir):
+    """
+    Get the definition of a datasprite from its .csv file, in the Media folder
+    structure described in DataSprite.
+
+    Args:
+        data: the name of the file to look in to define the datasprite
+        dir: the directory to get to the file that holds the datasprite
+
+    Returns:
+        an instance of Definition
+    """
+    return definition_cache.get('Media/' + dir + data + "/" + data + '.csv')
 
 
 class Animator:
@@ -16,17 +904,24 @@ class Animator:
     motions. These types are defined from the folders inside the directory
     animator is given, and the animator will assume that all folders inside
     the directory are to be used as animator types, with images in each.
+    The images come from frame_store, so animators using the same directory
+    share them.
 
     Attributes:
         _images: a dictionary containing lists of images for each type, where
-            the type is the key, and images are the values
+            the type is the key, and images are the values. Shared with the
+            other animators using the same directory
         _index: a dictionary equivalent to images that instead contains the
             current index of each type (ie. how much of the motion has
-            completed)
+            completed), in ticks
         _types: a list containing all the types as strings
         _update_speed: a float representing how fast to update the animator,
-            where 1 is 1 frame per tick and 0.1 is 1 frame every 10 ticks
+            where 1 is 1 frame per tick and 0.1 is 1 frame every 10 ticks. A
+            tick is TICK_MS long
     """
+    __slots__ = ('_images', '_index', '_types', '_current_type',
+                 '_update_speed')
+
     def __init__(self, pathname='Media/characters/turtle', speed=0.5):
         """
         Initialize an instance of class Animator
@@ -36,23 +931,11 @@ class Animator:
             speed: the speed at which the animator should change frames.
                 Defaults to 0.5
         """
-        self._images = {}
-        self._index = {}
-        self._types = []
-        # Identifies all of the types as folders
-        with os.scandir(pathname) as it:
-            for entry in it:
-                if entry.is_dir():
-                    self._types.append(entry.name)
-        # Identifies all the images in each type, and adds them to the _images
-        for type in self._types:
-            self._images[type] = []
-            self._index[type] = 0
-            for filename in sorted(os.listdir(pathname + '/' + type)):
-                img = pygame.image.load(os.path.join(pathname, type, filename))
-                self._images[type].append(Surface.convert_alpha(img))
+        self._images = frame_store.get(pathname)
+        # Each animator keeps its own index into the shared images
+        self._index = {type: 0 for type in self._images}
         # Sort _types so that it is correctly ordered
-        self._types = sorted(self._types)
+        self._types = sorted(self._images)
         self._current_type = self._types[0]
         self._update_speed = speed
 
@@ -66,21 +949,56 @@ class Animator:
         """
         return self._current_type
 
-    def get_next(self, type=''):
+    def has_type(self, type):
         """
-        Updates the animator and increments the current type by 1, thereby
-        creating motion visually. The type can also be changed with the
-        type parameter. Uses the _update_speed as a rate to increment at.
+        Determine if the animator has images of a type.
+
+        Args:
+            type: string containing the type
+
+        Returns:
+            True if the animator has the type, False otherwise
+        """
+        return type in self._images
+
+    def get_bytes(self):
+        """
+        Find how many bytes the animator and its indexes take up, leaving out
+        the shared images.
+
+        Returns:
+            the number of bytes as an int
+        """
+        return get_object_bytes(self) + sys.getsizeof(self._index)
+
+    def is_animated(self):
+        """
+        Determine if any type of the animator has more than one image, so
+        that the images it returns change over time.
+
+        Returns:
+            True if any type has more than one image, False otherwise
+        """
+        return any(len(images) > 1 for images in self._images.values())
+
+    def get_next(self, type='', elapsed_ms=TICK_MS):
+        """
+        Updates the animator and moves the current type on by the time
+        elapsed, thereby creating motion visually. The type can also be
+        changed with the type parameter. Uses the _update_speed as a rate to
+        increment at.
 
         Args:
             type: The type of the animator to update and get the next of, if
             blank, sets to the default first type (index 0)
+            elapsed_ms: the time to move the animation on by, in ms. Defaults
+                to one tick
         Returns:
             The next image in the specified type of the animator
         """
         if type == '':
             type = self._types[0]
-        self._index[type] += 1
+        self._index[type] += elapsed_ms / TICK_MS
         # If the index is out of bounds, it needs to revert to the first image
         if math.floor(self._index[type] * self._update_speed) \
                 >= len(self._images[type]):
@@ -92,6 +1010,15 @@ class Animator:
         return self._images[type][math.floor(
             self._index[type] * self._update_speed)]
 
+    def set_type(self, type):
+        """
+        Set the current type of the animator without changing any images.
+
+        Args:
+            type: the type to set as current, as a string
+        """
+        self._current_type = type
+
     def get_next_folder(self):
         """
         Sets the current type of the animator to the next folder alphabetically
@@ -107,7 +1034,415 @@ class Animator:
         return self._current_type
 
 
-class DataSprite(pygame.sprite.Sprite):
+class SpatialGrid:
+    """
+    Class indexing rects by the cells of a uniform grid that they overlap.
+
+    Two rects can only overlap if they share a cell, so finding the rects
+    that overlap a given rect only needs to check the rects in the few cells
+    it covers rather than every rect.
+
+    Besides the rects given when it is created, which never move, the grid
+    can hold items such as sprites that are added, moved and removed as the
+    game runs.
+
+    Attributes:
+        _cell_size: int representing the width and height of a cell in pixels
+        _cells: a dictionary where a tuple of the column and row of a cell is
+            the key and a list of the rects and items overlapping that cell is
+            the value
+        _item_cells: a dictionary where an item is the key and the list of
+            cells it was last added to is the value
+    """
+    def __init__(self, rects, cell_size=64):
+        """
+        Initialize an instance of SpatialGrid.
+
+        Args:
+            rects: a list of rects to index
+            cell_size: the width and height of a cell in pixels. Defaults to
+                64, about the size of a character
+        """
+        self._cell_size = cell_size
+        self._cells = {}
+        self._item_cells = {}
+        for rect in rects:
+            for cell in self._cells_of(rect):
+                self._cells.setdefault(cell, []).append(rect)
+
+    def _cells_of(self, rect):
+        """
+        Find the cells a rect overlaps.
+
+        Args:
+            rect: the rect to find the cells of
+
+        Returns:
+            a list of tuples of the column and row of each cell
+        """
+        size = self._cell_size
+        return [(col, row)
+                for col in range(rect.left // size,
+                                 max(rect.right - 1, rect.left) // size + 1)
+                for row in range(rect.top // size,
+                                 max(rect.bottom - 1, rect.top) // size + 1)]
+
+    def add(self, item, rect):
+        """
+        Index an item by the cells its rect overlaps.
+
+        Args:
+            item: the item to index, which must be hashable
+            rect: the rect the item covers
+        """
+        cells = self._cells_of(rect)
+        for cell in cells:
+            self._cells.setdefault(cell, []).append(item)
+        self._item_cells[item] = cells
+
+    def remove(self, item):
+        """
+        Stop indexing an item. Does nothing if the item isn't indexed.
+
+        Args:
+            item: the item to remove
+        """
+        for cell in self._item_cells.pop(item, []):
+            self._cells[cell].remove(item)
+
+    def move(self, item, rect):
+        """
+        Index an item by the cells its rect overlaps now, adding it if it
+        isn't indexed. Only touches the cells if the item has moved into
+        different ones.
+
+        Args:
+            item: the item to move, which must be hashable
+            rect: the rect the item covers now
+        """
+        cells = self._cells_of(rect)
+        if cells != self._item_cells.get(item):
+            self.remove(item)
+            for cell in cells:
+                self._cells.setdefault(cell, []).append(item)
+            self._item_cells[item] = cells
+
+    def query(self, rect):
+        """
+        Find the rects and items that share a cell with a given rect, which
+        includes every one that overlaps it.
+
+        Args:
+            rect: the rect to look around
+
+        Returns:
+            a list of the rects and items found, without duplicates
+        """
+        found = []
+        for cell in self._cells_of(rect):
+            for other in self._cells.get(cell, []):
+                if other not in found:
+                    found.append(other)
+        return found
+
+    def collides(self, rect):
+        """
+        Determine if a rect overlaps any of the rects the grid was created
+        with. Gives the same result as checking rect.collidelist on every one
+        of them. Only meant for grids holding no items.
+
+        Args:
+            rect: the rect to check
+
+        Returns:
+            True if the rect overlaps an indexed rect, False otherwise
+        """
+        for cell in self._cells_of(rect):
+            if rect.collidelist(self._cells.get(cell, [])) >= 0:
+                return True
+        return False
+
+
+class NavGrid:
+    """
+    Class dividing an area into a grid of small cells and marking the cells
+    its boundaries overlap, so that characters can find paths around them.
+
+    Whether a character fits in a cell is found from a summed area table of
+    the blocked cells, so it costs the same however big the character is.
+    Paths are found with A* the first time they are asked for, then kept,
+    since the boundaries never move: characters that walk the same way again
+    don't search at all.
+
+    Attributes:
+        _bounds: the rect of the area covered
+        _cell_size: int representing the width and height of a cell in pixels
+        _cols: int representing the number of columns of cells
+        _rows: int representing the number of rows of cells
+        _sums: a list of rows of the summed area table, where _sums[row][col]
+            is the number of blocked cells above and to the left of the
+            corner at that column and row
+        _paths: an ordered dictionary of the paths found, where a tuple of
+            the start cell, goal cell and character size is the key and the
+            path, or None if there isn't one, is the value
+    """
+    _path_cache_size = 512
+
+    def __init__(self, rects, bounds, cell_size=10):
+        """
+        Initialize an instance of NavGrid.
+
+        Args:
+            rects: a list of rects the characters can't walk into
+            bounds: the rect of the area to cover
+            cell_size: the width and height of a cell in pixels. Defaults to
+                10, two steps of a character
+        """
+        self._bounds = pygame.Rect(bounds)
+        self._cell_size = cell_size
+        self._cols = -(-self._bounds.width // cell_size)
+        self._rows = -(-self._bounds.height // cell_size)
+        blocked = [[0] * self._cols for _ in range(self._rows)]
+        for rect in rects:
+            rect = rect.clip(self._bounds)
+            if not rect.width or not rect.height:
+                continue
+            left, top = self.get_cell(rect.topleft)
+            right, bottom = self.get_cell((rect.right - 1, rect.bottom - 1))
+            for row in range(top, bottom + 1):
+                for col in range(left, right + 1):
+                    blocked[row][col] = 1
+        self._sums = [[0] * (self._cols + 1)]
+        for row in range(self._rows):
+            above = self._sums[row]
+            sums = [0]
+            total = 0
+            for col in range(self._cols):
+                total += blocked[row][col]
+                sums.append(above[col + 1] + total)
+            self._sums.append(sums)
+        self._paths = OrderedDict()
+
+    def get_cell(self, pos):
+        """
+        Find the cell a point is in.
+
+        Args:
+            pos: the x and y coordinates of the point
+
+        Returns:
+            a tuple of the column and row of the cell, or None if the point
+            is outside the grid
+        """
+        if not self._bounds.collidepoint(pos):
+            return None
+        return ((pos[0] - self._bounds.left) // self._cell_size,
+                (pos[1] - self._bounds.top) // self._cell_size)
+
+    def get_center(self, cell):
+        """
+        Find the centre of a cell.
+
+        Args:
+            cell: a tuple of the column and row of the cell
+
+        Returns:
+            a tuple of the x and y coordinates of the centre
+        """
+        return (self._bounds.left + cell[0] * self._cell_size +
+                self._cell_size // 2,
+                self._bounds.top + cell[1] * self._cell_size +
+                self._cell_size // 2)
+
+    def is_walkable(self, cell, size):
+        """
+        Determine if a character centred on a cell stays inside the grid and
+        clear of every cell a boundary overlaps.
+
+        Args:
+            cell: a tuple of the column and row of the cell
+            size: the width and height of the character
+
+        Returns:
+            True if the character fits, False otherwise
+        """
+        rect = pygame.Rect((0, 0), size)
+        rect.center = self.get_center(cell)
+        if not self._bounds.contains(rect):
+            return False
+        left, top = self.get_cell(rect.topleft)
+        right, bottom = self.get_cell((rect.right - 1, rect.bottom - 1))
+        sums = self._sums
+        return sums[bottom + 1][right + 1] - sums[top][right + 1] - \
+            sums[bottom + 1][left] + sums[top][left] == 0
+
+    def find_path(self, start, goal, size):
+        """
+        Find the shortest path between two cells for a character, moving
+        between neighbouring cells in the four directions the characters
+        walk in.
+
+        Args:
+            start: a tuple of the column and row of the cell to start from
+            goal: a tuple of the column and row of the cell to reach
+            size: the width and height of the character
+
+        Returns:
+            a list of the cells on the path, from start to goal, or None if
+            the character can't get there
+        """
+        key = (start, goal, tuple(size))
+        if key in self._paths:
+            self._paths.move_to_end(key)
+            return self._paths[key]
+        path = None
+        if self.is_walkable(start, size) and self.is_walkable(goal, size):
+            path = self._search(start, goal, size)
+        self._paths[key] = path
+        if len(self._paths) > NavGrid._path_cache_size:
+            self._paths.popitem(last=False)
+        return path
+
+    def _search(self, start, goal, size):
+        """
+        Search for the shortest path between two walkable cells with A*.
+
+        Args:
+            start: a tuple of the column and row of the cell to start from
+            goal: a tuple of the column and row of the cell to reach
+            size: the width and height of the character
+
+        Returns:
+            a list of the cells on the path, from start to goal, or None if
+            there isn't one
+        """
+        # Entries hold the estimated length, the order they were pushed in
+        # so that ties are broken the same way every time, and the cell
+        heap = [(0, 0, start)]
+        came_from = {start: None}
+        cost = {start: 0}
+        pushed = 1
+        while heap:
+            cell = heapq.heappop(heap)[2]
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = came_from[cell]
+                return path[::-1]
+            for step in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                next_cell = (cell[0] + step[0], cell[1] + step[1])
+                next_cost = cost[cell] + 1
+                if next_cost < cost.get(next_cell, next_cost + 1) and \
+                        0 <= next_cell[0] < self._cols and \
+                        0 <= next_cell[1] < self._rows and \
+                        self.is_walkable(next_cell, size):
+                    cost[next_cell] = next_cost
+                    came_from[next_cell] = cell
+                    estimate = next_cost + abs(goal[0] - next_cell[0]) + \
+                        abs(goal[1] - next_cell[1])
+                    heapq.heappush(heap, (estimate, pushed, next_cell))
+                    pushed += 1
+        return None
+
+
+class DrawQueue:
+    """
+    Class collecting what is drawn over the background and room in a frame,
+    so that it can all be blitted to the screen at once.
+
+    The queue takes blits like a surface, so sprites draw to it the same way
+    they draw to the screen. Anything that would land wholly outside the
+    screen, like a character waiting off screen to walk in, is dropped as it
+    is queued. When the queue is flushed, what is left is sorted by layer,
+    keeping the order it was queued in within a layer, and drawn with a
+    single call to Surface.blits.
+
+    Attributes:
+        _rect: the rect of the screen
+        _layer: int representing the layer blits are queued on
+        _items: a list of tuples of the layer, the order queued, and the
+            arguments to blit, for everything queued this frame
+        _culled: int representing how many blits were dropped this frame
+    """
+    def __init__(self, size):
+        """
+        Initialize an instance of DrawQueue.
+
+        Args:
+            size: the width and height of the screen
+        """
+        self._rect = pygame.Rect((0, 0), size)
+        self._layer = 0
+        self._items = []
+        self._culled = 0
+
+    def get_rect(self):
+        """
+        Accessor for the rect of the screen, as Surface.get_rect.
+
+        Returns:
+            the rect of the screen
+        """
+        return self._rect
+
+    def set_layer(self, layer):
+        """
+        Set the layer to queue blits on. Higher layers are drawn on top.
+
+        Args:
+            layer: int representing the layer
+        """
+        self._layer = layer
+
+    def blit(self, source, dest, area=None):
+        """
+        Queue a surface to be drawn, as Surface.blit, unless it would be
+        wholly outside the screen.
+
+        Args:
+            source: the surface to draw
+            dest: the rect or the x and y coordinates of the top left corner
+                to draw it at
+            area: the rect of the part of source to draw. Defaults to None,
+                meaning all of it
+        """
+        size = source.get_size() if area is None else area[2:]
+        if not self._rect.colliderect(pygame.Rect(dest[:2], size)):
+            self._culled += 1
+            return
+        if area is None:
+            blit = (source, dest)
+        else:
+            blit = (source, dest, area)
+        self._items.append((self._layer, len(self._items), blit))
+
+    def get_culled(self):
+        """
+        Find how many blits were dropped for being off screen since the queue
+        was last flushed.
+
+        Returns:
+            the number of blits dropped as an int
+        """
+        return self._culled
+
+    def flush(self, screen):
+        """
+        Draw everything queued to the screen, lowest layer first, then empty
+        the queue.
+
+        Args:
+            screen: the screen to draw to
+        """
+        self._items.sort()
+        screen.blits([item[2] for item in self._items], doreturn=False)
+        self._items = []
+        self._culled = 0
+        self._layer = 0
+
+
+class DataSprite:
     """
     Class to create a generic animated object from a .csv file.
 
@@ -115,15 +1450,23 @@ class DataSprite(pygame.sprite.Sprite):
     and more. Assumes the files structure of this project with an overarching
     Media folder
 
+    Datasprites and their children declare their attributes in __slots__, so
+    that an instance doesn't carry a dictionary of its attributes, and only
+    keep the parts of the definition they use.
+
     Attributes:
-        _datafile: a pandas dataframe created from the .csv file
+        _name: the name of the file the datasprite was defined by
         _animator: an instance of the class Animator with properties derived
-            from datafile
+            from the definition
         _surf: a Sprite surf displaying the current state of animator
         _rect: a Sprite rect representing the current location of the Sprite,
-            specified by datafile
+            specified by the definition
+        _changed: boolean indicating whether the sprite has changed since
+            it was last drawn
     """
-    def __init__(self, data, dir):
+    __slots__ = ('_name', '_animator', '_surf', '_rect', '_changed')
+
+    def __init__(self, data, dir, definition=None):
         """
         Initializes an instance of class datasprite with given specifications
         derived from a given directory. The reason that the dir and data
@@ -134,29 +1477,41 @@ class DataSprite(pygame.sprite.Sprite):
         Args:
             data: the name of the file to look in to define the datasprite
             dir: the directory to get to the file that holds the datasprite
+            definition: the instance of Definition read from the file, for
+                children that need more of it. Defaults to None, meaning it
+                is read here
         """
-        super().__init__()
-
-        # Create path and read the .csv defining the background
-        path = 'Media/' + dir + data + "/" + data + '.csv'
-        self._datafile = pandas.read_csv(path, index_col=0)
+        # Read the .csv defining the background
+        if definition is None:
+            definition = read_definition(data, dir)
         self._name = data
         # Assign the animator path and update speed to a new instance of
         # Animator
         self._animator = Animator(
             pathname='Media/' + dir + data,
-            speed=float(self._datafile.loc['animator', '2']))
+            speed=definition.speed)
 
         # Get the first frame of the animation and create the background surface
         self._surf = self._animator.get_next()
-        self._surf.set_colorkey((255, 255, 255), RLEACCEL)
         # If the file has 'place' set the rectangle to be at that place
-        if 'place' in self._datafile.index:
+        if definition.place is not None:
             self._rect = self._surf.get_rect(
-                left=int(self._datafile.loc['place', '2']),
-                top=int(self._datafile.loc['place', '3']))
+                left=definition.place[0],
+                top=definition.place[1])
         else:
             self._rect = self._surf.get_rect()
+        self._changed = True
+
+    def get_bytes(self):
+        """
+        Find how many bytes the objects belonging to the datasprite take up:
+        the datasprite itself and its animator. Frames are shared, so they
+        are counted by frame_store instead.
+
+        Returns:
+            the number of bytes as an int
+        """
+        return get_object_bytes(self) + self._animator.get_bytes()
 
     def collide(self, other):
         """
@@ -180,6 +1535,24 @@ class DataSprite(pygame.sprite.Sprite):
         """
         return self._rect
 
+    def get_surf(self):
+        """
+        Accessor for the datasprite's current image
+
+        Returns:
+            the surface currently shown for the datasprite
+        """
+        return self._surf
+
+    def has_changed(self):
+        """
+        Determine if the datasprite's image changed on its last update.
+
+        Returns:
+            True if the last update showed a different frame, False otherwise
+        """
+        return self._changed
+
     def get_name(self):
         """
         Accessor for the datasprite's name
@@ -196,5 +1569,47 @@ class DataSprite(pygame.sprite.Sprite):
         Args:
             screen: the surface to update to.
         """
-        self._surf = self._animator.get_next()
-        screen.blit(self._surf, self._rect)
+        self.animate()
+        self.draw(screen)
+
+    def animate(self, elapsed_ms=TICK_MS):
+        """
+        Move the animation on without drawing it.
+
+        Args:
+            elapsed_ms: the time to move the animation on by, in ms. Defaults
+                to one tick
+
+        Returns:
+            True if this showed a different frame, False otherwise
+        """
+        surf = self._animator.get_next(elapsed_ms=elapsed_ms)
+        self._changed = surf is not self._surf
+        self._surf = surf
+        return self._changed
+
+    def get_draw_rect(self, alpha=1.0):
+        """
+        Find where the datasprite is drawn, part way between the last tick
+        and the current one.
+
+        Args:
+            alpha: how far between the last tick and the current one to draw,
+                from 0 to 1. Defaults to 1, meaning the current tick
+
+        Returns:
+            the rect to draw the datasprite at. Datasprites that don't move
+            are always drawn at their rect
+        """
+        return self._rect
+
+    def draw(self, screen, alpha=1.0):
+        """
+        Draw the current frame without moving the animation on.
+
+        Args:
+            screen: the screen, or a DrawQueue, to draw to
+            alpha: how far between the last tick and the current one to draw,
+                from 0 to 1. Defaults to 1, meaning the current tick
+        """
+        screen.blit(self._surf, self.get_draw_rect(alpha))
@@ -1,6 +1,6 @@
 import pygame
 import helpers
-import pandas
+import triggers
 from pygame.locals import RLEACCEL
 
 
@@ -11,18 +11,31 @@ class Interactable(helpers.DataSprite):
     Attributes:
         _state: int representing the state the interactable is in.
             Increments when the player interacts with an instance
-        _data: string representing the interactable to create
         _end_state: int representing the state the interactable must be in for
             the game to progress. Defaults to 1
+        _room: the room the interactable is in, told when it moves or
+            reaches or leaves its end state, or None if it isn't in one
     """
+    __slots__ = ('_state', '_end_state', '_room')
+
     def __init__(self, data, end_state=1):
         """
         Initialize an instance of the Interactable class
         """
-        super().__init__(data, 'interactables/')
-        self._state = int(self._datafile.loc['initial_state', '2'])
-        self._data = data
+        definition = helpers.read_definition(data, 'interactables/')
+        super().__init__(data, 'interactables/', definition)
+        self._state = definition.initial_state
         self._end_state = end_state
+        self._room = None
+
+    def set_room(self, room):
+        """
+        Set the room the interactable is in.
+
+        Args:
+            room: the instance of Room the interactable is in, or None
+        """
+        self._room = room
 
     def place(self, x, y):
         """
@@ -36,6 +49,8 @@ class Interactable(helpers.DataSprite):
         """
         self._rect.x = x
         self._rect.y = y
+        if self._room is not None:
+            self._room.index_interactable(self)
 
     def highlight(self):
         """
@@ -63,8 +78,12 @@ class Interactable(helpers.DataSprite):
         """
         Increment the state and visuals of an interactable upon interaction.
         """
+        was_end_state = self.is_end_state()
         self._state = self._animator.get_next_folder()
         self._surf = self._animator.get_next()
+        if self._room is not None:
+            self._room.count_end_state(was_end_state, self.is_end_state())
+        triggers.emit('interact', self._name)
 
     def update(self, screen, player):
         """
@@ -75,6 +94,18 @@ class Interactable(helpers.DataSprite):
         it will update accordingly. If the player moves out of range, the
         interactable will de-highlight itself.
         """
+        self.tick(player)
+        self.draw(screen)
+
+    def tick(self, player):
+        """
+        Run one tick of the interactable without drawing it: highlight it if
+        the player is in range, and interact with it if the player is
+        interacting. See update.
+
+        Args:
+            player: the instance of Player to check for interaction
+        """
         if self.collide(player):
             self.highlight()
             if player.interacting():
@@ -82,7 +113,29 @@ class Interactable(helpers.DataSprite):
         else:
             self.un_highlight()
 
-        screen.blit(self._surf, self._rect)
+    def get_state(self):
+        """
+        Accessor for the state of the interactable.
+
+        Returns:
+            the current state of the interactable
+        """
+        return self._state
+
+    def set_state(self, state):
+        """
+        Put the interactable in a given state, for instance to restore
+        progress made in a room that has been unloaded.
+
+        Args:
+            state: the state to put the interactable in
+        """
+        was_end_state = self.is_end_state()
+        self._state = state
+        self._animator.set_type(str(state))
+        self._surf = self._animator.get_next(type=str(state))
+        if self._room is not None:
+            self._room.count_end_state(was_end_state, self.is_end_state())
 
     def is_end_state(self):
         """
@@ -93,3 +146,13 @@ class Interactable(helpers.DataSprite):
              True if it is in the correct state, False otherwise
         """
         return self._state == self._end_state
+
+    def is_animated(self):
+        """
+        Determine if the interactable's images change while it sits still,
+        so that it has to be ticked even when the player is far from it.
+
+        Returns:
+            True if any of its types has more than one image, False otherwise
+        """
+        return self._animator.is_animated()
@@ -1,8 +1,49 @@
+import sys
 import pygame
 import game
+import profiler
 
 pygame.init()
 
-game1 = game.Game()
+# Run with --profile to time each part of every frame. The timings are
+# written to profile.csv, and pressing F3 in the game shows them
+frame_profiler = None
+if '--profile' in sys.argv:
+    frame_profiler = profiler.FrameProfiler('profile.csv')
+
+# Run with --fps followed by a number to draw at most that many frames per
+# second, or 0 for no limit. The game itself always runs at 30 ticks per
+# second. --vsync draws in time with the display instead, and --interpolate
+# draws moving sprites between ticks
+max_fps = 30
+if '--fps' in sys.argv:
+    max_fps = int(sys.argv[sys.argv.index('--fps') + 1])
+
+# Run with --record followed by a file name to record the input of every
+# tick, and --replay followed by a file name to play a recording back instead
+# of reading the keyboard. --unthrottled replays as fast as possible
+record_to = None
+if '--record' in sys.argv:
+    record_to = sys.argv[sys.argv.index('--record') + 1]
+replay_from = None
+if '--replay' in sys.argv:
+    replay_from = sys.argv[sys.argv.index('--replay') + 1]
+
+# Run with --save followed by a file name to save progress to that file every
+# time the player enters a room, and to continue from it if it exists
+autosave = None
+if '--save' in sys.argv:
+    autosave = sys.argv[sys.argv.index('--save') + 1]
+
+# Run with --simulate to run the game logic without drawing anything, as fast
+# as possible. It is most useful with --replay, to play a recording through
+# in seconds
+# Run with --dirty-rects to only update the parts of the window that change
+game1 = game.Game(frame_profiler, dirty_rects='--dirty-rects' in sys.argv,
+                  max_fps=max_fps, vsync='--vsync' in sys.argv,
+                  interpolate='--interpolate' in sys.argv,
+                  record_to=record_to, replay_from=replay_from,
+                  unthrottled='--unthrottled' in sys.argv,
+                  render='--simulate' not in sys.argv, autosave=autosave)
 
 game1.run()
@@ -0,0 +1,219 @@
+import csv
+import time
+import contextlib
+from collections import deque
+
+import pygame
+
+# The profiler that section() records into, or None when profiling is off
+_active = None
+# Returned by section() when profiling is off, so that timing costs nothing
+_null_section = contextlib.nullcontext()
+
+
+def install(profiler):
+    """
+    Make a profiler the one that section() records into.
+
+    Args:
+        profiler: the instance of FrameProfiler to use, or None to stop
+            profiling
+    """
+    global _active
+    _active = profiler
+
+
+def section(name):
+    """
+    Time a block of code as part of a subsystem, if profiling is on.
+
+    Use as `with profiler.section('room'):`. Time spent in the same section
+    more than once in a frame is added together, and sections can be nested,
+    in which case the outer section includes the time of the inner one.
+
+    Args:
+        name: string containing the name of the subsystem
+
+    Returns:
+        a context manager timing the block
+    """
+    if _active is None:
+        return _null_section
+    return _active.section(name)
+
+
+class FrameProfiler:
+    """
+    Class recording the wall time spent in each subsystem on every frame.
+
+    The most recent frames can be drawn as a small rolling graph on top of
+    the game, and every frame can be written to a .csv file with a row for
+    each section timed in each frame.
+
+    Attributes:
+        _history: a deque of the most recent frames. Each frame is a tuple of
+            its total time in ms and a dictionary where the name of a top
+            level section is the key and its time in ms is the value
+        _frame: int representing the number of the current frame
+        _frame_start: the time the current frame started, in seconds
+        _times: a dictionary where the section name is the key and the time
+            spent in it so far this frame, in ms, is the value
+        _top_level: a set of the names of sections timed this frame while no
+            other section was open
+        _depth: int representing how many sections are currently open
+        _visible: boolean indicating whether the overlay is shown
+        _font: the font to write the overlay text in
+        _csv_file: the file the samples are written to, or None
+        _csv_writer: the csv writer for _csv_file, or None
+    """
+    # Time per frame available at 30 frames per second, in ms
+    budget_ms = 1000 / 30
+    # Colours used for the top level sections in the overlay graph
+    colours = [(230, 25, 75), (60, 180, 75), (255, 225, 25), (0, 130, 200),
+               (245, 130, 48), (145, 30, 180), (70, 240, 240),
+               (240, 50, 230)]
+
+    def __init__(self, csv_path=None, history=150):
+        """
+        Initialize an instance of FrameProfiler.
+
+        Args:
+            csv_path: the path of the .csv file to write samples to.
+                Defaults to None, meaning samples are not written
+            history: the number of frames to show in the overlay. Defaults to
+                150, five seconds at 30 frames per second
+        """
+        self._history = deque(maxlen=history)
+        self._frame = 0
+        self._frame_start = None
+        self._times = {}
+        self._top_level = set()
+        self._depth = 0
+        self._visible = False
+        self._font = None
+        self._csv_file = None
+        self._csv_writer = None
+        if csv_path is not None:
+            self._csv_file = open(csv_path, 'w', newline='')
+            self._csv_writer = csv.writer(self._csv_file)
+            self._csv_writer.writerow(['frame', 'section', 'ms'])
+
+    def begin_frame(self):
+        """
+        Start timing a new frame.
+        """
+        self._frame_start = time.perf_counter()
+        self._times = {}
+        self._top_level = set()
+
+    def end_frame(self):
+        """
+        Finish timing the current frame, adding it to the overlay history and
+        writing it to the .csv file.
+        """
+        if self._frame_start is None:
+            return
+        total = (time.perf_counter() - self._frame_start) * 1000
+        self._history.append((total, {name: self._times[name]
+                                      for name in self._top_level}))
+        if self._csv_writer is not None:
+            self._csv_writer.writerow([self._frame, 'total', '%.4f' % total])
+            for name, ms in self._times.items():
+                self._csv_writer.writerow([self._frame, name, '%.4f' % ms])
+        self._frame += 1
+        self._frame_start = None
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """
+        Time a block of code as part of a subsystem. See section() at the
+        module level.
+
+        Args:
+            name: string containing the name of the subsystem
+        """
+        if self._depth == 0:
+            self._top_level.add(name)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self._times[name] = self._times.get(name, 0) + \
+                (time.perf_counter() - start) * 1000
+
+    def toggle_overlay(self):
+        """
+        Show the overlay if it is hidden, and hide it if it is shown.
+        """
+        self._visible = not self._visible
+
+    def is_visible(self):
+        """
+        Determine if the overlay is shown.
+
+        Returns:
+            True if the overlay is shown, False otherwise
+        """
+        return self._visible
+
+    def draw(self, screen):
+        """
+        Draw the overlay, if it is shown, in the top left of the screen.
+
+        The overlay is a bar for each recent frame, split into the top level
+        sections, with a white line at the frame budget. Below it is the
+        average time of each section over the frames shown.
+
+        Args:
+            screen: the screen to draw to
+        """
+        if not self._visible or not self._history:
+            return
+        if self._font is None:
+            self._font = pygame.font.Font(
+                'Media/fonts/iAWriterDuospace-Regular.otf', 12)
+        height = 100
+        scale = height / (2 * FrameProfiler.budget_ms)
+        names = sorted({name for _, frame in self._history
+                        for name in frame})
+        panel = pygame.Surface((self._history.maxlen * 2 + 10,
+                                height + 15 * len(names) + 30))
+        panel.set_alpha(200)
+        # Draw a bar for each frame, stacking the top level sections
+        for x, (total, frame) in enumerate(self._history):
+            bottom = height
+            for i, name in enumerate(names):
+                bar = min(frame.get(name, 0) * scale, bottom)
+                pygame.draw.rect(panel, FrameProfiler.colours[
+                    i % len(FrameProfiler.colours)],
+                    (x * 2 + 5, bottom - bar, 2, bar))
+                bottom -= bar
+            other = min(max(total * scale - (height - bottom), 0), bottom)
+            pygame.draw.rect(panel, (128, 128, 128),
+                             (x * 2 + 5, bottom - other, 2, other))
+        budget_y = height - FrameProfiler.budget_ms * scale
+        pygame.draw.line(panel, (255, 255, 255), (5, budget_y),
+                         (panel.get_width() - 5, budget_y))
+        # Write the average time of each section underneath
+        frames = len(self._history)
+        average = sum(total for total, _ in self._history) / frames
+        panel.blit(self._font.render('frame %.2f ms' % average, True,
+                                     (255, 255, 255)), (5, height + 5))
+        for i, name in enumerate(names):
+            ms = sum(frame.get(name, 0) for _, frame in self._history) / frames
+            panel.blit(self._font.render(
+                '%s %.2f ms' % (name, ms), True,
+                FrameProfiler.colours[i % len(FrameProfiler.colours)]),
+                (5, height + 20 + i * 15))
+        screen.blit(panel, (0, 0))
+
+    def close(self):
+        """
+        Close the .csv file, if samples are being written to one.
+        """
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv_writer = None
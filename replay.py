@@ -0,0 +1,207 @@
+import struct
+
+from pygame.locals import (
+    K_UP,
+    K_DOWN,
+    K_LEFT,
+    K_RIGHT,
+    K_SPACE,
+    K_TAB,
+)
+
+# The file starts with the magic bytes and the format version, followed by a
+# record for each tick the input changed on (and every KEEPALIVE_TICKS ticks
+# it didn't): the tick number and the input packed into one byte
+MAGIC = b'MGRP'
+HEADER = struct.Struct('<4sI')
+VERSION = 1
+RECORD = struct.Struct('<IB')
+# The keys the game logic reads, in the order of their bits
+KEYS = (K_UP, K_DOWN, K_LEFT, K_RIGHT, K_SPACE, K_TAB)
+# Set on a tick when a key was pressed that skips the cutscene playing
+SKIP = 1 << len(KEYS)
+# Set on the last record, at the tick the recording stopped
+END = 0x80
+# The input is written again after this many ticks without a change, so that
+# a recording cut off without being closed still shows how far it got
+KEEPALIVE_TICKS = 30
+
+
+def pack(pressed_keys, skip=False):
+    """
+    Pack the input of a tick into the bits of one byte.
+
+    Args:
+        pressed_keys: the state of every key, as returned by
+            pygame.key.get_pressed
+        skip: whether a key was pressed that skips the cutscene playing.
+            Defaults to False
+
+    Returns:
+        the packed input as an int
+    """
+    bits = SKIP if skip else 0
+    for i, key in enumerate(KEYS):
+        if pressed_keys[key]:
+            bits |= 1 << i
+    return bits
+
+
+class PressedKeys:
+    """
+    Class standing in for the result of pygame.key.get_pressed, holding the
+    state of the keys the game logic reads as unpacked from a recording.
+
+    Attributes:
+        _pressed: a set of the keys that are held
+    """
+    def __init__(self, bits):
+        """
+        Initialize an instance of PressedKeys.
+
+        Args:
+            bits: the packed input, as returned by pack
+        """
+        self._pressed = {key for i, key in enumerate(KEYS) if bits & 1 << i}
+
+    def __getitem__(self, key):
+        return key in self._pressed
+
+
+class Recorder:
+    """
+    Class writing the input of every tick of a game to a file, so that the
+    game can be played again exactly with Replay.
+
+    Only the ticks where the input changes are written, so holding a key
+    down for a whole room costs a couple of records, plus one every
+    KEEPALIVE_TICKS ticks. Those are flushed to the file, so that if the
+    game stops without closing the recording, it can still be played up to
+    the last of them.
+
+    Attributes:
+        _file: the open recording file
+        _last: the packed input of the last record written, or None before
+            the first
+        _last_tick: int representing the tick of the last record written
+    """
+    def __init__(self, path):
+        """
+        Start a recording, overwriting the file if it exists.
+
+        Args:
+            path: the path to the recording file
+        """
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._last = None
+        self._last_tick = 0
+
+    def record(self, tick, pressed_keys, skip=False):
+        """
+        Record the input of a tick.
+
+        Args:
+            tick: int representing the number of ticks run before this one
+            pressed_keys: the state of every key, as returned by
+                pygame.key.get_pressed
+            skip: whether a key was pressed that skips the cutscene playing.
+                Defaults to False
+        """
+        bits = pack(pressed_keys, skip)
+        if bits != self._last:
+            self._file.write(RECORD.pack(tick, bits))
+            self._last = bits
+            self._last_tick = tick
+        elif tick - self._last_tick >= KEEPALIVE_TICKS:
+            self._file.write(RECORD.pack(tick, bits))
+            self._file.flush()
+            self._last_tick = tick
+
+    def close(self, tick):
+        """
+        Finish the recording.
+
+        Args:
+            tick: int representing the number of ticks the game ran for
+        """
+        self._file.write(RECORD.pack(tick, END))
+        self._file.close()
+
+
+class Replay:
+    """
+    Class reading a recording made by Recorder, to give the game the input
+    of each tick in place of the keyboard.
+
+    Attributes:
+        _records: a list of tuples of the tick number and packed input of
+            each record, in order
+        _index: int representing the position in _records of the next record
+            to apply
+        _keys: the instance of PressedKeys for the current input
+        _skip: boolean indicating whether the current input skips a cutscene
+        _end: int representing the tick the recording stopped at. For a
+            recording that wasn't closed, the tick after its last record
+    """
+    def __init__(self, path):
+        """
+        Read a recording.
+
+        Args:
+            path: the path to the recording file
+
+        Raises:
+            ValueError: if the file is not a recording of this version
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size or \
+                HEADER.unpack_from(data) != (MAGIC, VERSION):
+            raise ValueError(path + ' is not a version %d recording'
+                             % VERSION)
+        # A recording that wasn't closed may end part way through a record
+        body = data[HEADER.size:]
+        body = body[:len(body) - len(body) % RECORD.size]
+        self._records = list(RECORD.iter_unpack(body))
+        if self._records and self._records[-1][1] == END:
+            self._end = self._records.pop()[0]
+        elif self._records:
+            # The game reached at least the tick of the last record
+            self._end = self._records[-1][0] + 1
+        else:
+            self._end = 0
+        self._index = 0
+        self._keys = PressedKeys(0)
+        self._skip = False
+
+    def get(self, tick):
+        """
+        Get the input of a tick. Ticks must be asked for in order.
+
+        Args:
+            tick: int representing the number of ticks run before this one
+
+        Returns:
+            a tuple of an instance of PressedKeys and whether a cutscene is
+            skipped
+        """
+        while self._index < len(self._records) and \
+                self._records[self._index][0] <= tick:
+            bits = self._records[self._index][1]
+            self._keys = PressedKeys(bits)
+            self._skip = bool(bits & SKIP)
+            self._index += 1
+        return self._keys, self._skip
+
+    def is_finished(self, tick):
+        """
+        Determine if the recording has run out.
+
+        Args:
+            tick: int representing the number of ticks run so far
+
+        Returns:
+            True if every tick of the recording has been run, False otherwise
+        """
+        return tick >= self._end
@@ -0,0 +1,75 @@
+import os
+import json
+import struct
+
+# The file starts with the magic bytes and the format version, followed by
+# the progress as UTF-8 JSON. A snapshot of another version can't be
+# restored, as the progress it holds may not fit the game any more
+MAGIC = b'MGSV'
+HEADER = struct.Struct('<4sI')
+VERSION = 2
+
+
+def _to_tuples(value):
+    """
+    Turn the lists in a value read from JSON back into tuples, as the states
+    of the game are built from tuples and JSON only has lists.
+
+    Args:
+        value: the value read from JSON
+
+    Returns:
+        the value with every list, however deeply nested, made a tuple
+    """
+    if isinstance(value, list):
+        return tuple(_to_tuples(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _to_tuples(item) for key, item in value.items()}
+    return value
+
+
+def write(path, progress):
+    """
+    Write progress to a snapshot file, replacing it if it exists.
+
+    The snapshot is written to a temporary file first and then moved into
+    place, so a game that stops part way through saving keeps its last
+    snapshot.
+
+    Args:
+        path: the path to the snapshot file
+        progress: a dictionary of the progress to save, holding only plain
+            values such as strings, numbers, tuples and lists, with string
+            keys, as returned by Game.get_progress
+    """
+    data = HEADER.pack(MAGIC, VERSION) + \
+        json.dumps(progress, separators=(',', ':')).encode()
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def read(path):
+    """
+    Read the progress from a snapshot file. Only plain values are read, so
+    a snapshot from anywhere is safe to open. Lists are read as tuples.
+
+    Args:
+        path: the path to the snapshot file
+
+    Returns:
+        the dictionary of progress that was saved
+
+    Raises:
+        ValueError: if the file is not a snapshot of this version
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size or \
+            HEADER.unpack_from(data) != (MAGIC, VERSION):
+        raise ValueError(path + ' is not a version %d snapshot' % VERSION)
+    # Text that isn't UTF-8 or JSON raises ValueError too
+    progress = json.loads(data[HEADER.size:].decode())
+    if not isinstance(progress, dict):
+        raise ValueError(path + ' is damaged')
+    return _to_tuples(progress)
@@ -0,0 +1,193 @@
+from collections import deque
+
+# The script that emit() queues events for, or None when no script is running
+_active = None
+
+
+def install(script):
+    """
+    Make a script the one that emit() queues events for, dropping any events
+    still queued for the previous one.
+
+    Args:
+        script: the instance of Script to use, or None to stop queuing events
+    """
+    global _active
+    if _active is not None:
+        _active.clear()
+    _active = script
+
+
+def emit(kind, name=None):
+    """
+    Report that something has happened in the game, so that the triggers of
+    the running script waiting for it fire when the script next dispatches
+    its events.
+
+    The kinds of event are:
+        'enter': the player entered the room. name is the room
+        'region': the player entered one of the script's regions. name is
+            the region
+        'collide': the player started colliding with an NPC. name is the NPC
+        'interact': the player interacted with an interactable. name is the
+            interactable
+        'speech_finished': a character finished saying a phrase. name is the
+            character
+        'arrive': an NPC finished walking. name is the NPC
+        'conversation_finished': the last line of a conversation was said
+
+    Args:
+        kind: string containing the kind of event
+        name: string containing what the event happened to. Defaults to None
+    """
+    if _active is not None:
+        _active.queue(kind, name)
+
+
+class Trigger:
+    """
+    Class representing something that happens in a room when an event occurs,
+    if a condition holds at the time.
+
+    Attributes:
+        events: a list of tuples of the kind and name of each event that
+            fires the trigger. See emit for the kinds of event
+        action: a function taking no arguments, run when the trigger fires
+        condition: a function taking no arguments that returns whether the
+            trigger can fire, or None if it always can
+    """
+    def __init__(self, events, action, condition=None):
+        """
+        Initialize an instance of Trigger.
+
+        Args:
+            events: a list of tuples of the kind and name of each event that
+                fires the trigger
+            action: a function taking no arguments, run when the trigger
+                fires
+            condition: a function taking no arguments that returns whether
+                the trigger can fire. Defaults to None, meaning it always can
+        """
+        self.events = events
+        self.action = action
+        self.condition = condition
+
+
+class Script:
+    """
+    Class holding the triggers of a room, and running them as events occur
+    rather than checking every condition every tick.
+
+    Most events are emitted by the sprites they happen to. Entering a region
+    and colliding with an NPC are found by dispatch, which only reports them
+    on the tick they start.
+
+    Attributes:
+        _triggers: a dictionary where a tuple of the kind and name of an
+            event is the key and a list of the triggers it fires, in the
+            order they were declared, is the value
+        _regions: a dictionary where the region name is the key and the rect
+            the centre of the player has to be in is the value
+        _exit_when: a function taking no arguments that returns whether the
+            player can leave the room, or None if they always can
+        _events: a deque of the events waiting to be dispatched, as tuples of
+            their kind and name
+        _inside: a set of the names of the regions the player is in
+        _colliding: a set of the NPCs the player is colliding with
+        _last_pos: the centre of the player when regions were last checked
+    """
+    def __init__(self, triggers, regions=None, exit_when=None):
+        """
+        Initialize an instance of Script.
+
+        Args:
+            triggers: a list of instances of Trigger
+            regions: a dictionary where the region name is the key and the
+                rect the centre of the player has to be in is the value.
+                Defaults to None, meaning no regions
+            exit_when: a function taking no arguments that returns whether
+                the player can leave the room. Defaults to None, meaning they
+                always can
+        """
+        self._triggers = {}
+        for trigger in triggers:
+            for event in trigger.events:
+                self._triggers.setdefault(event, []).append(trigger)
+        self._regions = regions or {}
+        self._exit_when = exit_when
+        self._events = deque()
+        self._inside = set()
+        self._colliding = set()
+        self._last_pos = None
+
+    def queue(self, kind, name=None):
+        """
+        Queue an event to be dispatched, if any trigger is waiting for it.
+
+        Args:
+            kind: string containing the kind of event
+            name: string containing what the event happened to. Defaults to
+                None
+        """
+        if (kind, name) in self._triggers:
+            self._events.append((kind, name))
+
+    def clear(self):
+        """
+        Drop every event waiting to be dispatched.
+        """
+        self._events.clear()
+
+    def is_inside(self, region):
+        """
+        Determine if the player was in a region when events were last
+        dispatched.
+
+        Args:
+            region: string containing the name of the region
+
+        Returns:
+            True if the player was in the region, False otherwise
+        """
+        return region in self._inside
+
+    def dispatch(self, player, room):
+        """
+        Find the regions the player has entered and the NPCs near them they
+        have started colliding with, then fire the triggers of every queued
+        event. Events emitted by the triggers are dispatched too.
+
+        Args:
+            player: the instance of Player
+            room: the room the player is in
+        """
+        pos = tuple(player.get_pos())
+        if pos != self._last_pos:
+            self._last_pos = pos
+            for name, rect in self._regions.items():
+                if rect.collidepoint(pos):
+                    if name not in self._inside:
+                        self._inside.add(name)
+                        self.queue('region', name)
+                else:
+                    self._inside.discard(name)
+        colliding = set()
+        for npc in room.get_npcs_near(player.get_rect()):
+            if player.collide(npc):
+                colliding.add(npc.get_name())
+                if npc.get_name() not in self._colliding:
+                    self.queue('collide', npc.get_name())
+        self._colliding = colliding
+        while self._events:
+            for trigger in self._triggers[self._events.popleft()]:
+                if trigger.condition is None or trigger.condition():
+                    trigger.action()
+
+    def can_exit(self):
+        """
+        Determine if the player can leave the room.
+
+        Returns:
+            True if the player can leave, False otherwise
+        """
+        return self._exit_when is None or self._exit_when()